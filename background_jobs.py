@@ -0,0 +1,155 @@
+import threading
+import time
+import traceback
+import uuid
+
+# 已结束的任务在管理器中保留的最长时间（秒），超时后清理
+FINISHED_JOB_TTL = 3600
+
+
+class JobCancelled(Exception):
+    """任务被用户取消时，在进度回调中抛出此异常以中断后台计算"""
+
+
+class Job:
+    """
+    后台任务：在独立线程中运行耗时阶段（匹配、导出等），记录进度、结果和错误
+
+    任务函数的第一个参数为进度回调 report(stage, done, total)，
+    每次回调都会检查取消标记，已取消时抛出JobCancelled。
+    """
+
+    def __init__(self, name, fn, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.status = "running"  # running / done / failed / cancelled
+        self.progress = {}  # stage -> (done, total)，按阶段开始顺序保存
+        self.current_stage = None
+        self.result = None
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self._fn = fn
+        self._args = args
+        self._kwargs = kwargs
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def report(self, stage, done, total):
+        """
+        进度回调：记录某阶段已处理行数/总行数
+        """
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+        with self._lock:
+            self.progress[stage] = (done, total)
+            self.current_stage = stage
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.status != "running"
+
+    def progress_snapshot(self):
+        with self._lock:
+            return dict(self.progress), self.current_stage
+
+    def run(self):
+        try:
+            result = self._fn(self.report, *self._args, **self._kwargs)
+            if self._cancel_event.is_set():
+                self.status = "cancelled"
+            else:
+                self.result = result
+                self.status = "done"
+        except JobCancelled:
+            self.status = "cancelled"
+        except Exception as e:
+            self.error = f"{e}"
+            print(f"后台任务 {self.name} 出错:\n{traceback.format_exc()}")
+            self.status = "failed"
+        finally:
+            self.finished_at = time.time()
+            # 释放输入数据的引用
+            self._args = ()
+            self._kwargs = {}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name=f"job-{self.name}", daemon=True)
+        self._thread.start()
+
+
+class JobManager:
+    """
+    进程级后台任务管理器
+
+    任务对象保存在管理器中，Streamlit会话只在session_state中记录任务ID，
+    因此脚本rerun不会打断正在运行的任务。
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name, fn, *args, inline=False, **kwargs):
+        """
+        提交后台任务并立即返回Job
+
+        参数:
+        name: 任务名称，用于日志和界面显示
+        fn: 任务函数，签名为 fn(report, *args, **kwargs)
+        inline: 为True时在当前线程同步执行（性能分析时使用，保证耗时计入当前运行）
+        """
+        self._prune()
+        job = Job(name, fn, args, kwargs)
+        with self._lock:
+            self._jobs[job.id] = job
+        if inline:
+            job.run()
+        else:
+            job.start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel()
+
+    def discard(self, job_id):
+        """结果已被会话取走后，从管理器中移除任务"""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _prune(self):
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished and now - job.finished_at > FINISHED_JOB_TTL
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """获取进程级任务管理器单例（放在单独模块中，不随脚本rerun重建）"""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager()
+        return _job_manager
@@ -0,0 +1,114 @@
+"""
+启动耗时基准：测量首屏（未上传文件时）渲染耗时，以及各重依赖的导入耗时
+
+每次测量都在新的Python进程中进行，模拟冷启动；结果取多次运行的中位数。
+首屏渲染使用Streamlit自带的AppTest执行一次完整脚本；同样的方式先运行一个只有标题的空白脚本作为基线，
+对比两次运行后的sys.modules，列出由本工具脚本额外加载的重依赖（Streamlit自身加载的不计入）。
+
+使用示例:
+    python bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sku_price_checker.py")
+
+# 基线脚本：只导入streamlit并渲染一个标题
+_BASELINE_APP = "import streamlit as st\nst.title('baseline')\n"
+
+# 只在特定阶段使用的重依赖
+HEAVY_MODULES = ["pandas", "numpy", "openpyxl", "st_aggrid", "pyarrow"]
+
+_IMPORT_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+
+_FIRST_RENDER_SNIPPET = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+heavy = {heavy!r}
+start = time.perf_counter()
+at = AppTest.from_file({app_path!r}, default_timeout=120).run()
+elapsed = time.perf_counter() - start
+loaded = [name for name in heavy if name in sys.modules]
+print(json.dumps({{"seconds": elapsed, "loaded": loaded, "exceptions": [str(e.value) for e in at.exception]}}))
+"""
+
+
+def run_snippet(code):
+    """在新进程中执行代码片段，返回(输出的JSON结果, 错误信息)"""
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if completed.returncode != 0:
+        stderr = completed.stderr.strip()
+        return None, stderr.splitlines()[-1] if stderr else "子进程执行失败"
+    return json.loads(completed.stdout.strip().splitlines()[-1]), None
+
+
+def measure(code, runs):
+    """
+    多次运行并取耗时中位数
+
+    返回:
+    (中位数秒数, 各次结果, 最后一次错误信息)；全部失败时中位数为None
+    """
+    results = []
+    error = None
+    for _ in range(runs):
+        result, error = run_snippet(code)
+        if result is not None:
+            results.append(result)
+    if not results:
+        return None, [], error
+    return statistics.median(r["seconds"] for r in results), results, error
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="每项测量的运行次数（取中位数）")
+    parser.add_argument("--skip-imports", action="store_true", help="只测量首屏渲染耗时")
+    args = parser.parse_args()
+
+    if not args.skip_imports:
+        print("重依赖导入耗时（冷启动，中位数）:")
+        for module in ["streamlit"] + HEAVY_MODULES:
+            seconds, _, _ = measure(_IMPORT_SNIPPET.format(module=module), args.runs)
+            print(f"  {module:<12} " + (f"{seconds * 1000:8.1f} ms" if seconds is not None else "未安装"))
+
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as baseline_file:
+        baseline_file.write(_BASELINE_APP)
+    try:
+        base_seconds, base_results, base_error = measure(
+            _FIRST_RENDER_SNIPPET.format(heavy=HEAVY_MODULES, app_path=baseline_file.name), args.runs
+        )
+    finally:
+        os.remove(baseline_file.name)
+    if base_seconds is None:
+        print(f"基线渲染测量失败: {base_error}")
+        return
+
+    seconds, results, error = measure(
+        _FIRST_RENDER_SNIPPET.format(heavy=HEAVY_MODULES, app_path=APP_PATH), args.runs
+    )
+    if seconds is None:
+        print(f"首屏渲染测量失败: {error}")
+        return
+    print(f"空白脚本渲染耗时（基线，{len(base_results)}次中位数）: {base_seconds * 1000:.1f} ms")
+    print(f"首屏渲染耗时（{len(results)}次中位数）: {seconds * 1000:.1f} ms")
+    baseline_loaded = {name for r in base_results for name in r["loaded"]}
+    loaded = sorted({name for r in results for name in r["loaded"]} - baseline_loaded)
+    print("首屏由脚本额外加载的重依赖: " + (", ".join(loaded) if loaded else "无"))
+    exceptions = results[0]["exceptions"]
+    if exceptions:
+        print(f"脚本运行出错: {exceptions[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import pandas as pd
+
+# 重复键处理方式
+DUPLICATE_POLICIES = {
+    "first": "保留首条",
+    "last": "保留末条",
+    "drop_conflicts": "丢弃值不一致的键",
+}
+
+# 清洗后表示缺失的键值（ID列经astype(str)后空值变为'nan'/'None'等）
+MISSING_KEY_VALUES = {"", "nan", "none", "nat", "<na>"}
+
+
+def find_missing_keys(df, key_columns):
+    """
+    标记键列全部缺失的行：这些行不属于任何键，不参与重复键检查，也无法被匹配到
+
+    参数:
+    df: 要检查的DataFrame
+    key_columns: 键列
+
+    返回:
+    布尔Series，True表示该行缺少键
+    """
+    missing_mask = pd.Series(True, index=df.index)
+    for col in key_columns:
+        values = df[col]
+        missing_mask &= values.isna() | values.astype(str).str.strip().str.lower().isin(MISSING_KEY_VALUES)
+    return missing_mask
+
+
+def find_duplicate_keys(df, key_columns, value_columns):
+    """
+    按键分组查找重复键及值不一致（冲突）的重复键，基于哈希的线性时间实现；
+    缺少键的行（见find_missing_keys）不计入
+
+    参数:
+    df: 要检查的DataFrame
+    key_columns: 键列
+    value_columns: 需要比较是否一致的值列
+
+    返回:
+    (duplicate_mask, conflict_mask)：分别标记属于重复键、属于冲突键的行
+    """
+    duplicate_mask = df.duplicated(subset=key_columns, keep=False) & ~find_missing_keys(df, key_columns)
+    if not duplicate_mask.any():
+        return duplicate_mask, duplicate_mask.copy()
+
+    duplicated_rows = df.loc[duplicate_mask, key_columns + value_columns]
+    # 去掉完全相同的行后，键仍重复说明同一键存在不同的值
+    distinct_rows = duplicated_rows.drop_duplicates()
+    conflict_rows = distinct_rows[distinct_rows.duplicated(subset=key_columns, keep=False)]
+    conflict_keys = pd.MultiIndex.from_frame(conflict_rows[key_columns].drop_duplicates())
+
+    row_keys = pd.MultiIndex.from_frame(df[key_columns])
+    conflict_mask = pd.Series(row_keys.isin(conflict_keys), index=df.index)
+    return duplicate_mask, conflict_mask
+
+
+def resolve_duplicate_keys(df, key_columns, value_columns, policy="first"):
+    """
+    在合并/建立查找表之前处理重复键；缺少键的行无法匹配，直接移除并单独计数
+
+    参数:
+    df: 要处理的DataFrame
+    key_columns: 键列
+    value_columns: 需要比较是否一致的值列
+    policy: 处理方式，见DUPLICATE_POLICIES
+        first - 每个键保留第一条
+        last - 每个键保留最后一条
+        drop_conflicts - 丢弃值不一致的键，值一致的重复行只保留一条
+
+    返回:
+    (resolved_df, report)：处理后的DataFrame和报告字典
+    report包含duplicate_keys(重复键数)、duplicate_rows(涉及行数)、
+    conflict_keys(值不一致的键数)、dropped_rows(处理重复键移除的行数)、
+    missing_key_rows(缺少键被移除的行数)、conflicts(值不一致的行，按键排序，含原始行号)
+    """
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError(f"未知的重复键处理方式: {policy}")
+
+    missing_mask = find_missing_keys(df, key_columns)
+    if missing_mask.any():
+        df = df[~missing_mask]
+    duplicate_mask, conflict_mask = find_duplicate_keys(df, key_columns, value_columns)
+    conflicts = df.loc[conflict_mask, key_columns + value_columns]
+    conflicts = conflicts.rename_axis('原始行号').reset_index().sort_values(key_columns, kind='stable')
+
+    if policy == "drop_conflicts":
+        resolved_df = df[~conflict_mask].drop_duplicates(subset=key_columns, keep="first")
+    else:
+        resolved_df = df.drop_duplicates(subset=key_columns, keep=policy)
+
+    report = {
+        "duplicate_keys": int(df.loc[duplicate_mask, key_columns].drop_duplicates().shape[0]),
+        "duplicate_rows": int(duplicate_mask.sum()),
+        "conflict_keys": int(conflicts[key_columns].drop_duplicates().shape[0]),
+        "dropped_rows": len(df) - len(resolved_df),
+        "missing_key_rows": int(missing_mask.sum()),
+        "conflicts": conflicts,
+    }
+    return resolved_df, report
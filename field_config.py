@@ -0,0 +1,14 @@
+# 字段名映射（请根据实际表头调整）
+SKU_FIELD = "SKU"  # SKU表中的SKU字段
+PARENT_SKU_FIELD = "Parent SKU"  # SKU表中的Parent SKU字段
+TOOL_SKU_FIELD = "sku编码"  # 工具价格表中的sku编码字段
+TOOL_PRICE_FIELD = "活动价格"  # 工具价格表中的活动价格字段
+CAMPAIGN_PRODUCT_ID = "Product ID"
+CAMPAIGN_VARIATION_ID = "Variation ID"
+CAMPAIGN_PRICE_FIELD = "Campaign Price"
+CAMPAIGN_RECOMMEND_FIELD = "Recommended Campaign Price"
+
+# 表头嗅探时各表期望出现的字段
+SKU_HEADER_FIELDS = [SKU_FIELD, PARENT_SKU_FIELD, CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID]
+TOOL_HEADER_FIELDS = [TOOL_SKU_FIELD, TOOL_PRICE_FIELD]
+CAMPAIGN_HEADER_FIELDS = [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, CAMPAIGN_RECOMMEND_FIELD, CAMPAIGN_PRICE_FIELD]
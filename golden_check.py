@@ -0,0 +1,334 @@
+"""
+等价校验：用随机数据和边界数据比对当前实现与golden_reference.py中冻结的基准实现
+
+覆盖get_tool_price_vectorized、sync_price_data、apply_campaign_price_to_export，
+断言两者输出的DataFrame完全一致（列、索引、类型和值），并输出耗时对比和不一致的详情。
+另外比对工具价格表更新后的增量重新匹配（rematch_changed_skus）与整表重新匹配的结果，
+新版本工具价格表包含新增、删除和价格变更的sku编码。
+边界数据包括零价格、缺失价格、NaN SKU、"nan"字符串、空字符串、重复键和带.0的浮点ID。
+
+使用示例:
+    python golden_check.py --cases 50 --rows 2000 --seed 1
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import golden_reference
+from field_config import (
+    SKU_FIELD, PARENT_SKU_FIELD, TOOL_SKU_FIELD, TOOL_PRICE_FIELD,
+    CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, CAMPAIGN_PRICE_FIELD, CAMPAIGN_RECOMMEND_FIELD,
+)
+from price_delta import rematch_changed_skus
+from price_matching import coerce_price_columns, get_tool_price_vectorized
+from review_sync import apply_campaign_price_to_export, sync_price_data
+
+# 每个用例的不一致详情最多显示的行数
+MAX_DIFF_ROWS = 5
+
+REVIEW_SOURCES = ['推荐价格', '无效工具价格(零)', '无效Parent工具价格(零)']
+
+
+def pick(rng, values, size):
+    """按均匀概率从values中抽取size个元素（保留元素的原始类型）"""
+    return [values[i] for i in rng.randint(0, len(values), size)]
+
+
+def make_sku_values(rng, sku_pool, size):
+    """生成SKU列：大部分取自SKU池，混入NaN、"nan"、空字符串、首尾空格和浮点数形式的编号"""
+    specials = [np.nan, 'nan', '', ' ', f" {sku_pool[0]} ", 1001.0, '1001.0']
+    values = pick(rng, sku_pool, size)
+    special_mask = rng.rand(size) < 0.15
+    for i in np.flatnonzero(special_mask):
+        values[i] = specials[rng.randint(len(specials))]
+    return values
+
+
+def make_price_values(rng, size, zero_ratio=0.1, missing_ratio=0.1):
+    """生成价格列：正整数为主，混入零、缺失值和带小数的价格"""
+    prices = rng.randint(1, 5000, size).astype(float) * 100
+    draw = rng.rand(size)
+    prices[draw < zero_ratio] = 0
+    prices[(draw >= zero_ratio) & (draw < zero_ratio + missing_ratio)] = np.nan
+    fractional = rng.rand(size) < 0.05
+    prices[fractional] += 0.5
+    return prices
+
+
+def make_id_values(rng, size, base):
+    """生成ID列（字符串）：部分带.0后缀，模拟Excel读出的浮点ID"""
+    ids = (base + rng.randint(0, max(size, 1) * 2, size)).astype(str).astype(object)
+    float_like = rng.rand(size) < 0.1
+    ids[float_like] = [f"{value}.0" for value in ids[float_like]]
+    return ids
+
+
+def make_case(rng, max_rows):
+    """
+    生成一个用例的输入数据
+
+    返回:
+    字典：campaign_df（已合并SKU信息的活动价格表）、tool_price_df、use_dict、
+    drop_sku_column、drop_parent_column、sync_options、export_key_columns
+    """
+    rows = int(rng.randint(1, max_rows + 1))
+    sku_pool = [f"SKU{i}" for i in range(max(rows // 2, 1))] + ['1001']
+    parent_pool = [f"P{i}" for i in range(max(rows // 8, 1))] + sku_pool[:3]
+
+    # 工具价格表：sku编码可重复，价格含零和缺失值
+    tool_rows = int(rng.randint(1, max(rows, 2)))
+    tool_price_df = pd.DataFrame({
+        TOOL_SKU_FIELD: make_sku_values(rng, sku_pool + parent_pool, tool_rows),
+        TOOL_PRICE_FIELD: make_price_values(rng, tool_rows),
+    })
+    tool_price_df[TOOL_SKU_FIELD] = tool_price_df[TOOL_SKU_FIELD].astype(str)
+
+    campaign_df = pd.DataFrame({
+        CAMPAIGN_PRODUCT_ID: make_id_values(rng, rows, 1000000),
+        CAMPAIGN_VARIATION_ID: make_id_values(rng, rows, 5000000),
+        CAMPAIGN_RECOMMEND_FIELD: make_price_values(rng, rows, zero_ratio=0.05, missing_ratio=0.05),
+        CAMPAIGN_PRICE_FIELD: np.nan,
+        SKU_FIELD: make_sku_values(rng, sku_pool, rows),
+        PARENT_SKU_FIELD: make_sku_values(rng, parent_pool, rows),
+    })
+    # 部分用例包含重复的Product ID/Variation ID
+    if rows > 1 and rng.rand() < 0.5:
+        duplicates = campaign_df.sample(n=max(rows // 20, 1), random_state=rng)
+        campaign_df = pd.concat([campaign_df, duplicates], ignore_index=True)
+
+    return {
+        'campaign_df': campaign_df,
+        'tool_price_df': tool_price_df,
+        'use_dict': rng.rand() < 0.5,
+        'drop_sku_column': rng.rand() < 0.05,
+        'drop_parent_column': rng.rand() < 0.05,
+        'sync_options': {
+            'update_price_source': bool(rng.rand() < 0.8),
+            'explicit_columns': bool(rng.rand() < 0.8),
+            'duplicate_input_keys': bool(rng.rand() < 0.2),
+            'edit_ratio': float(rng.rand()),
+        },
+        'export_key_columns': [
+            [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID],
+            [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID],
+            [CAMPAIGN_PRODUCT_ID],
+            [],
+        ][rng.randint(4)],
+    }
+
+
+def make_price_input(rng, matched_df, options):
+    """模拟审核表编辑结果：修改部分价格、勾选人工确认，可选地加入重复键"""
+    review = matched_df[matched_df['价格来源'].isin(REVIEW_SOURCES)]
+    columns = [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, '价格来源', CAMPAIGN_RECOMMEND_FIELD, CAMPAIGN_PRICE_FIELD]
+    price_input = review[columns].copy().reset_index(drop=True)
+    size = len(price_input)
+    edited = rng.rand(size) < options['edit_ratio']
+    price_input.loc[edited, CAMPAIGN_PRICE_FIELD] = make_price_values(rng, int(edited.sum()))
+    price_input['已修改'] = edited
+    price_input['已人工确认'] = rng.rand(size) < 0.3
+    price_input['价格有效'] = rng.rand(size) < 0.9
+    if options['duplicate_input_keys'] and size > 1:
+        price_input = pd.concat([price_input, price_input.head(1)], ignore_index=True)
+    return price_input
+
+
+def make_export_df(rng, campaign_df):
+    """模拟导出用的原始活动价格表：ID列为Excel读出的数值（带.0的浮点数）或字符串"""
+    export_df = campaign_df[[CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, CAMPAIGN_RECOMMEND_FIELD]].copy()
+    export_df[CAMPAIGN_PRICE_FIELD] = np.nan
+    if rng.rand() < 0.5:
+        for col in [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID]:
+            export_df[col] = pd.to_numeric(export_df[col], errors='coerce').astype(float)
+    return export_df.reset_index(drop=True)
+
+
+def make_tool_update(rng, tool_price_df):
+    """模拟新版本工具价格表：修改约5%的价格，删除部分行，新增零价格和新价格的sku编码"""
+    updated = tool_price_df.copy()
+    changed = rng.choice(len(updated), size=max(1, len(updated) // 20), replace=False)
+    updated.loc[changed, TOOL_PRICE_FIELD] = make_price_values(rng, len(changed))
+    removed = rng.choice(len(updated), size=min(len(updated) - 1, max(1, len(updated) // 50)), replace=False)
+    added = pd.DataFrame({TOOL_SKU_FIELD: ['SKU3', 'P1', 'NEW_SKU'], TOOL_PRICE_FIELD: [0.0, 777.0, 1200.0]})
+    return pd.concat([updated.drop(index=removed), added], ignore_index=True)
+
+
+def full_rematch(previous_df, campaign_df, old_dict, new_dict, tool_price_df):
+    """基准：用基准实现整表重新匹配，价格列转换与界面一致"""
+    result = golden_reference.get_tool_price_vectorized(campaign_df, tool_price_df, new_dict)
+    coerce_price_columns(result, [CAMPAIGN_PRICE_FIELD, CAMPAIGN_RECOMMEND_FIELD])
+    return result
+
+
+def delta_rematch(previous_df, campaign_df, old_dict, new_dict, tool_price_df):
+    """当前：只重新匹配工具价格有变化的行"""
+    result, _ = rematch_changed_skus(previous_df, old_dict, new_dict, tool_price_df)
+    return result
+
+
+def compare_frames(expected, actual):
+    """
+    比较两个DataFrame
+
+    返回:
+    不一致的描述列表，完全一致时为空列表
+    """
+    diffs = []
+    if list(expected.columns) != list(actual.columns):
+        diffs.append(f"列不一致: 基准 {list(expected.columns)}，当前 {list(actual.columns)}")
+        return diffs
+    if not expected.index.equals(actual.index):
+        diffs.append(f"索引不一致: 基准 {len(expected)} 行，当前 {len(actual)} 行")
+        return diffs
+    for col in expected.columns:
+        exp_col, act_col = expected[col], actual[col]
+        if exp_col.dtype != act_col.dtype:
+            diffs.append(f"列 {col} 类型不一致: 基准 {exp_col.dtype}，当前 {act_col.dtype}")
+        same = (exp_col == act_col) | (exp_col.isna() & act_col.isna())
+        mismatched = np.flatnonzero(~same.to_numpy(dtype=bool))
+        if len(mismatched):
+            samples = ", ".join(
+                f"行{expected.index[i]}: {exp_col.iloc[i]!r} -> {act_col.iloc[i]!r}"
+                for i in mismatched[:MAX_DIFF_ROWS]
+            )
+            diffs.append(f"列 {col} 有 {len(mismatched)} 个值不一致（基准 -> 当前）: {samples}")
+    return diffs
+
+
+def timed(fn, *args, **kwargs):
+    """执行函数并计时，屏蔽其调试输出和pandas性能警告"""
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter("ignore", pd.errors.PerformanceWarning)
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+    return result, elapsed
+
+
+def run_case(rng, case, stats):
+    """
+    对一个用例依次比对各函数；后一阶段的输入取基准实现的输出，保证两边输入相同
+
+    返回:
+    {函数名: 不一致描述列表}
+    """
+    failures = {}
+
+    def check(name, reference_fn, current_fn, make_args):
+        expected, ref_time = timed(reference_fn, *make_args())
+        entry = stats.setdefault(name, {'cases': 0, 'failed': 0, 'reference': 0.0, 'current': 0.0})
+        entry['cases'] += 1
+        entry['reference'] += ref_time
+        try:
+            actual, cur_time = timed(current_fn, *make_args())
+        except Exception as e:
+            entry['failed'] += 1
+            failures[name] = [f"当前实现出错: {type(e).__name__}: {e}"]
+            return expected
+        entry['current'] += cur_time
+        diffs = compare_frames(expected, actual)
+        if diffs:
+            entry['failed'] += 1
+            failures[name] = diffs
+        return expected
+
+    # 1. 工具价格匹配
+    campaign_df = case['campaign_df']
+    if case['drop_sku_column']:
+        campaign_df = campaign_df.drop(columns=[SKU_FIELD])
+    if case['drop_parent_column']:
+        campaign_df = campaign_df.drop(columns=[PARENT_SKU_FIELD])
+    tool_price_df = case['tool_price_df']
+    sku_price_dict = None
+    if case['use_dict']:
+        with contextlib.redirect_stdout(io.StringIO()):
+            sku_price_dict = golden_reference.build_sku_price_dict(tool_price_df)
+    matched_df = check(
+        'get_tool_price_vectorized',
+        golden_reference.get_tool_price_vectorized, get_tool_price_vectorized,
+        lambda: (campaign_df.copy(), tool_price_df.copy(),
+                 dict(sku_price_dict) if sku_price_dict is not None else None),
+    )
+
+    # 2. 审核数据同步
+    options = case['sync_options']
+    price_input = make_price_input(rng, matched_df, options)
+    key_columns = [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID]
+    value_columns = [CAMPAIGN_PRICE_FIELD, '已修改', '价格有效', '已人工确认'] if options['explicit_columns'] else None
+    synced_df = check(
+        'sync_price_data',
+        golden_reference.sync_price_data, sync_price_data,
+        lambda: (matched_df.copy(), price_input.copy(), list(key_columns),
+                 list(value_columns) if value_columns is not None else None, options['update_price_source']),
+    )
+
+    # 3. 导出数据合并
+    export_df = make_export_df(rng, synced_df)
+    export_key_columns = case['export_key_columns']
+    check(
+        'apply_campaign_price_to_export',
+        golden_reference.apply_campaign_price_to_export, apply_campaign_price_to_export,
+        lambda: (export_df.copy(), synced_df.copy(), list(export_key_columns)),
+    )
+
+    # 4. 工具价格表更新后的增量重新匹配：上一版本的匹配结果按界面流程转换价格列
+    with contextlib.redirect_stdout(io.StringIO()):
+        old_dict = golden_reference.build_sku_price_dict(tool_price_df)
+        previous_df = golden_reference.get_tool_price_vectorized(campaign_df.copy(), tool_price_df.copy(), dict(old_dict))
+        previous_df.attrs['invalid_price_count'] = coerce_price_columns(
+            previous_df, [CAMPAIGN_PRICE_FIELD, CAMPAIGN_RECOMMEND_FIELD]
+        )
+        new_tool_df = make_tool_update(rng, tool_price_df)
+        new_dict = golden_reference.build_sku_price_dict(new_tool_df)
+    check(
+        'rematch_changed_skus',
+        full_rematch, delta_rematch,
+        lambda: (previous_df.copy(), campaign_df.copy(), dict(old_dict), dict(new_dict), new_tool_df.copy()),
+    )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="匹配逻辑等价校验")
+    parser.add_argument("--cases", type=int, default=30, help="随机用例数量")
+    parser.add_argument("--rows", type=int, default=2000, help="单个用例活动价格表的最大行数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子，相同种子生成相同用例")
+    args = parser.parse_args()
+
+    stats = {}
+    failed_cases = []
+    for case_no in range(args.cases):
+        # 每个用例单独播种，便于用 --seed 和用例号复现
+        rng = np.random.RandomState([args.seed, case_no])
+        case = make_case(rng, args.rows)
+        failures = run_case(rng, case, stats)
+        if failures:
+            failed_cases.append((case_no, len(case['campaign_df']), failures))
+
+    print(f"用例数: {args.cases}  最大行数: {args.rows}  随机种子: {args.seed}")
+    print(f"{'函数':<32}{'不一致/用例':>12}{'基准耗时(s)':>14}{'当前耗时(s)':>14}{'加速比':>10}")
+    for name, entry in stats.items():
+        ratio = entry['reference'] / entry['current'] if entry['current'] > 0 else float('inf')
+        print(f"{name:<32}{entry['failed']:>6}/{entry['cases']:<5}"
+              f"{entry['reference']:>14.3f}{entry['current']:>14.3f}{ratio:>9.2f}x")
+
+    if not failed_cases:
+        print("全部一致")
+        return 0
+    print(f"\n{len(failed_cases)} 个用例输出不一致:")
+    for case_no, rows, failures in failed_cases:
+        print(f"用例 {case_no}（{rows} 行）:")
+        for name, diffs in failures.items():
+            for diff in diffs:
+                print(f"  [{name}] {diff}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
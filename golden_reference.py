@@ -0,0 +1,338 @@
+"""
+冻结的基准实现：get_tool_price_vectorized、sync_price_data、apply_campaign_price_to_export
+（以及其依赖的build_sku_price_dict）在性能改造前的版本
+
+价格来源/价格标记直接影响提交的活动价格，优化这些函数时用golden_check.py与本模块比对输出。
+本模块只作为比对基准，不要修改，也不要在界面或服务中调用。
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from field_config import (
+    SKU_FIELD, PARENT_SKU_FIELD, TOOL_SKU_FIELD, TOOL_PRICE_FIELD,
+    CAMPAIGN_PRICE_FIELD, CAMPAIGN_RECOMMEND_FIELD,
+)
+
+PROGRESS_EVERY_ROWS = 2000
+
+
+def build_sku_price_dict(tool_price_df):
+    """
+    创建SKU对应的价格映射字典 - 比逐行查找更高效
+    
+    参数:
+    tool_price_df: 工具价格表DataFrame
+    
+    返回:
+    {sku编码: 活动价格} 字典，已移除'nan'键
+    """
+    sku_price_dict = dict(zip(
+        tool_price_df[TOOL_SKU_FIELD].astype(str).str.strip(),
+        tool_price_df[TOOL_PRICE_FIELD]
+    ))
+    
+    # 调试信息：输出字典信息
+    print(f"价格字典包含SKU数量: {len(sku_price_dict)}")
+    if len(sku_price_dict) > 0:
+        # 随机抽样5个
+        sample_keys = list(sku_price_dict.keys())[:5]
+        print(f"样本SKU: {sample_keys}")
+        print(f"样本价格: {[sku_price_dict[k] for k in sample_keys]}")
+    
+    # 检查nan值
+    if 'nan' in sku_price_dict:
+        print(f"警告: 价格字典中包含'nan'键，值为: {sku_price_dict['nan']}")
+        # 从字典中移除'nan'键，避免错误匹配
+        del sku_price_dict['nan']
+        print("已从价格字典中移除'nan'键")
+    
+    return sku_price_dict
+
+
+def get_tool_price_vectorized(campaign_df, tool_price_df, sku_price_dict=None, progress=None):
+    """
+    向量化处理SKU价格匹配，替代逐行apply操作
+    
+    参数:
+    campaign_df: 活动价格表DataFrame
+    tool_price_df: 工具价格表DataFrame
+    sku_price_dict: 预先构建的SKU价格字典（只读），为None时由tool_price_df构建
+    progress: 进度回调 progress(阶段, 已处理行数, 总行数)，用于后台任务
+    
+    返回:
+    更新后的campaign_df，添加价格和价格来源列
+    """
+    # 调试信息：输出数据结构
+    print(f"活动表包含行数: {len(campaign_df)}")
+    print(f"工具价格表包含行数: {len(tool_price_df)}")
+    print(f"是否包含SKU列: {SKU_FIELD in campaign_df.columns}")
+    print(f"是否包含Parent SKU列: {PARENT_SKU_FIELD in campaign_df.columns}")
+    
+    # 初始化结果列
+    campaign_df[CAMPAIGN_PRICE_FIELD] = np.nan
+    campaign_df['价格来源'] = '推荐价格'  # 默认来源为推荐价格
+    
+    if sku_price_dict is None:
+        sku_price_dict = build_sku_price_dict(tool_price_df)
+    
+    # 1. 首先尝试直接匹配SKU
+    if SKU_FIELD in campaign_df.columns:
+        sku_mask = campaign_df[SKU_FIELD].astype(str).str.strip().isin(sku_price_dict.keys())
+        if sku_mask.any():
+            sku_indexes = campaign_df[sku_mask].index
+            # 对匹配到的SKU设置价格
+            for i, idx in enumerate(sku_indexes):
+                if progress is not None and i % PROGRESS_EVERY_ROWS == 0:
+                    progress('SKU匹配', i, len(sku_indexes))
+                sku = str(campaign_df.at[idx, SKU_FIELD]).strip()
+                # 排除nan和空字符串
+                if sku.lower() == 'nan' or sku == '':
+                    continue
+                    
+                if sku in sku_price_dict:
+                    price_val = sku_price_dict[sku]
+                    # 修改逻辑：区分有效工具价格和无效工具价格（零或空）
+                    if pd.notnull(price_val) and price_val > 0:
+                        campaign_df.at[idx, CAMPAIGN_PRICE_FIELD] = price_val
+                        campaign_df.at[idx, '价格来源'] = '工具价格'
+                    elif pd.notnull(price_val) and price_val == 0:
+                        # 价格为零，标记为无效工具价格，仍使用推荐价格
+                        campaign_df.at[idx, CAMPAIGN_PRICE_FIELD] = campaign_df.at[idx, CAMPAIGN_RECOMMEND_FIELD]
+                        campaign_df.at[idx, '价格来源'] = '无效工具价格(零)'
+            if progress is not None:
+                progress('SKU匹配', len(sku_indexes), len(sku_indexes))
+    
+    # 2. 然后尝试匹配Parent SKU (对未匹配到SKU的行)
+    if PARENT_SKU_FIELD in campaign_df.columns:
+        # 找出还没匹配到价格或标记为无效工具价格的行
+        parent_mask = ((campaign_df['价格来源'] == '推荐价格') | 
+                       (campaign_df['价格来源'] == '无效工具价格(零)')) & campaign_df[PARENT_SKU_FIELD].notna()
+        
+        # 添加调试信息
+        parent_count = parent_mask.sum()
+        print(f"需要尝试Parent SKU匹配的行数: {parent_count}")
+        
+        if parent_mask.any():
+            # 输出一些Parent SKU样本
+            parent_sample = campaign_df[parent_mask][PARENT_SKU_FIELD].head(5).tolist()
+            print(f"Parent SKU样本: {parent_sample}")
+            print(f"这些Parent SKU是否在价格字典中: {[sku in sku_price_dict for sku in parent_sample]}")
+            
+            # 创建一个字典记录哪些Parent SKU被成功匹配
+            parent_matched = {}
+            
+            parent_indexes = campaign_df[parent_mask].index
+            # 对匹配到的Parent SKU设置价格
+            for i, idx in enumerate(parent_indexes):
+                if progress is not None and i % PROGRESS_EVERY_ROWS == 0:
+                    progress('Parent SKU匹配', i, len(parent_indexes))
+                parent_sku = str(campaign_df.at[idx, PARENT_SKU_FIELD]).strip()
+                # 排除nan和空字符串
+                if parent_sku.lower() == 'nan' or parent_sku == '':
+                    continue
+                    
+                if parent_sku in sku_price_dict:
+                    price_val = sku_price_dict[parent_sku]
+                    # 修改逻辑：区分有效工具价格和无效工具价格（零或空）
+                    if pd.notnull(price_val) and price_val > 0:
+                        campaign_df.at[idx, CAMPAIGN_PRICE_FIELD] = price_val
+                        campaign_df.at[idx, '价格来源'] = 'Parent工具价格'
+                        # 记录匹配成功
+                        if parent_sku not in parent_matched:
+                            parent_matched[parent_sku] = 1
+                        else:
+                            parent_matched[parent_sku] += 1
+                    elif pd.notnull(price_val) and price_val == 0:
+                        # Parent价格为零，也标记为无效工具价格
+                        campaign_df.at[idx, CAMPAIGN_PRICE_FIELD] = campaign_df.at[idx, CAMPAIGN_RECOMMEND_FIELD]
+                        campaign_df.at[idx, '价格来源'] = '无效Parent工具价格(零)'
+            if progress is not None:
+                progress('Parent SKU匹配', len(parent_indexes), len(parent_indexes))
+            
+            # 输出Parent SKU匹配统计
+            print(f"通过Parent SKU成功匹配的行数: {sum(parent_matched.values())}")
+            print(f"成功匹配的唯一Parent SKU数量: {len(parent_matched)}")
+            if len(parent_matched) > 0:
+                top_parents = sorted(parent_matched.items(), key=lambda x: x[1], reverse=True)[:5]
+                print(f"匹配次数最多的Parent SKU: {top_parents}")
+                
+                # 检查这些Parent SKU对应的价格
+                for parent, _ in top_parents:
+                    if parent in sku_price_dict:
+                        print(f"Parent SKU {parent} 对应价格: {sku_price_dict[parent]}")
+    
+    # 3. 最后，对未匹配到的行使用推荐价格
+    remaining_mask = (campaign_df['价格来源'] == '推荐价格')
+    campaign_df.loc[remaining_mask, CAMPAIGN_PRICE_FIELD] = campaign_df.loc[remaining_mask, CAMPAIGN_RECOMMEND_FIELD]
+    
+    # 保存是否有需要审查的价格数据
+    需要审查的价格条件 = (
+        (campaign_df['价格来源'] == '推荐价格') | 
+        (campaign_df['价格来源'] == '无效工具价格(零)') | 
+        (campaign_df['价格来源'] == '无效Parent工具价格(零)')
+    )
+    
+    return campaign_df
+
+
+def sync_price_data(campaign_df, price_input_df, key_columns, value_columns=None, update_price_source=False):
+    """
+    将price_input_df中的数据同步到campaign_df中
+    
+    参数:
+    campaign_df: 目标DataFrame
+    price_input_df: 源DataFrame
+    key_columns: 用于匹配两个DataFrame的键列
+    value_columns: 需要同步的值列，默认为None时将自动确定
+    update_price_source: 是否更新价格来源，默认为False
+    
+    返回:
+    更新后的campaign_df
+    """
+    if value_columns is None:
+        value_columns = [CAMPAIGN_PRICE_FIELD]
+        # 检查其它可能的值列是否存在
+        for col in ['已修改', '价格有效', '已人工确认']:
+            if col in price_input_df.columns:
+                value_columns.append(col)
+    
+    # 确保所有值列都存在于price_input_df中
+    existing_columns = [col for col in value_columns if col in price_input_df.columns]
+    if len(existing_columns) < len(value_columns):
+        missing = set(value_columns) - set(existing_columns)
+        st.warning(f"同步数据时发现缺失列: {', '.join(missing)}")
+        value_columns = existing_columns
+    
+    # 如果'已人工确认'不在campaign_df但需要同步，添加该列
+    if '已人工确认' in value_columns and '已人工确认' not in campaign_df.columns:
+        campaign_df['已人工确认'] = False
+        
+    # 如果'已修改'不在campaign_df但需要同步，添加该列    
+    if '已修改' in value_columns and '已修改' not in campaign_df.columns:
+        campaign_df['已修改'] = False
+    
+    try:
+        price_input_indexed = price_input_df.set_index(key_columns)
+        
+        for idx, row in campaign_df.iterrows():
+            # 构建匹配键
+            key = tuple(str(row[col]).strip().replace('.0', '') if pd.notnull(row[col]) else '' for col in key_columns)
+            
+            if key in price_input_indexed.index:
+                # 同步值字段
+                for col in value_columns:
+                    if col in price_input_indexed.columns:
+                        campaign_df.at[idx, col] = price_input_indexed.at[key, col]
+                
+                # 更新价格来源
+                if update_price_source and '价格来源' in campaign_df.columns and '已修改' in price_input_indexed.columns:
+                    if price_input_indexed.at[key, '已修改']:
+                        campaign_df.at[idx, '价格来源'] = '推荐价格'
+    except Exception as e:
+        st.error(f"同步数据时出错: {str(e)}")
+    
+    return campaign_df
+
+
+def apply_campaign_price_to_export(export_df, campaign_df, key_columns):
+    """
+    更高效地将活动价格应用到导出DataFrame
+    
+    参数:
+    export_df: 导出用的DataFrame
+    campaign_df: 包含价格和来源信息的DataFrame
+    key_columns: 用于匹配两个DataFrame的键列
+    
+    返回:
+    更新后的export_df
+    """
+    # 准备需要的字段
+    if len(key_columns) == 0:
+        st.warning("没有找到合适的键列进行数据匹配")
+        return export_df
+    
+    # 确保campaign_df中包含必要的列
+    required_columns = [CAMPAIGN_PRICE_FIELD, '价格来源']
+    for col in required_columns:
+        if col not in campaign_df.columns:
+            st.error(f"数据处理错误: campaign_df中缺少必要列 '{col}'")
+            return export_df
+    
+    # 确保必要的列存在，如不存在则创建
+    if '已修改' not in campaign_df.columns:
+        campaign_df['已修改'] = False
+    
+    if '已人工确认' not in campaign_df.columns:
+        campaign_df['已人工确认'] = False
+    
+    # 创建匹配用的键
+    campaign_df['匹配键'] = campaign_df[key_columns].astype(str).apply(
+        lambda x: '-'.join([str(i).strip().replace('.0', '') for i in x]), axis=1
+    )
+    export_df['匹配键'] = export_df[key_columns].astype(str).apply(
+        lambda x: '-'.join([str(i).strip().replace('.0', '') for i in x]), axis=1
+    )
+    
+    # 提取要复制的字段，增加已人工确认列
+    campaign_slim = campaign_df[['匹配键', CAMPAIGN_PRICE_FIELD, '价格来源', '已修改', '已人工确认']].copy()
+    
+    # 使用merge代替循环 - 更高效
+    result_df = export_df.merge(campaign_slim, on='匹配键', how='left', suffixes=('', '_new'))
+    
+    # 更新价格
+    if CAMPAIGN_PRICE_FIELD + '_new' in result_df.columns:
+        result_df[CAMPAIGN_PRICE_FIELD] = result_df[CAMPAIGN_PRICE_FIELD + '_new'].fillna(result_df[CAMPAIGN_PRICE_FIELD])
+    
+    # 设置价格标记
+    # 先检查合并后的列是否存在
+    if '价格来源' not in result_df.columns:
+        result_df['价格标记'] = ''
+        st.warning("价格来源信息缺失，无法设置详细价格标记")
+    else:
+        # 定义条件，使用.fillna确保没有NaN值
+        条件_工具价格 = (result_df['价格来源'] == '工具价格').fillna(False)
+        条件_Parent价格 = (result_df['价格来源'] == 'Parent工具价格').fillna(False) 
+        条件_推荐价格 = (result_df['价格来源'] == '推荐价格').fillna(False)
+        条件_无效工具价格 = (result_df['价格来源'] == '无效工具价格(零)').fillna(False)
+        条件_无效Parent工具价格 = (result_df['价格来源'] == '无效Parent工具价格(零)').fillna(False)
+        
+        # 检查'已修改'和'已人工确认'列是否存在
+        条件_已修改 = result_df['已修改'].fillna(False) if '已修改' in result_df.columns else pd.Series(False, index=result_df.index)
+        条件_已人工确认 = result_df['已人工确认'].fillna(False) if '已人工确认' in result_df.columns else pd.Series(False, index=result_df.index)
+        
+        # 创建标记列，增加人工确认信息
+        result_df['价格标记'] = ''
+        result_df.loc[条件_工具价格, '价格标记'] = '工具价格'
+        result_df.loc[条件_Parent价格, '价格标记'] = 'Parent工具价格'
+        result_df.loc[条件_推荐价格 & ~条件_已修改 & ~条件_已人工确认, '价格标记'] = '推荐价格'
+        result_df.loc[条件_推荐价格 & 条件_已修改, '价格标记'] = '推荐价格（已手动更改）'
+        result_df.loc[条件_推荐价格 & ~条件_已修改 & 条件_已人工确认, '价格标记'] = '推荐价格（已人工确认）'
+        result_df.loc[条件_推荐价格 & 条件_已修改 & 条件_已人工确认, '价格标记'] = '推荐价格（已手动更改并确认）'
+        # 无效工具价格的标记
+        result_df.loc[条件_无效工具价格 & ~条件_已修改 & ~条件_已人工确认, '价格标记'] = '无效工具价格(零)'
+        result_df.loc[条件_无效工具价格 & 条件_已修改, '价格标记'] = '无效工具价格(零)（已手动更改）'
+        result_df.loc[条件_无效工具价格 & ~条件_已修改 & 条件_已人工确认, '价格标记'] = '无效工具价格(零)（已人工确认）'
+        result_df.loc[条件_无效工具价格 & 条件_已修改 & 条件_已人工确认, '价格标记'] = '无效工具价格(零)（已手动更改并确认）'
+        # 无效Parent工具价格的标记
+        result_df.loc[条件_无效Parent工具价格 & ~条件_已修改 & ~条件_已人工确认, '价格标记'] = '无效Parent工具价格(零)'
+        result_df.loc[条件_无效Parent工具价格 & 条件_已修改, '价格标记'] = '无效Parent工具价格(零)（已手动更改）'
+        result_df.loc[条件_无效Parent工具价格 & ~条件_已修改 & 条件_已人工确认, '价格标记'] = '无效Parent工具价格(零)（已人工确认）'
+        result_df.loc[条件_无效Parent工具价格 & 条件_已修改 & 条件_已人工确认, '价格标记'] = '无效Parent工具价格(零)（已手动更改并确认）'
+        
+        # 价格缺失或严重错误情况
+        价格缺失条件 = (result_df[CAMPAIGN_PRICE_FIELD].isnull() | 
+                    (result_df[CAMPAIGN_PRICE_FIELD] == "") | 
+                    (result_df[CAMPAIGN_PRICE_FIELD] == 0))
+        if 价格缺失条件.any():
+            result_df.loc[价格缺失条件, '价格标记'] = '价格缺失(含其他严重错误)'
+    
+    # 删除临时列和不需要的merge结果列
+    drop_cols = ['匹配键']
+    for col in [CAMPAIGN_PRICE_FIELD + '_new', '价格来源', '已修改', '已人工确认']:
+        if col in result_df.columns:
+            drop_cols.append(col)
+    
+    result_df = result_df.drop(columns=drop_cols)
+    
+    return result_df
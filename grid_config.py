@@ -0,0 +1,163 @@
+import copy
+
+from st_aggrid import GridOptionsBuilder, JsCode
+
+from field_config import CAMPAIGN_PRICE_FIELD, CAMPAIGN_RECOMMEND_FIELD
+
+# 预览表配置只在首次显示预览时导入本模块并构建一次，之后复用
+
+# 多色高亮和价格缺失高亮
+CELLSTYLE_JSCODE = JsCode("""
+function(params) {
+    // 价格来源多色高亮
+    if (params.colDef.field === '价格来源') {
+        if (params.value === '工具价格') {
+            return { 'color': 'white', 'backgroundColor': '#1E90FF' }
+        }
+        if (params.value === 'Parent工具价格') {
+            return { 'color': 'white', 'backgroundColor': '#20B2AA' }
+        }
+        if (params.value === '推荐价格') {
+            return { 'color': 'black', 'backgroundColor': '#FFD700' }
+        }
+        if (params.value === '无效工具价格(零)' || params.value === '无效Parent工具价格(零)') {
+            return { 'color': 'white', 'backgroundColor': '#FF8C00' }
+        }
+    }
+    // 活动价格缺失/错误高亮
+    if (params.colDef.field === '活动价格' || params.colDef.field === 'Campaign Price') {
+        if (params.value === '' || params.value === null || params.value === 0 || params.value === '0' || params.value === 'None') {
+            return { 'color': 'white', 'backgroundColor': '#FF0000' }
+        }
+    }
+    return {};
+}
+""")
+
+# 价格千分位显示，底层值仍为数字
+PRICE_FORMATTER_JSCODE = JsCode("""
+function(params) {
+    if (params.value === null || params.value === undefined || params.value === '') {
+        return '';
+    }
+    return Number(params.value).toLocaleString('en-US', { maximumFractionDigits: 0 });
+}
+""")
+
+# 汉化菜单
+LOCALE_CN = {
+    "page": "页",
+    "more": "更多",
+    "to": "到",
+    "of": "共",
+    "next": "下一页",
+    "last": "最后一页",
+    "first": "第一页",
+    "previous": "上一页",
+    "loadingOoo": "加载中...",
+    "selectAll": "全选",
+    "searchOoo": "搜索...",
+    "blank": "空",
+    "filterOoo": "自定义筛选...",
+    "applyFilter": "应用",
+    "equals": "等于",
+    "notEqual": "不等于",
+    "lessThan": "小于",
+    "greaterThan": "大于",
+    "lessThanOrEqual": "小于等于",
+    "greaterThanOrEqual": "大于等于",
+    "inRange": "区间",
+    "contains": "包含",
+    "notContains": "不包含",
+    "startsWith": "开头是",
+    "endsWith": "结尾是",
+    "andCondition": "并且",
+    "orCondition": "或者",
+    "noRowsToShow": "无数据显示",
+    "copy": "复制",
+    "copyWithHeaders": "带表头复制",
+    "paste": "粘贴",
+    "export": "导出",
+    "exportToCsv": "导出为CSV",
+    "exportToExcel": "导出为Excel",
+    "pinColumn": "固定列",
+    "valueAggregation": "聚合",
+    "autosizeThiscolumn": "自动调整本列宽度",
+    "autosizeAllColumns": "自动调整所有列宽度",
+    "resetColumns": "重置列",
+    "groupBy": "按此列分组",
+    "ungroupBy": "取消分组",
+    "resetGroup": "重置分组",
+    "rowGroupColumnsEmptyMessage": "拖动列到此处进行分组",
+    "valueColumnsEmptyMessage": "拖动列到此处进行聚合",
+    "pivotMode": "透视模式",
+    "groups": "分组",
+    "values": "值",
+    "pivots": "透视",
+    "group": "分组",
+    "columnsPanel": "列面板",
+    "filters": "筛选",
+    "rowGroup": "行分组",
+    "rowGroupPanel": "行分组面板",
+    "pivot": "透视",
+    "pivotPanel": "透视面板",
+    "notBlank": "非空",
+    "resetFilter": "重置",
+    "clearFilter": "清除",
+    "cancelFilter": "取消",
+    "apply": "应用",
+    "cancel": "取消",
+    "clear": "清除",
+    "textFilter": "文本筛选",
+    "numberFilter": "数字筛选",
+    "dateFilter": "日期筛选",
+    "setFilter": "集合筛选",
+    "columns": "列",
+    "menu": "菜单",
+    "filter": "筛选",
+    "deleteCondition": "删除条件",
+    "addCondition": "添加条件",
+    "filterConditions": "筛选条件",
+    "filterValue": "筛选值",
+    "filterField": "筛选字段",
+    "selectAllSearchResults": "全选搜索结果",
+    "search": "搜索",
+    "noMatches": "无匹配项",
+    "toolPanelColumns": "列",
+    "toolPanelFilters": "筛选",
+}
+
+# 按列结构缓存的表格配置，列名和类型不变时直接复用
+MAX_CACHED_GRID_OPTIONS = 32
+_grid_options_cache = {}
+
+
+def build_preview_grid_options(show_df):
+    """
+    构建活动价预览表的AgGrid配置，按列名和列类型缓存
+
+    参数:
+    show_df: 要显示的DataFrame
+
+    返回:
+    gridOptions字典（副本，可安全修改）
+    """
+    signature = tuple((str(col), str(dtype)) for col, dtype in show_df.dtypes.items())
+    if signature not in _grid_options_cache:
+        if len(_grid_options_cache) >= MAX_CACHED_GRID_OPTIONS:
+            _grid_options_cache.clear()
+        gb = GridOptionsBuilder.from_dataframe(show_df)
+        gb.configure_default_column(filter=True, sortable=True)
+        gb.configure_grid_options(domLayout='normal')
+        for price_col in [CAMPAIGN_RECOMMEND_FIELD, CAMPAIGN_PRICE_FIELD]:
+            if price_col in show_df.columns:
+                gb.configure_column(price_col, type=['numericColumn', 'numberColumnFilter'],
+                                    valueFormatter=PRICE_FORMATTER_JSCODE)
+        if '价格来源' in show_df.columns:
+            gb.configure_column('价格来源', cellStyle=CELLSTYLE_JSCODE)
+        if '活动价格' in show_df.columns:
+            gb.configure_column('活动价格', cellStyle=CELLSTYLE_JSCODE)
+        elif 'Campaign Price' in show_df.columns:
+            gb.configure_column('Campaign Price', cellStyle=CELLSTYLE_JSCODE)
+        _grid_options_cache[signature] = gb.build()
+    return copy.deepcopy(_grid_options_cache[signature])
@@ -0,0 +1,114 @@
+import io
+import re
+
+import pandas as pd
+
+# 表头嗅探只读取文件前若干行，避免为调整表头反复解析整个工作簿
+SNIFF_ROWS = 40
+
+_ID_PATTERN = re.compile(r"^\d+(\.0+)?$")
+
+
+def read_head_rows(file_bytes, nrows=SNIFF_ROWS):
+    """
+    只读取文件前nrows行（不设表头），用于识别表头和备注行
+
+    参数:
+    file_bytes: 上传文件的二进制内容
+    nrows: 读取的行数
+
+    返回:
+    DataFrame，行号从0开始，对应Excel第1行
+    """
+    return pd.read_excel(io.BytesIO(file_bytes), header=None, nrows=nrows)
+
+
+def _normalize_cell(value):
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    return str(value).strip()
+
+
+def detect_header_row(head_df, expected_fields):
+    """
+    查找包含最多已配置字段名的行作为表头
+
+    参数:
+    head_df: read_head_rows读取的前几行
+    expected_fields: 期望出现在表头中的字段名列表
+
+    返回:
+    (表头行号(从1开始，未识别时为None), 该行匹配到的字段列表)
+    """
+    best_row, best_matched = None, []
+    for i, row in enumerate(head_df.itertuples(index=False, name=None)):
+        cells = {_normalize_cell(v) for v in row}
+        matched = [field for field in expected_fields if field in cells]
+        if len(matched) > len(best_matched):
+            best_row, best_matched = i + 1, matched
+            if len(matched) == len(expected_fields):
+                break
+    return best_row, best_matched
+
+
+def is_id_like(value):
+    """判断单元格内容是否像商品编号（纯数字，允许Excel转换产生的.0）"""
+    return bool(_ID_PATTERN.match(_normalize_cell(value)))
+
+
+def detect_remark_rows(head_df, header_row, id_field):
+    """
+    识别表头之后、第一条数据之前的备注说明行
+
+    以编号列(如Product ID)判断：表头之后编号列不是数字的连续行视为备注行
+
+    参数:
+    head_df: read_head_rows读取的前几行
+    header_row: 表头行号（从1开始）
+    id_field: 用于判断数据行的编号字段名
+
+    返回:
+    (备注起始行号, 备注结束行号)（从1开始），没有备注行时返回None
+    """
+    header_cells = [_normalize_cell(v) for v in head_df.iloc[header_row - 1]]
+    if id_field not in header_cells:
+        return None
+    id_col = header_cells.index(id_field)
+
+    remark_end = header_row
+    for i in range(header_row, len(head_df)):
+        if is_id_like(head_df.iat[i, id_col]):
+            break
+        remark_end = i + 1
+    else:
+        # 嗅探范围内没有数据行，无法判断
+        return None
+
+    if remark_end == header_row:
+        return None
+    return header_row + 1, remark_end
+
+
+def sniff_layout(head_df, expected_fields, id_field=None):
+    """
+    根据前几行推荐表格布局
+
+    参数:
+    head_df: read_head_rows读取的前几行
+    expected_fields: 期望出现在表头中的字段名列表
+    id_field: 用于识别备注行的编号字段，为None时不识别备注行
+
+    返回:
+    字典：header_row 表头行号、matched 匹配到的字段、complete 是否匹配到全部字段、
+    remark_rows 备注行范围(起始, 结束)或None
+    """
+    header_row, matched = detect_header_row(head_df, expected_fields)
+    remark_rows = None
+    if header_row is not None and id_field is not None:
+        remark_rows = detect_remark_rows(head_df, header_row, id_field)
+    return {
+        "header_row": header_row,
+        "matched": matched,
+        "complete": len(matched) == len(expected_fields),
+        "remark_rows": remark_rows,
+    }
@@ -0,0 +1,150 @@
+"""
+匹配服务压测脚本：对本地运行的matching_service.py并发发送批量匹配请求，输出吞吐量和延迟
+
+使用示例:
+    python loadtest_matching_service.py --url http://127.0.0.1:8765 --batch-size 2000 --requests 200 --concurrency 8
+    python loadtest_matching_service.py --endpoint lookup --skus sku编码.txt --batch-size 5000
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def post_json(url, payload):
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def get_json(url):
+    with urllib.request.urlopen(url) as response:
+        return json.loads(response.read())
+
+
+def build_batches(base_url, batch_size, batch_count, miss_ratio):
+    """
+    从服务抽样真实的Product ID/Variation ID组成/match请求，按比例混入不存在的ID
+    """
+    keys = get_json(f"{base_url}/sample?n={batch_size}")["items"]
+    batches = []
+    for b in range(batch_count):
+        items = []
+        for i in range(batch_size):
+            item = dict(keys[(b + i) % len(keys)])
+            if (i % 100) < miss_ratio * 100:
+                item["Variation ID"] = f"missing-{b}-{i}"
+            item["Recommended Campaign Price"] = 100 + i % 50
+            items.append(item)
+        batches.append(items)
+    return batches
+
+
+def build_sku_batches(base_url, batch_size, batch_count, miss_ratio, sku_file=None):
+    """
+    组成/lookup请求：sku编码取自文件（每行一个）或从服务抽样，按比例混入不存在的sku编码
+    """
+    if sku_file:
+        with open(sku_file, encoding="utf-8") as f:
+            skus = [line.strip() for line in f if line.strip()]
+    else:
+        skus = get_json(f"{base_url}/sample?n={batch_size}")["skus"]
+    if not skus:
+        raise SystemExit("没有可用的sku编码")
+    batches = []
+    for b in range(batch_count):
+        batch = []
+        for i in range(batch_size):
+            if (i % 100) < miss_ratio * 100:
+                batch.append(f"missing-{b}-{i}")
+            else:
+                batch.append(skus[(b + i) % len(skus)])
+        batches.append(batch)
+    return batches
+
+
+def run_load_test(base_url, batches, concurrency, endpoint="match"):
+    """
+    并发发送请求
+
+    返回:
+    (总耗时, 各请求延迟, 错误列表, 命中数)；命中数为/match匹配到工具价格的行数或/lookup查到价格的sku编码数
+    """
+    latencies = []
+    errors = []
+    hits = [0]
+    lock = threading.Lock()
+
+    def send(batch):
+        start = time.perf_counter()
+        try:
+            if endpoint == "match":
+                result = post_json(f"{base_url}/match", {"items": batch})
+                assert len(result["results"]) >= len(batch)
+                found = sum(1 for row in result["results"] if row.get("价格来源") in ("工具价格", "Parent工具价格"))
+            else:
+                result = post_json(f"{base_url}/lookup", {"skus": batch})
+                found = sum(1 for sku in batch if result["prices"].get(sku) is not None)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            hits[0] += found
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, batches))
+    total = time.perf_counter() - start
+    return total, latencies, errors, hits[0]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="匹配服务压测")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--batch-size", type=int, default=2000, help="每个请求包含的ID数量")
+    parser.add_argument("--requests", type=int, default=100, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=4, help="并发连接数")
+    parser.add_argument("--miss-ratio", type=float, default=0.1, help="混入不存在ID的比例")
+    parser.add_argument("--endpoint", choices=["match", "lookup"], default="match")
+    parser.add_argument("--skus", default=None, help="/lookup使用的sku编码文件（每行一个），不指定时从服务抽样")
+    args = parser.parse_args()
+
+    print("服务状态:", json.dumps(get_json(f"{args.url}/health")["tables"], ensure_ascii=False))
+    if args.endpoint == "match":
+        batches = build_batches(args.url, args.batch_size, args.requests, args.miss_ratio)
+    else:
+        batches = build_sku_batches(args.url, args.batch_size, args.requests, args.miss_ratio, args.skus)
+
+    # 预热，避免首个请求的开销影响结果
+    run_load_test(args.url, batches[:args.concurrency], args.concurrency, args.endpoint)
+    total, latencies, errors, hits = run_load_test(args.url, batches, args.concurrency, args.endpoint)
+
+    done = len(latencies)
+    print(f"接口: /{args.endpoint}  并发: {args.concurrency}  每请求ID数: {args.batch_size}")
+    print(f"成功请求: {done}/{len(batches)}  失败: {len(errors)}")
+    if errors:
+        print(f"首个错误: {errors[0]}")
+    if done:
+        # 命中率明显低于(1 - miss-ratio)时，说明请求中的ID不是真实数据，结果不能代表实际负载
+        print(f"命中: {hits:,}/{done * args.batch_size:,} ({hits / (done * args.batch_size):.1%})")
+        print(f"总耗时: {total:.2f}s  吞吐: {done / total:.1f} 请求/秒, {done * args.batch_size / total:,.0f} ID/秒")
+        print(f"延迟(ms): 平均 {statistics.mean(latencies) * 1000:.1f}  "
+              f"p50 {percentile(latencies, 50) * 1000:.1f}  "
+              f"p95 {percentile(latencies, 95) * 1000:.1f}  "
+              f"p99 {percentile(latencies, 99) * 1000:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+本地HTTP匹配服务：常驻内存保存SKU表和工具价格表的索引，供其它内部工具批量查询活动价格
+
+启动示例:
+    python matching_service.py --sku SKU表.xlsx --tool 工具价格表.xlsx --port 8765
+
+接口:
+    GET  /health            服务状态、参考表版本和行数
+    GET  /sample?n=1000     随机抽取n个Product ID/Variation ID和n个工具价格表sku编码（用于压测）
+    POST /match             批量匹配活动价格
+         请求: {"items": [{"Product ID": "...", "Variation ID": "...", "Recommended Campaign Price": 100}, ...]}
+         返回: {"results": [{..., "SKU": "...", "Parent SKU": "...", "Campaign Price": 90, "价格来源": "工具价格"}, ...],
+                "invalid_price_count": 0}（无法转换为数值的推荐价格按缺失处理并计数）
+    POST /lookup            按sku编码直接查询工具价格
+         请求: {"skus": ["A001", ...]}
+         返回: {"prices": {"A001": 90, ...}}（未找到为null）
+    PUT  /tables/sku        上传新版本SKU表（请求体为xlsx文件内容，可带?header_row=N）
+    PUT  /tables/tool       上传新版本工具价格表（上传的版本会写回对应的参考表文件）
+    POST /reload            立即重新检查参考表文件
+
+参考表文件被替换后会在--watch-interval秒内自动热加载，加载期间继续使用旧索引提供服务。
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from duplicate_check import DUPLICATE_POLICIES, resolve_duplicate_keys
+from field_config import (
+    SKU_FIELD, PARENT_SKU_FIELD, TOOL_SKU_FIELD, TOOL_PRICE_FIELD,
+    CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, CAMPAIGN_PRICE_FIELD, CAMPAIGN_RECOMMEND_FIELD,
+    SKU_HEADER_FIELDS, TOOL_HEADER_FIELDS,
+)
+from header_sniffer import read_head_rows, sniff_layout
+from price_matching import (
+    clean_id_column, coerce_price_columns, read_sku_table, read_tool_price_table,
+    merge_sku_info, build_sku_price_dict, build_sku_key_index, get_tool_price_vectorized,
+)
+from shared_cache import content_hash
+
+# 单次请求允许的最大条目数
+MAX_BATCH_ITEMS = 100000
+
+
+def detect_header_row(file_bytes, expected_fields, default_row):
+    """未指定表头行时，通过表头嗅探确定"""
+    sniffed = sniff_layout(read_head_rows(file_bytes), expected_fields)
+    return sniffed["header_row"] if sniffed["complete"] else default_row
+
+
+class ReferenceTable:
+    """
+    一份参考表（SKU表或工具价格表）的当前版本及其预先构建的查找结构
+    """
+
+    def __init__(self, kind, path, header_row, dup_policy):
+        self.kind = kind
+        self.path = path
+        self.header_row = header_row
+        self.dup_policy = dup_policy
+        self.version = None  # 文件内容哈希
+        self.file_stat = None  # (mtime, size)，用于廉价地判断文件是否变化
+        self.loaded_at = None
+        self.df = None
+        self.lookup = None  # 工具价格表为SKU价格字典
+        self.lookup_keys = None  # 工具价格表为价格字典键的索引，匹配时复用
+        self.duplicate_report = None
+
+    def build(self, file_bytes, header_row=None):
+        """
+        由文件内容构建新版本；构建完成后一次性替换，读请求始终看到完整的一份数据
+        """
+        if self.kind == "sku":
+            header_row = header_row or self.header_row or detect_header_row(file_bytes, SKU_HEADER_FIELDS, 3)
+            df = read_sku_table(file_bytes, header_row)
+            df, report = resolve_duplicate_keys(
+                df[[CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, SKU_FIELD, PARENT_SKU_FIELD]],
+                [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID], [SKU_FIELD, PARENT_SKU_FIELD], self.dup_policy
+            )
+            lookup = lookup_keys = None
+        else:
+            header_row = header_row or self.header_row or detect_header_row(file_bytes, TOOL_HEADER_FIELDS, 2)
+            df = read_tool_price_table(file_bytes, header_row)
+            df, report = resolve_duplicate_keys(
+                df[[TOOL_SKU_FIELD, TOOL_PRICE_FIELD]], [TOOL_SKU_FIELD], [TOOL_PRICE_FIELD], self.dup_policy
+            )
+            lookup = build_sku_price_dict(df)
+            lookup_keys = build_sku_key_index(lookup)
+
+        # 按引用整体替换
+        self.df, self.lookup, self.lookup_keys, self.duplicate_report = df, lookup, lookup_keys, report
+        self.version = content_hash(file_bytes)
+        self.loaded_at = time.time()
+        print(f"[{self.kind}] 已加载版本 {self.version[:12]}，{len(df)} 行，"
+              f"重复键 {report['duplicate_keys']} 个（值不一致 {report['conflict_keys']} 个），"
+              f"缺少键的行 {report['missing_key_rows']} 行")
+
+    def replace(self, file_bytes, header_row=None):
+        """
+        用上传的新版本替换参考表：构建成功后原子地写回参考表文件，
+        之后的热加载和/reload读取的是上传的版本，而不是被覆盖前的旧文件
+        """
+        self.build(file_bytes, header_row)
+        if header_row is not None:
+            self.header_row = header_row
+        if self.path is None:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(file_bytes)
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        stat = os.stat(self.path)
+        self.file_stat = (stat.st_mtime, stat.st_size)
+
+    def reload_if_changed(self, force=False):
+        """
+        文件修改时间或大小变化后读取内容，内容哈希变化才重新构建
+
+        返回:
+        是否加载了新版本
+        """
+        if self.path is None:
+            return False
+        stat = os.stat(self.path)
+        file_stat = (stat.st_mtime, stat.st_size)
+        if not force and file_stat == self.file_stat:
+            return False
+        with open(self.path, "rb") as f:
+            file_bytes = f.read()
+        self.file_stat = file_stat
+        if content_hash(file_bytes) == self.version:
+            return False
+        self.build(file_bytes)
+        return True
+
+    def info(self):
+        return {
+            "path": self.path,
+            "version": self.version,
+            "rows": 0 if self.df is None else len(self.df),
+            "loaded_at": self.loaded_at,
+            "duplicate_keys": None if self.duplicate_report is None else self.duplicate_report["duplicate_keys"],
+            "conflict_keys": None if self.duplicate_report is None else self.duplicate_report["conflict_keys"],
+            "missing_key_rows": None if self.duplicate_report is None else self.duplicate_report["missing_key_rows"],
+        }
+
+
+class MatchingIndex:
+    """
+    常驻内存的匹配索引，复用与界面相同的匹配逻辑（merge_sku_info + get_tool_price_vectorized）
+    """
+
+    def __init__(self, sku_table, tool_table):
+        self.sku_table = sku_table
+        self.tool_table = tool_table
+        # 只串行化重新加载，匹配请求读取的是当时的引用，无需加锁
+        self._reload_lock = threading.Lock()
+
+    def reload(self, force=False):
+        with self._reload_lock:
+            changed = []
+            for table in (self.sku_table, self.tool_table):
+                try:
+                    if table.reload_if_changed(force=force):
+                        changed.append(table.kind)
+                except Exception as e:
+                    # 新版本加载失败时继续使用旧版本
+                    print(f"[{table.kind}] 重新加载失败，继续使用旧版本: {e}")
+            return changed
+
+    def upload(self, kind, file_bytes, header_row=None):
+        table = self.sku_table if kind == "sku" else self.tool_table
+        with self._reload_lock:
+            table.replace(file_bytes, header_row)
+
+    def match(self, items):
+        """
+        批量匹配活动价格
+
+        参数:
+        items: 字典列表，每项至少包含Product ID和Variation ID
+
+        返回:
+        (匹配结果的字典列表（顺序与输入一致）, 无法转换为数值的价格个数)
+        """
+        sku_df, sku_price_dict, sku_keys = self.sku_table.df, self.tool_table.lookup, self.tool_table.lookup_keys
+        if not all(isinstance(item, dict) for item in items):
+            raise ValueError("items中的每一项都必须是JSON对象")
+        campaign_df = pd.DataFrame.from_records(items)
+        for col in [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID]:
+            if col not in campaign_df.columns:
+                raise ValueError(f"请求缺少字段: {col}")
+            campaign_df = clean_id_column(campaign_df, col)
+        if CAMPAIGN_RECOMMEND_FIELD not in campaign_df.columns:
+            campaign_df[CAMPAIGN_RECOMMEND_FIELD] = None
+
+        # 与界面一致：价格列转换为数值并去掉小数，无法转换的推荐价格按缺失处理，不影响整批请求
+        invalid_count = coerce_price_columns(campaign_df, [CAMPAIGN_RECOMMEND_FIELD])
+        result_df = get_tool_price_vectorized(
+            merge_sku_info(campaign_df, sku_df), self.tool_table.df, sku_price_dict, verbose=False, sku_keys=sku_keys
+        )
+        invalid_count += coerce_price_columns(result_df, [CAMPAIGN_PRICE_FIELD])
+        # to_json会把NaN转换为null
+        return json.loads(result_df.to_json(orient="records", force_ascii=False)), invalid_count
+
+    def lookup_prices(self, skus):
+        sku_price_dict = self.tool_table.lookup
+        prices = {}
+        for sku in skus:
+            price = sku_price_dict.get(str(sku).strip())
+            prices[sku] = None if price is None or pd.isna(price) else float(price)
+        return prices
+
+    def sample_keys(self, n):
+        sku_df = self.sku_table.df
+        rows = sku_df.sample(n=min(n, len(sku_df)), random_state=random.randint(0, 2**31 - 1))
+        return rows[[CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID]].to_dict(orient="records")
+
+    def sample_skus(self, n):
+        """从当前工具价格字典中随机抽取n个sku编码"""
+        skus = list(self.tool_table.lookup)
+        return random.sample(skus, min(n, len(skus)))
+
+    def info(self):
+        return {"sku": self.sku_table.info(), "tool": self.tool_table.info()}
+
+
+def make_handler(index):
+    class MatchingRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            # 压测时请求量很大，不逐条输出访问日志
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_body(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return self.rfile.read(length) if length else b""
+
+        def _read_json(self):
+            try:
+                payload = json.loads(self._read_body() or b"{}")
+            except ValueError:
+                raise ValueError("请求体不是有效的JSON")
+            if not isinstance(payload, dict):
+                raise ValueError("请求体必须是JSON对象")
+            return payload
+
+        def _read_list(self, field):
+            """读取请求体中的列表字段，并检查条目数量"""
+            values = self._read_json().get(field, [])
+            if not isinstance(values, list):
+                raise ValueError(f"{field}必须是列表")
+            if len(values) > MAX_BATCH_ITEMS:
+                raise ValueError(f"单次请求最多{MAX_BATCH_ITEMS}条，实际{len(values)}条")
+            return values
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/health":
+                self._send_json(200, {"status": "ok", "tables": index.info()})
+            elif url.path == "/sample":
+                n = int(parse_qs(url.query).get("n", ["1000"])[0])
+                self._send_json(200, {"items": index.sample_keys(n), "skus": index.sample_skus(n)})
+            else:
+                self._send_json(404, {"error": f"未知路径: {url.path}"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            try:
+                if url.path == "/match":
+                    items = self._read_list("items")
+                    results, invalid_count = index.match(items) if items else ([], 0)
+                    self._send_json(200, {"results": results, "invalid_price_count": invalid_count})
+                elif url.path == "/lookup":
+                    skus = self._read_list("skus")
+                    self._send_json(200, {"prices": index.lookup_prices(skus)})
+                elif url.path == "/reload":
+                    self._send_json(200, {"reloaded": index.reload(force=True), "tables": index.info()})
+                else:
+                    self._send_json(404, {"error": f"未知路径: {url.path}"})
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+            except Exception as e:
+                self._send_json(500, {"error": str(e)})
+
+        def do_PUT(self):
+            url = urlparse(self.path)
+            kind = url.path.rsplit("/", 1)[-1]
+            if not url.path.startswith("/tables/") or kind not in ("sku", "tool"):
+                self._send_json(404, {"error": f"未知路径: {url.path}"})
+                return
+            header_row = parse_qs(url.query).get("header_row", [None])[0]
+            try:
+                index.upload(kind, self._read_body(), int(header_row) if header_row else None)
+                self._send_json(200, {"tables": index.info()})
+            except Exception as e:
+                self._send_json(400, {"error": f"加载失败，继续使用旧版本: {e}"})
+
+    return MatchingRequestHandler
+
+
+def watch_reference_tables(index, interval):
+    """后台线程：定时检查参考表文件，变化后热加载"""
+    while True:
+        time.sleep(interval)
+        changed = index.reload()
+        if changed:
+            print(f"已热加载: {', '.join(changed)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SKU活动价本地匹配服务")
+    parser.add_argument("--sku", required=True, help="SKU表文件路径")
+    parser.add_argument("--tool", required=True, help="工具价格表文件路径")
+    parser.add_argument("--sku-header-row", type=int, default=None, help="SKU表表头所在行，不指定时自动识别")
+    parser.add_argument("--tool-header-row", type=int, default=None, help="工具价格表表头所在行，不指定时自动识别")
+    parser.add_argument("--sku-dup-policy", choices=list(DUPLICATE_POLICIES), default="first")
+    parser.add_argument("--tool-dup-policy", choices=list(DUPLICATE_POLICIES), default="last")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--watch-interval", type=float, default=5.0, help="检查参考表文件变化的间隔（秒）")
+    args = parser.parse_args()
+
+    index = MatchingIndex(
+        ReferenceTable("sku", args.sku, args.sku_header_row, args.sku_dup_policy),
+        ReferenceTable("tool", args.tool, args.tool_header_row, args.tool_dup_policy),
+    )
+    index.reload(force=True)
+    if index.sku_table.df is None or index.tool_table.df is None:
+        raise SystemExit("参考表加载失败，服务未启动")
+
+    threading.Thread(target=watch_reference_tables, args=(index, args.watch_interval), daemon=True).start()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(index))
+    print(f"匹配服务已启动: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
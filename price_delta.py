@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+
+from field_config import (
+    SKU_FIELD, PARENT_SKU_FIELD, TOOL_SKU_FIELD,
+    CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, CAMPAIGN_PRICE_FIELD, CAMPAIGN_RECOMMEND_FIELD,
+)
+from price_matching import coerce_price_columns, get_tool_price_vectorized
+
+# 工具价格匹配写入的结果列，增量更新时只替换受影响行的这些列
+MATCH_RESULT_COLUMNS = [CAMPAIGN_PRICE_FIELD, '价格来源']
+
+# 审核表中需要保留的人工决定
+REVIEW_KEY_COLUMNS = [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID]
+REVIEW_DECISION_COLUMNS = [CAMPAIGN_PRICE_FIELD, '已人工确认']
+
+
+def diff_price_dicts(old_dict, new_dict):
+    """
+    按sku编码比较两个版本的工具价格字典
+
+    参数:
+    old_dict: 旧版本的 {sku编码: 活动价格}
+    new_dict: 新版本的 {sku编码: 活动价格}
+
+    返回:
+    有变化的sku编码DataFrame：sku编码、变更类型（新增/删除/价格变更）、旧价格、新价格
+    """
+    old = pd.Series(old_dict, dtype=object, name='旧价格')
+    new = pd.Series(new_dict, dtype=object, name='新价格')
+    joined = pd.concat([old, new], axis=1)
+    in_old = joined.index.isin(old.index)
+    in_new = joined.index.isin(new.index)
+    same_price = (joined['旧价格'] == joined['新价格']) | (joined['旧价格'].isna() & joined['新价格'].isna())
+    changed_mask = ~same_price.to_numpy(dtype=bool) | (in_old != in_new)
+
+    changed = joined[changed_mask].copy()
+    changed.insert(0, '变更类型', np.select(
+        [~in_old[changed_mask], ~in_new[changed_mask]], ['新增', '删除'], default='价格变更'
+    ))
+    return changed.rename_axis(TOOL_SKU_FIELD).reset_index()
+
+
+def find_affected_rows(campaign_df, changed_skus):
+    """
+    找出SKU或Parent SKU的工具价格有变化的行
+
+    参数:
+    campaign_df: 已合并SKU信息的活动价格表
+    changed_skus: 有变化的sku编码集合
+
+    返回:
+    布尔Series，标记需要重新匹配的行
+    """
+    affected = pd.Series(False, index=campaign_df.index)
+    for col in [SKU_FIELD, PARENT_SKU_FIELD]:
+        if col in campaign_df.columns:
+            affected |= campaign_df[col].astype(str).str.strip().isin(changed_skus)
+    return affected
+
+
+def rematch_changed_skus(previous_df, old_dict, new_dict, tool_price_df, progress=None):
+    """
+    工具价格表更新后只重新匹配受影响的行，其余行的匹配结果保持不变
+
+    每行的匹配结果只取决于该行SKU和Parent SKU在价格字典中的价格，
+    因此只重新匹配这些行，结果与整表重新匹配相同。
+
+    参数:
+    previous_df: 上一版本的匹配结果（get_tool_price_vectorized的输出，价格列已转换为数值）
+    old_dict: 上一版本的工具价格字典
+    new_dict: 新版本的工具价格字典
+    tool_price_df: 新版本的工具价格表（已处理重复键）
+    progress: 进度回调 progress(阶段, 已处理行数, 总行数)
+
+    返回:
+    (新的匹配结果, 变更报告)
+    变更报告包含changed_skus(有变化的sku编码)、affected_rows(重新匹配的行数)、
+    affected_keys(重新匹配行的Product ID/Variation ID)、
+    changed_rows(活动价格或价格来源发生变化的行，含变化前后的值)
+    """
+    if progress is not None:
+        progress('比较工具价格', 0, len(new_dict))
+    changed_skus = diff_price_dicts(old_dict, new_dict)
+    affected = find_affected_rows(previous_df, set(changed_skus[TOOL_SKU_FIELD]))
+    if progress is not None:
+        progress('比较工具价格', len(new_dict), len(new_dict))
+
+    result_df = previous_df.copy()
+    invalid_count = previous_df.attrs.get('invalid_price_count', 0)
+    if affected.any():
+        input_columns = [col for col in previous_df.columns if col not in MATCH_RESULT_COLUMNS]
+        rematched = get_tool_price_vectorized(
+            previous_df.loc[affected, input_columns].copy(), tool_price_df, new_dict, progress=progress
+        )
+        invalid_count += coerce_price_columns(rematched, [CAMPAIGN_PRICE_FIELD])
+        result_df.loc[affected, MATCH_RESULT_COLUMNS] = rematched[MATCH_RESULT_COLUMNS]
+    result_df.attrs['invalid_price_count'] = invalid_count
+
+    before = previous_df.loc[affected]
+    after = result_df.loc[affected]
+    price_changed = ~((before[CAMPAIGN_PRICE_FIELD] == after[CAMPAIGN_PRICE_FIELD])
+                      | (before[CAMPAIGN_PRICE_FIELD].isna() & after[CAMPAIGN_PRICE_FIELD].isna()))
+    source_changed = before['价格来源'] != after['价格来源']
+    row_changed = price_changed | source_changed
+    id_columns = [col for col in REVIEW_KEY_COLUMNS + [SKU_FIELD, PARENT_SKU_FIELD] if col in previous_df.columns]
+    changed_rows = before.loc[row_changed, id_columns + [CAMPAIGN_RECOMMEND_FIELD]].copy()
+    changed_rows['原价格来源'] = before.loc[row_changed, '价格来源']
+    changed_rows['新价格来源'] = after.loc[row_changed, '价格来源']
+    changed_rows['原活动价格'] = before.loc[row_changed, CAMPAIGN_PRICE_FIELD]
+    changed_rows['新活动价格'] = after.loc[row_changed, CAMPAIGN_PRICE_FIELD]
+
+    report = {
+        'changed_skus': changed_skus,
+        'affected_rows': int(affected.sum()),
+        'affected_keys': before[REVIEW_KEY_COLUMNS].drop_duplicates().reset_index(drop=True),
+        'changed_rows': changed_rows.reset_index(drop=True),
+    }
+    return result_df, report
+
+
+def extract_review_decisions(price_input):
+    """
+    从审核表的编辑结果中提取人工决定（改过价格或勾选了人工确认的行）
+
+    返回:
+    DataFrame：Product ID、Variation ID、活动价格、已人工确认；没有时为None
+    """
+    needed = REVIEW_KEY_COLUMNS + REVIEW_DECISION_COLUMNS + ['已修改']
+    if price_input is None or price_input.empty or not all(col in price_input.columns for col in needed):
+        return None
+    decided = price_input['已修改'].fillna(False).astype(bool) | price_input['已人工确认'].fillna(False).astype(bool)
+    decisions = price_input.loc[decided, REVIEW_KEY_COLUMNS + REVIEW_DECISION_COLUMNS]
+    return decisions.drop_duplicates(subset=REVIEW_KEY_COLUMNS, keep='last').reset_index(drop=True)
+
+
+def drop_affected_decisions(decisions, affected_keys):
+    """去掉重新匹配行上的人工决定，这些行需要按新价格重新审核"""
+    if decisions is None or decisions.empty or affected_keys.empty:
+        return decisions
+    decision_keys = pd.MultiIndex.from_frame(decisions[REVIEW_KEY_COLUMNS])
+    affected = pd.MultiIndex.from_frame(affected_keys[REVIEW_KEY_COLUMNS])
+    return decisions[~decision_keys.isin(affected)].reset_index(drop=True)
+
+
+def apply_review_decisions(editable_df, decisions):
+    """
+    把保留的人工决定填回审核表（按Product ID/Variation ID匹配）
+
+    参数:
+    editable_df: 审核表数据（原地修改）
+    decisions: extract_review_decisions返回的人工决定
+
+    返回:
+    填回的行数
+    """
+    if decisions is None or decisions.empty or editable_df.empty:
+        return 0
+    row_keys = pd.MultiIndex.from_frame(editable_df[REVIEW_KEY_COLUMNS])
+    decision_index = pd.MultiIndex.from_frame(decisions[REVIEW_KEY_COLUMNS])
+    positions = decision_index.get_indexer(row_keys)
+    matched = positions >= 0
+    for col in REVIEW_DECISION_COLUMNS:
+        values = decisions[col].to_numpy()[positions[matched]]
+        editable_df.loc[matched, col] = values
+    return int(matched.sum())
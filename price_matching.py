@@ -0,0 +1,272 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from field_config import (
+    SKU_FIELD, PARENT_SKU_FIELD, TOOL_SKU_FIELD, TOOL_PRICE_FIELD,
+    CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, CAMPAIGN_PRICE_FIELD, CAMPAIGN_RECOMMEND_FIELD,
+)
+
+# 匹配进度上报间隔（行）
+PROGRESS_EVERY_ROWS = 2000
+
+def strip_columns(df):
+    if df is not None:
+        df.columns = [str(col).strip() for col in df.columns]
+    return df
+
+def clean_id_column(df, col):
+    if df is not None and col in df.columns:
+        df[col] = df[col].astype(str).str.strip().str.replace('.0', '', regex=False)
+    return df
+
+def coerce_price_columns(df, columns):
+    """
+    向量化地把价格列转换为数值并去掉小数部分（与int(float(x))一致），只需转换一次，
+    显示时的千分位等格式由表格的valueFormatter和导出时的Excel数字格式负责
+    
+    参数:
+    df: 要转换的DataFrame（原地修改）
+    columns: 价格列名列表，不存在的列会跳过
+    
+    返回:
+    无法转换为数值的非空值个数（这些值被置为NaN）
+    """
+    invalid_count = 0
+    for col in columns:
+        if col not in df.columns:
+            continue
+        values = df[col]
+        # 空字符串视为缺失值
+        if not pd.api.types.is_numeric_dtype(values):
+            values = values.replace(r'^\s*$', np.nan, regex=True)
+        numeric = pd.to_numeric(values, errors='coerce')
+        invalid_count += int((numeric.isna() & values.notna()).sum())
+        df[col] = np.trunc(numeric.astype(float))
+    return invalid_count
+
+def read_sku_table(file_bytes, header_row):
+    """
+    解析并清洗SKU表
+    
+    参数:
+    file_bytes: 文件的二进制内容
+    header_row: 表头所在行（从1开始）
+    
+    返回:
+    清洗后的sku_df
+    """
+    # 先读取为BytesIO，兼容openpyxl
+    df = strip_columns(pd.read_excel(io.BytesIO(file_bytes), header=header_row-1))
+    # 保证用于合并的字段类型一致，并去除小数点（如.0），保证编号匹配
+    for col in [SKU_FIELD, PARENT_SKU_FIELD, CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID]:
+        df = clean_id_column(df, col)
+    return df
+
+def read_tool_price_table(file_bytes, header_row):
+    """
+    解析并清洗工具价格表
+    
+    参数:
+    file_bytes: 文件的二进制内容
+    header_row: 表头所在行（从1开始）
+    
+    返回:
+    清洗后的tool_price_df
+    """
+    df = strip_columns(pd.read_excel(io.BytesIO(file_bytes), header=header_row-1))
+    return clean_id_column(df, TOOL_SKU_FIELD)
+
+def merge_sku_info(campaign_df, sku_df):
+    """
+    按Product ID/Variation ID把SKU和Parent SKU合并到活动价格表
+    
+    参数:
+    campaign_df: 活动价格表DataFrame
+    sku_df: SKU表DataFrame（应已处理重复键）
+    
+    返回:
+    合并后的新DataFrame
+    """
+    sku_id_columns = [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID]
+    sku_merge_columns = [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, SKU_FIELD, PARENT_SKU_FIELD]
+    return campaign_df.merge(sku_df[sku_merge_columns], on=sku_id_columns, how="left")
+
+# 从工具价格表构建SKU价格映射字典，结果可放入共享缓存供多个会话复用
+def build_sku_price_dict(tool_price_df):
+    """
+    创建SKU对应的价格映射字典 - 比逐行查找更高效
+    
+    参数:
+    tool_price_df: 工具价格表DataFrame
+    
+    返回:
+    {sku编码: 活动价格} 字典，已移除'nan'键
+    """
+    sku_price_dict = dict(zip(
+        tool_price_df[TOOL_SKU_FIELD].astype(str).str.strip(),
+        tool_price_df[TOOL_PRICE_FIELD]
+    ))
+    
+    # 调试信息：输出字典信息
+    print(f"价格字典包含SKU数量: {len(sku_price_dict)}")
+    if len(sku_price_dict) > 0:
+        # 随机抽样5个
+        sample_keys = list(sku_price_dict.keys())[:5]
+        print(f"样本SKU: {sample_keys}")
+        print(f"样本价格: {[sku_price_dict[k] for k in sample_keys]}")
+    
+    # 检查nan值
+    if 'nan' in sku_price_dict:
+        print(f"警告: 价格字典中包含'nan'键，值为: {sku_price_dict['nan']}")
+        # 从字典中移除'nan'键，避免错误匹配
+        del sku_price_dict['nan']
+        print("已从价格字典中移除'nan'键")
+    
+    return sku_price_dict
+
+def build_sku_key_index(sku_price_dict):
+    """
+    为SKU价格字典的键建立索引，供get_tool_price_vectorized的sku_keys参数反复使用；
+    同一字典需要多次匹配时（如匹配服务）只建一次哈希表
+    
+    参数:
+    sku_price_dict: build_sku_price_dict返回的字典
+    
+    返回:
+    已建好哈希表的pd.Index
+    """
+    sku_keys = pd.Index(list(sku_price_dict))
+    # 构建时就建好哈希表，避免第一次查询时再建
+    sku_keys.get_indexer(sku_keys[:1])
+    return sku_keys
+
+# 修改get_tool_price函数为更高效的向量化版本
+def get_tool_price_vectorized(campaign_df, tool_price_df, sku_price_dict=None, progress=None, verbose=True,
+                              sku_keys=None):
+    """
+    向量化处理SKU价格匹配，替代逐行apply操作
+    
+    参数:
+    campaign_df: 活动价格表DataFrame
+    tool_price_df: 工具价格表DataFrame
+    sku_price_dict: 预先构建的SKU价格字典（只读），为None时由tool_price_df构建
+    progress: 进度回调 progress(阶段, 已处理行数, 总行数)，用于后台任务
+    verbose: 是否输出调试信息（匹配服务逐请求调用时关闭）
+    sku_keys: 预先构建的sku_price_dict键索引（pd.Index，见build_sku_key_index），
+              为None时每次调用按字典的键临时建立哈希表
+    
+    返回:
+    更新后的campaign_df，添加价格和价格来源列
+    """
+    log = print if verbose else (lambda *args: None)
+    # 调试信息：输出数据结构
+    log(f"活动表包含行数: {len(campaign_df)}")
+    log(f"工具价格表包含行数: {len(tool_price_df)}")
+    log(f"是否包含SKU列: {SKU_FIELD in campaign_df.columns}")
+    log(f"是否包含Parent SKU列: {PARENT_SKU_FIELD in campaign_df.columns}")
+    
+    # 初始化结果列
+    campaign_df[CAMPAIGN_PRICE_FIELD] = np.nan
+    campaign_df['价格来源'] = '推荐价格'  # 默认来源为推荐价格
+    
+    if sku_price_dict is None:
+        sku_price_dict = build_sku_price_dict(tool_price_df)
+    
+    # 1. 首先尝试直接匹配SKU
+    if SKU_FIELD in campaign_df.columns:
+        sku_values = campaign_df[SKU_FIELD].astype(str).str.strip()
+        if sku_keys is not None:
+            # 复用索引已建好的哈希表，不再为整个字典重建
+            sku_mask = pd.Series(sku_keys.get_indexer(sku_values) >= 0, index=campaign_df.index)
+        else:
+            sku_mask = sku_values.isin(sku_price_dict.keys())
+        if sku_mask.any():
+            sku_indexes = campaign_df[sku_mask].index
+            # 对匹配到的SKU设置价格
+            for i, idx in enumerate(sku_indexes):
+                if progress is not None and i % PROGRESS_EVERY_ROWS == 0:
+                    progress('SKU匹配', i, len(sku_indexes))
+                sku = str(campaign_df.at[idx, SKU_FIELD]).strip()
+                # 排除nan和空字符串
+                if sku.lower() == 'nan' or sku == '':
+                    continue
+                    
+                if sku in sku_price_dict:
+                    price_val = sku_price_dict[sku]
+                    # 修改逻辑：区分有效工具价格和无效工具价格（零或空）
+                    if pd.notnull(price_val) and price_val > 0:
+                        campaign_df.at[idx, CAMPAIGN_PRICE_FIELD] = price_val
+                        campaign_df.at[idx, '价格来源'] = '工具价格'
+                    elif pd.notnull(price_val) and price_val == 0:
+                        # 价格为零，标记为无效工具价格，仍使用推荐价格
+                        campaign_df.at[idx, CAMPAIGN_PRICE_FIELD] = campaign_df.at[idx, CAMPAIGN_RECOMMEND_FIELD]
+                        campaign_df.at[idx, '价格来源'] = '无效工具价格(零)'
+            if progress is not None:
+                progress('SKU匹配', len(sku_indexes), len(sku_indexes))
+    
+    # 2. 然后尝试匹配Parent SKU (对未匹配到SKU的行)
+    if PARENT_SKU_FIELD in campaign_df.columns:
+        # 找出还没匹配到价格或标记为无效工具价格的行
+        parent_mask = ((campaign_df['价格来源'] == '推荐价格') | 
+                       (campaign_df['价格来源'] == '无效工具价格(零)')) & campaign_df[PARENT_SKU_FIELD].notna()
+        
+        # 添加调试信息
+        parent_count = parent_mask.sum()
+        log(f"需要尝试Parent SKU匹配的行数: {parent_count}")
+        
+        if parent_mask.any():
+            # 输出一些Parent SKU样本
+            parent_sample = campaign_df[parent_mask][PARENT_SKU_FIELD].head(5).tolist()
+            log(f"Parent SKU样本: {parent_sample}")
+            log(f"这些Parent SKU是否在价格字典中: {[sku in sku_price_dict for sku in parent_sample]}")
+            
+            # 创建一个字典记录哪些Parent SKU被成功匹配
+            parent_matched = {}
+            
+            parent_indexes = campaign_df[parent_mask].index
+            # 对匹配到的Parent SKU设置价格
+            for i, idx in enumerate(parent_indexes):
+                if progress is not None and i % PROGRESS_EVERY_ROWS == 0:
+                    progress('Parent SKU匹配', i, len(parent_indexes))
+                parent_sku = str(campaign_df.at[idx, PARENT_SKU_FIELD]).strip()
+                # 排除nan和空字符串
+                if parent_sku.lower() == 'nan' or parent_sku == '':
+                    continue
+                    
+                if parent_sku in sku_price_dict:
+                    price_val = sku_price_dict[parent_sku]
+                    # 修改逻辑：区分有效工具价格和无效工具价格（零或空）
+                    if pd.notnull(price_val) and price_val > 0:
+                        campaign_df.at[idx, CAMPAIGN_PRICE_FIELD] = price_val
+                        campaign_df.at[idx, '价格来源'] = 'Parent工具价格'
+                        # 记录匹配成功
+                        if parent_sku not in parent_matched:
+                            parent_matched[parent_sku] = 1
+                        else:
+                            parent_matched[parent_sku] += 1
+                    elif pd.notnull(price_val) and price_val == 0:
+                        # Parent价格为零，也标记为无效工具价格
+                        campaign_df.at[idx, CAMPAIGN_PRICE_FIELD] = campaign_df.at[idx, CAMPAIGN_RECOMMEND_FIELD]
+                        campaign_df.at[idx, '价格来源'] = '无效Parent工具价格(零)'
+            if progress is not None:
+                progress('Parent SKU匹配', len(parent_indexes), len(parent_indexes))
+            
+            # 输出Parent SKU匹配统计
+            log(f"通过Parent SKU成功匹配的行数: {sum(parent_matched.values())}")
+            log(f"成功匹配的唯一Parent SKU数量: {len(parent_matched)}")
+            if len(parent_matched) > 0:
+                top_parents = sorted(parent_matched.items(), key=lambda x: x[1], reverse=True)[:5]
+                log(f"匹配次数最多的Parent SKU: {top_parents}")
+                
+                # 检查这些Parent SKU对应的价格
+                for parent, _ in top_parents:
+                    if parent in sku_price_dict:
+                        log(f"Parent SKU {parent} 对应价格: {sku_price_dict[parent]}")
+    
+    # 3. 最后，对未匹配到的行使用推荐价格
+    remaining_mask = (campaign_df['价格来源'] == '推荐价格')
+    campaign_df.loc[remaining_mask, CAMPAIGN_PRICE_FIELD] = campaign_df.loc[remaining_mask, CAMPAIGN_RECOMMEND_FIELD]
+    
+    return campaign_df
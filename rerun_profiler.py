@@ -0,0 +1,106 @@
+import cProfile
+import marshal
+import os
+import sys
+import time
+
+import pandas as pd
+
+# Python 3.12起cProfile基于sys.monitoring，记录进程内所有线程，无法只采集当前线程
+PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+def start_capture():
+    """
+    开始采集性能数据（确定性分析，cProfile）
+
+    Python 3.11及以前只记录调用本函数的线程；3.12起记录进程内所有线程，
+    采集期间其它会话的脚本运行和后台任务也会计入结果（见PROFILES_ALL_THREADS）。
+    本会话的后台任务在采集时同步执行，因此总会计入。
+
+    返回:
+    (profiler, 开始时间)；其它会话正在采集时（Python 3.12起同一时间只允许一个分析器）返回(None, None)
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None, None
+    return profiler, time.perf_counter()
+
+
+def stats_to_frame(stats):
+    """
+    把pstats统计字典转换为DataFrame
+
+    参数:
+    stats: {(文件, 行号, 函数名): (原始调用次数, 总调用次数, 自身耗时, 累计耗时, 调用者)}
+
+    返回:
+    每个函数一行的DataFrame
+    """
+    rows = []
+    for (filename, lineno, funcname), (cc, nc, tt, ct, _) in stats.items():
+        rows.append({
+            "函数": funcname,
+            "文件": os.path.basename(filename) if filename != "~" else "(内置)",
+            "行号": lineno,
+            "调用次数": nc,
+            "自身耗时(秒)": tt,
+            "累计耗时(秒)": ct,
+        })
+    return pd.DataFrame(rows)
+
+
+def finish_capture(profiler, started_at):
+    """
+    停止采集并整理结果
+
+    返回:
+    字典：wall_time 本次运行耗时、prof_bytes 可用pstats/snakeviz打开的.prof内容、functions 各函数统计、
+    all_threads 结果是否包含其它线程
+    """
+    profiler.disable()
+    wall_time = time.perf_counter() - started_at
+    profiler.create_stats()
+    return {
+        "captured_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "wall_time": wall_time,
+        # 与Profile.dump_stats写出的文件格式相同
+        "prof_bytes": marshal.dumps(profiler.stats),
+        "functions": stats_to_frame(profiler.stats),
+        "all_threads": PROFILES_ALL_THREADS,
+    }
+
+
+def top_hotspots(functions_df, top_n=30, sort_by="累计耗时(秒)"):
+    """返回按指定列排序的前top_n个函数"""
+    return functions_df.sort_values(sort_by, ascending=False).head(top_n).reset_index(drop=True)
+
+
+def stage_summary(functions_df, stage_functions):
+    """
+    汇总关键阶段的耗时
+
+    参数:
+    functions_df: finish_capture返回的functions
+    stage_functions: {阶段名称: 函数名}
+
+    返回:
+    DataFrame：阶段、函数、调用次数、累计耗时；本次运行未执行的阶段不列出
+    """
+    rows = []
+    for stage, funcname in stage_functions.items():
+        matched = functions_df[functions_df["函数"] == funcname]
+        if matched.empty:
+            continue
+        # 同名函数（如重复定义）取累计耗时最大的一条
+        best = matched.sort_values("累计耗时(秒)", ascending=False).iloc[0]
+        rows.append({
+            "阶段": stage,
+            "函数": funcname,
+            "调用次数": int(best["调用次数"]),
+            "累计耗时(秒)": best["累计耗时(秒)"],
+        })
+    return pd.DataFrame(rows)
+
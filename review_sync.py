@@ -0,0 +1,168 @@
+import pandas as pd
+import streamlit as st
+
+from field_config import CAMPAIGN_PRICE_FIELD
+
+# 审核数据同步和导出合并，不依赖脚本中的界面状态，可单独导入（golden_check.py用其与基准实现比对）
+
+# 新增：同步价格数据的辅助函数，避免重复代码
+def sync_price_data(campaign_df, price_input_df, key_columns, value_columns=None, update_price_source=False):
+    """
+    将price_input_df中的数据同步到campaign_df中
+    
+    参数:
+    campaign_df: 目标DataFrame
+    price_input_df: 源DataFrame
+    key_columns: 用于匹配两个DataFrame的键列
+    value_columns: 需要同步的值列，默认为None时将自动确定
+    update_price_source: 是否更新价格来源，默认为False
+    
+    返回:
+    更新后的campaign_df
+    """
+    if value_columns is None:
+        value_columns = [CAMPAIGN_PRICE_FIELD]
+        # 检查其它可能的值列是否存在
+        for col in ['已修改', '价格有效', '已人工确认']:
+            if col in price_input_df.columns:
+                value_columns.append(col)
+    
+    # 确保所有值列都存在于price_input_df中
+    existing_columns = [col for col in value_columns if col in price_input_df.columns]
+    if len(existing_columns) < len(value_columns):
+        missing = set(value_columns) - set(existing_columns)
+        st.warning(f"同步数据时发现缺失列: {', '.join(missing)}")
+        value_columns = existing_columns
+    
+    # 如果'已人工确认'不在campaign_df但需要同步，添加该列
+    if '已人工确认' in value_columns and '已人工确认' not in campaign_df.columns:
+        campaign_df['已人工确认'] = False
+        
+    # 如果'已修改'不在campaign_df但需要同步，添加该列    
+    if '已修改' in value_columns and '已修改' not in campaign_df.columns:
+        campaign_df['已修改'] = False
+    
+    try:
+        price_input_indexed = price_input_df.set_index(key_columns)
+        
+        for idx, row in campaign_df.iterrows():
+            # 构建匹配键
+            key = tuple(str(row[col]).strip().replace('.0', '') if pd.notnull(row[col]) else '' for col in key_columns)
+            
+            if key in price_input_indexed.index:
+                # 同步值字段
+                for col in value_columns:
+                    if col in price_input_indexed.columns:
+                        campaign_df.at[idx, col] = price_input_indexed.at[key, col]
+                
+                # 更新价格来源
+                if update_price_source and '价格来源' in campaign_df.columns and '已修改' in price_input_indexed.columns:
+                    if price_input_indexed.at[key, '已修改']:
+                        campaign_df.at[idx, '价格来源'] = '推荐价格'
+    except Exception as e:
+        st.error(f"同步数据时出错: {str(e)}")
+    
+    return campaign_df
+
+# === 更高效的价格设置方法 ===
+def apply_campaign_price_to_export(export_df, campaign_df, key_columns):
+    """
+    更高效地将活动价格应用到导出DataFrame
+    
+    参数:
+    export_df: 导出用的DataFrame
+    campaign_df: 包含价格和来源信息的DataFrame
+    key_columns: 用于匹配两个DataFrame的键列
+    
+    返回:
+    更新后的export_df
+    """
+    # 准备需要的字段
+    if len(key_columns) == 0:
+        st.warning("没有找到合适的键列进行数据匹配")
+        return export_df
+    
+    # 确保campaign_df中包含必要的列
+    required_columns = [CAMPAIGN_PRICE_FIELD, '价格来源']
+    for col in required_columns:
+        if col not in campaign_df.columns:
+            st.error(f"数据处理错误: campaign_df中缺少必要列 '{col}'")
+            return export_df
+    
+    # 确保必要的列存在，如不存在则创建
+    if '已修改' not in campaign_df.columns:
+        campaign_df['已修改'] = False
+    
+    if '已人工确认' not in campaign_df.columns:
+        campaign_df['已人工确认'] = False
+    
+    # 创建匹配用的键
+    campaign_df['匹配键'] = campaign_df[key_columns].astype(str).apply(
+        lambda x: '-'.join([str(i).strip().replace('.0', '') for i in x]), axis=1
+    )
+    export_df['匹配键'] = export_df[key_columns].astype(str).apply(
+        lambda x: '-'.join([str(i).strip().replace('.0', '') for i in x]), axis=1
+    )
+    
+    # 提取要复制的字段，增加已人工确认列
+    campaign_slim = campaign_df[['匹配键', CAMPAIGN_PRICE_FIELD, '价格来源', '已修改', '已人工确认']].copy()
+    
+    # 使用merge代替循环 - 更高效
+    result_df = export_df.merge(campaign_slim, on='匹配键', how='left', suffixes=('', '_new'))
+    
+    # 更新价格
+    if CAMPAIGN_PRICE_FIELD + '_new' in result_df.columns:
+        result_df[CAMPAIGN_PRICE_FIELD] = result_df[CAMPAIGN_PRICE_FIELD + '_new'].fillna(result_df[CAMPAIGN_PRICE_FIELD])
+    
+    # 设置价格标记
+    # 先检查合并后的列是否存在
+    if '价格来源' not in result_df.columns:
+        result_df['价格标记'] = ''
+        st.warning("价格来源信息缺失，无法设置详细价格标记")
+    else:
+        # 定义条件，使用.fillna确保没有NaN值
+        条件_工具价格 = (result_df['价格来源'] == '工具价格').fillna(False)
+        条件_Parent价格 = (result_df['价格来源'] == 'Parent工具价格').fillna(False) 
+        条件_推荐价格 = (result_df['价格来源'] == '推荐价格').fillna(False)
+        条件_无效工具价格 = (result_df['价格来源'] == '无效工具价格(零)').fillna(False)
+        条件_无效Parent工具价格 = (result_df['价格来源'] == '无效Parent工具价格(零)').fillna(False)
+        
+        # 检查'已修改'和'已人工确认'列是否存在
+        条件_已修改 = result_df['已修改'].fillna(False) if '已修改' in result_df.columns else pd.Series(False, index=result_df.index)
+        条件_已人工确认 = result_df['已人工确认'].fillna(False) if '已人工确认' in result_df.columns else pd.Series(False, index=result_df.index)
+        
+        # 创建标记列，增加人工确认信息
+        result_df['价格标记'] = ''
+        result_df.loc[条件_工具价格, '价格标记'] = '工具价格'
+        result_df.loc[条件_Parent价格, '价格标记'] = 'Parent工具价格'
+        result_df.loc[条件_推荐价格 & ~条件_已修改 & ~条件_已人工确认, '价格标记'] = '推荐价格'
+        result_df.loc[条件_推荐价格 & 条件_已修改, '价格标记'] = '推荐价格（已手动更改）'
+        result_df.loc[条件_推荐价格 & ~条件_已修改 & 条件_已人工确认, '价格标记'] = '推荐价格（已人工确认）'
+        result_df.loc[条件_推荐价格 & 条件_已修改 & 条件_已人工确认, '价格标记'] = '推荐价格（已手动更改并确认）'
+        # 无效工具价格的标记
+        result_df.loc[条件_无效工具价格 & ~条件_已修改 & ~条件_已人工确认, '价格标记'] = '无效工具价格(零)'
+        result_df.loc[条件_无效工具价格 & 条件_已修改, '价格标记'] = '无效工具价格(零)（已手动更改）'
+        result_df.loc[条件_无效工具价格 & ~条件_已修改 & 条件_已人工确认, '价格标记'] = '无效工具价格(零)（已人工确认）'
+        result_df.loc[条件_无效工具价格 & 条件_已修改 & 条件_已人工确认, '价格标记'] = '无效工具价格(零)（已手动更改并确认）'
+        # 无效Parent工具价格的标记
+        result_df.loc[条件_无效Parent工具价格 & ~条件_已修改 & ~条件_已人工确认, '价格标记'] = '无效Parent工具价格(零)'
+        result_df.loc[条件_无效Parent工具价格 & 条件_已修改, '价格标记'] = '无效Parent工具价格(零)（已手动更改）'
+        result_df.loc[条件_无效Parent工具价格 & ~条件_已修改 & 条件_已人工确认, '价格标记'] = '无效Parent工具价格(零)（已人工确认）'
+        result_df.loc[条件_无效Parent工具价格 & 条件_已修改 & 条件_已人工确认, '价格标记'] = '无效Parent工具价格(零)（已手动更改并确认）'
+        
+        # 价格缺失或严重错误情况
+        价格缺失条件 = (result_df[CAMPAIGN_PRICE_FIELD].isnull() | 
+                    (result_df[CAMPAIGN_PRICE_FIELD] == "") | 
+                    (result_df[CAMPAIGN_PRICE_FIELD] == 0))
+        if 价格缺失条件.any():
+            result_df.loc[价格缺失条件, '价格标记'] = '价格缺失(含其他严重错误)'
+    
+    # 删除临时列和不需要的merge结果列
+    drop_cols = ['匹配键']
+    for col in [CAMPAIGN_PRICE_FIELD + '_new', '价格来源', '已修改', '已人工确认']:
+        if col in result_df.columns:
+            drop_cols.append(col)
+    
+    result_df = result_df.drop(columns=drop_cols)
+    
+    return result_df
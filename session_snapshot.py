@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+import pandas as pd
+
+from working_store import WORK_DIR, arrow_available, prune_work_dir, read_arrow_frame, write_arrow_frame
+
+# 会话快照目录：每个运行ID一个子目录，浏览器刷新或服务重启后按运行ID恢复
+SNAPSHOT_DIR = os.path.join(WORK_DIR, "sessions")
+# 快照保留天数，超过后清理
+SNAPSHOT_TTL_DAYS = int(os.environ.get("SKU_TOOL_SNAPSHOT_TTL_DAYS", "7"))
+
+MANIFEST_FILE = "manifest.json"
+CAMPAIGN_FILE = "campaign.bin"
+
+# 运行ID来自URL参数（12位十六进制，由界面生成），只接受该格式，避免拼出任意路径
+_RUN_ID_PATTERN = re.compile(r"^[0-9a-f]{12}$")
+
+_manifest_lock = threading.Lock()
+
+
+def run_dir(run_id):
+    """运行ID对应的快照目录；运行ID格式不正确时返回None"""
+    if not run_id or not _RUN_ID_PATTERN.match(run_id):
+        return None
+    return os.path.join(SNAPSHOT_DIR, run_id)
+
+
+def frame_fingerprint(df):
+    """DataFrame内容（列名和值）的指纹，用于判断是否需要重新写入"""
+    if df is None:
+        return "none"
+    digest = hashlib.sha1(repr(list(df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def write_frame(directory, name, df):
+    """
+    把DataFrame写入快照目录：优先Arrow格式（读取时内存映射），无法转换时用pickle
+
+    返回:
+    写入的文件名
+    """
+    if arrow_available():
+        file_name = name + ".arrow"
+        if write_arrow_frame(os.path.join(directory, file_name), df) is not None:
+            return file_name
+    file_name = name + ".pkl"
+    tmp_path = os.path.join(directory, f"{file_name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    df.to_pickle(tmp_path)
+    os.replace(tmp_path, os.path.join(directory, file_name))
+    return file_name
+
+
+def read_frame(directory, file_name):
+    path = os.path.join(directory, file_name)
+    if file_name.endswith(".arrow"):
+        if not arrow_available():
+            raise OSError(f"读取{file_name}需要安装pyarrow")
+        # 快照文件之后会被覆盖写入，不保留内存映射
+        return read_arrow_frame(path, memory_map=False)
+    return pd.read_pickle(path)
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class SessionSnapshot:
+    """
+    按运行ID增量保存会话快照：匹配结果、审核表的人工决定、导出设置，以及活动价格提交表的原文件和解析结果
+
+    各部分分别记录指纹，内容不变时不重复写入；人工决定通常只有几百行，每次修改都能及时保存。
+    """
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.dir = run_dir(run_id)
+        self.manifest = read_manifest(self.dir) or {"run_id": run_id, "created_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+        prune_snapshots()
+
+    def _write_manifest(self):
+        self.manifest["saved_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        path = os.path.join(self.dir, MANIFEST_FILE)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with _manifest_lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        # 快照计入工作目录的占用上限，超过时删除最久未使用的工作文件和其它运行的快照
+        prune_work_dir(keep=self.dir)
+
+    def save_campaign_file(self, file_bytes, file_hash):
+        """保存活动价格提交表原文件（导出时写回该文件）"""
+        if self.manifest.get("campaign_hash") == file_hash:
+            return
+        os.makedirs(self.dir, exist_ok=True)
+        tmp_path = os.path.join(self.dir, f"{CAMPAIGN_FILE}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(file_bytes)
+        os.replace(tmp_path, os.path.join(self.dir, CAMPAIGN_FILE))
+        self.manifest["campaign_hash"] = file_hash
+        self._write_manifest()
+
+    def save_campaign_frame(self, frame_key, raw_df):
+        """
+        保存解析后的活动价格提交表原始数据，恢复时不再重新解析Excel
+
+        参数:
+        frame_key: 原文件哈希和备注行组成的键，键不变时不重复写入
+        raw_df: 解析后的原始数据
+        """
+        if self.manifest.get("campaign_frame_key") == frame_key:
+            return
+        os.makedirs(self.dir, exist_ok=True)
+        self.manifest["campaign_frame_file"] = write_frame(self.dir, "campaign_raw", raw_df)
+        self.manifest["campaign_frame_key"] = frame_key
+        self._write_manifest()
+
+    def save_matched(self, match_key, matched_df):
+        """
+        保存匹配结果（审核前的完整匹配结果）
+
+        参数:
+        match_key: 匹配输入的签名，签名不变时不重复写入
+        matched_df: 匹配结果
+        """
+        if self.manifest.get("match_key") == match_key:
+            return
+        os.makedirs(self.dir, exist_ok=True)
+        self.manifest["matched_file"] = write_frame(self.dir, "matched", matched_df)
+        self.manifest["match_key"] = match_key
+        self.manifest["invalid_price_count"] = int(matched_df.attrs.get("invalid_price_count", 0))
+        self._write_manifest()
+
+    def save_decisions(self, decisions):
+        """保存审核表的人工决定（Product ID、Variation ID、活动价格、已人工确认），None表示没有"""
+        fingerprint = frame_fingerprint(decisions)
+        if self.manifest.get("decisions_fingerprint") == fingerprint:
+            return
+        os.makedirs(self.dir, exist_ok=True)
+        self.manifest["decisions_file"] = write_frame(self.dir, "decisions", decisions) if decisions is not None else None
+        self.manifest["decisions_fingerprint"] = fingerprint
+        self._write_manifest()
+
+    def save_settings(self, settings):
+        """保存导出设置等界面参数（可JSON序列化的字典）"""
+        if self.manifest.get("settings") == settings:
+            return
+        os.makedirs(self.dir, exist_ok=True)
+        self.manifest["settings"] = settings
+        self._write_manifest()
+
+
+def load_snapshot(run_id):
+    """
+    读取运行快照，匹配结果以内存映射方式读取，不重新解析和匹配
+
+    返回:
+    字典：run_id、saved_at、match_key、matched(匹配结果)、decisions(人工决定或None)、
+    settings(导出设置)、campaign_bytes(活动价格提交表原文件)、campaign_hash(原文件哈希)、
+    campaign_frame(解析后的原始数据，旧快照没有时为None)及其键campaign_frame_key；快照不存在或不完整时返回None
+    """
+    directory = run_dir(run_id)
+    manifest = read_manifest(directory) if directory else None
+    if not manifest or not manifest.get("matched_file") or not manifest.get("campaign_hash"):
+        return None
+    try:
+        matched_df = read_frame(directory, manifest["matched_file"])
+        decisions = read_frame(directory, manifest["decisions_file"]) if manifest.get("decisions_file") else None
+        campaign_frame = (read_frame(directory, manifest["campaign_frame_file"])
+                          if manifest.get("campaign_frame_file") else None)
+        with open(os.path.join(directory, CAMPAIGN_FILE), "rb") as f:
+            campaign_bytes = f.read()
+    except (OSError, ValueError) as e:
+        print(f"会话快照无法读取，忽略: {directory} ({e})")
+        return None
+    matched_df.attrs["invalid_price_count"] = manifest.get("invalid_price_count", 0)
+    return {
+        "run_id": run_id,
+        "saved_at": manifest.get("saved_at"),
+        "match_key": manifest["match_key"],
+        "matched": matched_df,
+        "decisions": decisions,
+        "settings": manifest.get("settings") or {},
+        "campaign_bytes": campaign_bytes,
+        "campaign_hash": manifest["campaign_hash"],
+        "campaign_frame": campaign_frame,
+        "campaign_frame_key": manifest.get("campaign_frame_key"),
+    }
+
+
+def prune_snapshots():
+    """删除超过保留天数未更新的快照"""
+    expire_before = time.time() - SNAPSHOT_TTL_DAYS * 86400
+    try:
+        entries = list(os.scandir(SNAPSHOT_DIR))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if not entry.is_dir():
+            continue
+        manifest_path = os.path.join(entry.path, MANIFEST_FILE)
+        try:
+            updated_at = os.path.getmtime(manifest_path)
+        except OSError:
+            updated_at = entry.stat().st_mtime
+        if updated_at < expire_before:
+            shutil.rmtree(entry.path, ignore_errors=True)
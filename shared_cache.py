@@ -0,0 +1,154 @@
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+# 共享缓存默认内存上限（MB），可通过环境变量调整
+DEFAULT_MAX_MB = int(os.environ.get("SKU_TOOL_CACHE_MAX_MB", "512"))
+
+
+def content_hash(file_bytes):
+    """
+    计算上传文件内容的哈希值，作为共享缓存的键
+
+    参数:
+    file_bytes: 文件的二进制内容
+
+    返回:
+    十六进制哈希字符串
+    """
+    return hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+
+
+def estimate_nbytes(value):
+    """
+    估算缓存对象占用的内存字节数
+
+    参数:
+    value: DataFrame、字典、列表/元组或其它对象
+
+    返回:
+    估算的字节数
+    """
+    memory_usage = getattr(value, "memory_usage", None)
+    if callable(memory_usage):
+        # DataFrame：deep=True 才能统计object列中字符串的真实大小
+        try:
+            return int(memory_usage(index=True, deep=True).sum())
+        except TypeError:
+            pass
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class SharedTableCache:
+    """
+    进程级只读共享缓存，用于在多个会话之间共享SKU表、工具价格表及其查找结构
+
+    - 以内容哈希等组成的元组作为键，相同文件只解析一次
+    - 按最近最少使用（LRU）顺序淘汰，总内存不超过上限
+    - 同一键并发构建时只构建一次，其余会话等待结果
+
+    注意：缓存中的对象由所有会话共享，调用方不得原地修改，需要修改时先copy()
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._building = {}  # key -> threading.Event
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, builder):
+        """
+        读取缓存，未命中时调用builder构建并写入缓存
+
+        参数:
+        key: 可哈希的缓存键，建议包含文件内容哈希及解析参数
+        builder: 无参函数，返回要缓存的对象
+
+        返回:
+        缓存的对象（只读）
+        """
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][0]
+                event = self._building.get(key)
+                if event is None:
+                    # 由当前线程负责构建
+                    event = threading.Event()
+                    self._building[key] = event
+                    self.misses += 1
+                    break
+            # 其它会话正在构建同一键，等待其完成后重新读取
+            event.wait()
+
+        try:
+            value = builder()
+            self._put(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._building.pop(key, None)
+            event.set()
+
+    def _put(self, key, value):
+        nbytes = estimate_nbytes(value)
+        with self._lock:
+            if nbytes > self.max_bytes:
+                # 单个对象超过上限，不缓存，直接返回给调用方使用
+                return
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self._total_bytes += nbytes
+            while self._total_bytes > self.max_bytes and self._entries:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_bytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        """
+        返回缓存统计信息：条目数、占用字节数、上限、命中与未命中次数
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """
+    获取进程级共享缓存单例
+
+    Streamlit每次rerun都会重新执行主脚本，模块级变量会被重建；
+    放在单独模块中，借助sys.modules保证整个进程只有一份缓存。
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = SharedTableCache(DEFAULT_MAX_MB * 1024 * 1024)
+        return _shared_cache
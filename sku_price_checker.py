@@ -1,93 +1,57 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
 import os
 import json
-import openpyxl
 from io import BytesIO
 import io
-from st_aggrid import AgGrid, GridOptionsBuilder, JsCode
+import time
+import uuid
+import pandas as pd
+from shared_cache import content_hash, get_shared_cache
+from background_jobs import get_job_manager
+from field_config import (
+    SKU_FIELD, PARENT_SKU_FIELD, TOOL_SKU_FIELD, TOOL_PRICE_FIELD,
+    CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, CAMPAIGN_PRICE_FIELD, CAMPAIGN_RECOMMEND_FIELD,
+    SKU_HEADER_FIELDS, TOOL_HEADER_FIELDS, CAMPAIGN_HEADER_FIELDS,
+)
+from working_store import load_or_convert
+from header_sniffer import SNIFF_ROWS, read_head_rows, sniff_layout
+from duplicate_check import DUPLICATE_POLICIES, resolve_duplicate_keys
+from price_matching import (
+    PROGRESS_EVERY_ROWS, strip_columns, clean_id_column, read_sku_table, read_tool_price_table,
+    merge_sku_info, build_sku_price_dict, get_tool_price_vectorized, coerce_price_columns,
+)
+from review_sync import sync_price_data, apply_campaign_price_to_export
+from price_delta import (
+    rematch_changed_skus, extract_review_decisions, drop_affected_decisions, apply_review_decisions,
+)
+from session_snapshot import SessionSnapshot, frame_fingerprint, load_snapshot
+from rerun_profiler import start_capture, finish_capture, top_hotspots, stage_summary
 
 pd.options.display.float_format = '{:,.0f}'.format
 
-# 字段名映射（请根据实际表头调整）
-SKU_FIELD = "SKU"  # SKU表中的SKU字段
-PARENT_SKU_FIELD = "Parent SKU"  # SKU表中的Parent SKU字段
-TOOL_SKU_FIELD = "sku编码"  # 工具价格表中的sku编码字段
-TOOL_PRICE_FIELD = "活动价格"  # 工具价格表中的活动价格字段
-CAMPAIGN_PRODUCT_ID = "Product ID"
-CAMPAIGN_VARIATION_ID = "Variation ID"
-CAMPAIGN_PRICE_FIELD = "Campaign Price"
-CAMPAIGN_RECOMMEND_FIELD = "Recommended Campaign Price"
-
-def strip_columns(df):
-    if df is not None:
-        df.columns = [str(col).strip() for col in df.columns]
-    return df
-
-def clean_id_column(df, col):
-    if df is not None and col in df.columns:
-        df[col] = df[col].astype(str).str.strip().str.replace('.0', '', regex=False)
-    return df
-
-# 新增：同步价格数据的辅助函数，避免重复代码
-def sync_price_data(campaign_df, price_input_df, key_columns, value_columns=None, update_price_source=False):
-    """
-    将price_input_df中的数据同步到campaign_df中
-    
-    参数:
-    campaign_df: 目标DataFrame
-    price_input_df: 源DataFrame
-    key_columns: 用于匹配两个DataFrame的键列
-    value_columns: 需要同步的值列，默认为None时将自动确定
-    update_price_source: 是否更新价格来源，默认为False
-    
-    返回:
-    更新后的campaign_df
-    """
-    if value_columns is None:
-        value_columns = [CAMPAIGN_PRICE_FIELD]
-        # 检查其它可能的值列是否存在
-        for col in ['已修改', '价格有效', '已人工确认']:
-            if col in price_input_df.columns:
-                value_columns.append(col)
-    
-    # 确保所有值列都存在于price_input_df中
-    existing_columns = [col for col in value_columns if col in price_input_df.columns]
-    if len(existing_columns) < len(value_columns):
-        missing = set(value_columns) - set(existing_columns)
-        st.warning(f"同步数据时发现缺失列: {', '.join(missing)}")
-        value_columns = existing_columns
-    
-    # 如果'已人工确认'不在campaign_df但需要同步，添加该列
-    if '已人工确认' in value_columns and '已人工确认' not in campaign_df.columns:
-        campaign_df['已人工确认'] = False
-        
-    # 如果'已修改'不在campaign_df但需要同步，添加该列    
-    if '已修改' in value_columns and '已修改' not in campaign_df.columns:
-        campaign_df['已修改'] = False
-    
-    try:
-        price_input_indexed = price_input_df.set_index(key_columns)
-        
-        for idx, row in campaign_df.iterrows():
-            # 构建匹配键
-            key = tuple(str(row[col]).strip().replace('.0', '') if pd.notnull(row[col]) else '' for col in key_columns)
-            
-            if key in price_input_indexed.index:
-                # 同步值字段
-                for col in value_columns:
-                    if col in price_input_indexed.columns:
-                        campaign_df.at[idx, col] = price_input_indexed.at[key, col]
-                
-                # 更新价格来源
-                if update_price_source and '价格来源' in campaign_df.columns and '已修改' in price_input_indexed.columns:
-                    if price_input_indexed.at[key, '已修改']:
-                        campaign_df.at[idx, '价格来源'] = '推荐价格'
-    except Exception as e:
-        st.error(f"同步数据时出错: {str(e)}")
-    
-    return campaign_df
+# Streamlit本身不加载的重依赖按阶段首次使用时才加载，缩短首屏时间：
+# st_aggrid在显示预览时加载，openpyxl在生成Excel时加载
+
+# 字段名映射见field_config.py（请根据实际表头调整）
+
+# 后台任务界面轮询间隔（秒）
+JOB_POLL_INTERVAL = 1.0
+
+# 导出Excel时价格单元格的数字格式（千分位，无小数）
+PRICE_NUMBER_FORMAT = '#,##0'
+
+# 性能分析结果中单独列出的关键阶段：{阶段名称: 函数名}
+PROFILE_STAGES = {
+    "读取SKU表": "load_sku_table",
+    "读取工具价格表": "load_tool_price_table",
+    "读取活动价格提交表": "load_campaign_table",
+    "合并SKU信息": "merge_sku_info",
+    "工具价格匹配": "get_tool_price_vectorized",
+    "同步审核数据": "sync_price_data",
+    "预览表渲染": "AgGrid",
+    "生成导出数据": "apply_campaign_price_to_export",
+    "生成Excel": "build_export_workbook",
+}
 
 # 在文件开头添加一个数据验证函数
 def validate_required_columns(df, required_columns, df_name="DataFrame"):
@@ -111,143 +75,558 @@ def validate_required_columns(df, required_columns, df_name="DataFrame"):
     
     return True, ""
 
-# 修改get_tool_price函数为更高效的向量化版本
-def get_tool_price_vectorized(campaign_df, tool_price_df):
+# 每个会话最多缓存的上传文件哈希数量
+MAX_UPLOAD_DIGESTS = 16
+
+# === 共享缓存：相同文件在所有会话间只解析一次 ===
+def upload_digest(uploaded_file):
     """
-    向量化处理SKU价格匹配，替代逐行apply操作
+    上传文件的内容哈希：每个上传只计算一次，按file_id和大小缓存在session_state中，
+    避免每次rerun都对整个文件重新计算哈希
     
     参数:
-    campaign_df: 活动价格表DataFrame
-    tool_price_df: 工具价格表DataFrame
+    uploaded_file: st.file_uploader返回的文件对象
     
     返回:
-    更新后的campaign_df，添加价格和价格来源列
+    十六进制哈希字符串
     """
-    # 调试信息：输出数据结构
-    print(f"活动表包含行数: {len(campaign_df)}")
-    print(f"工具价格表包含行数: {len(tool_price_df)}")
-    print(f"是否包含SKU列: {SKU_FIELD in campaign_df.columns}")
-    print(f"是否包含Parent SKU列: {PARENT_SKU_FIELD in campaign_df.columns}")
-    
-    # 初始化结果列
-    campaign_df[CAMPAIGN_PRICE_FIELD] = np.nan
-    campaign_df['价格来源'] = '推荐价格'  # 默认来源为推荐价格
-    
-    # 创建SKU对应的价格映射字典 - 比逐行查找更高效
-    sku_price_dict = dict(zip(
-        tool_price_df[TOOL_SKU_FIELD].astype(str).str.strip(),
-        tool_price_df[TOOL_PRICE_FIELD]
-    ))
-    
-    # 调试信息：输出字典信息
-    print(f"价格字典包含SKU数量: {len(sku_price_dict)}")
-    if len(sku_price_dict) > 0:
-        # 随机抽样5个
-        sample_keys = list(sku_price_dict.keys())[:5]
-        print(f"样本SKU: {sample_keys}")
-        print(f"样本价格: {[sku_price_dict[k] for k in sample_keys]}")
-    
-    # 检查nan值
-    if 'nan' in sku_price_dict:
-        print(f"警告: 价格字典中包含'nan'键，值为: {sku_price_dict['nan']}")
-        # 从字典中移除'nan'键，避免错误匹配
-        if 'nan' in sku_price_dict:
-            del sku_price_dict['nan']
-            print("已从价格字典中移除'nan'键")
-    
-    # 1. 首先尝试直接匹配SKU
-    if SKU_FIELD in campaign_df.columns:
-        sku_mask = campaign_df[SKU_FIELD].astype(str).str.strip().isin(sku_price_dict.keys())
-        if sku_mask.any():
-            # 对匹配到的SKU设置价格
-            for idx in campaign_df[sku_mask].index:
-                sku = str(campaign_df.at[idx, SKU_FIELD]).strip()
-                # 排除nan和空字符串
-                if sku.lower() == 'nan' or sku == '':
-                    continue
-                    
-                if sku in sku_price_dict:
-                    price_val = sku_price_dict[sku]
-                    # 修改逻辑：区分有效工具价格和无效工具价格（零或空）
-                    if pd.notnull(price_val) and price_val > 0:
-                        campaign_df.at[idx, CAMPAIGN_PRICE_FIELD] = price_val
-                        campaign_df.at[idx, '价格来源'] = '工具价格'
-                    elif pd.notnull(price_val) and price_val == 0:
-                        # 价格为零，标记为无效工具价格，仍使用推荐价格
-                        campaign_df.at[idx, CAMPAIGN_PRICE_FIELD] = campaign_df.at[idx, CAMPAIGN_RECOMMEND_FIELD]
-                        campaign_df.at[idx, '价格来源'] = '无效工具价格(零)'
-    
-    # 2. 然后尝试匹配Parent SKU (对未匹配到SKU的行)
-    if PARENT_SKU_FIELD in campaign_df.columns:
-        # 找出还没匹配到价格或标记为无效工具价格的行
-        parent_mask = ((campaign_df['价格来源'] == '推荐价格') | 
-                       (campaign_df['价格来源'] == '无效工具价格(零)')) & campaign_df[PARENT_SKU_FIELD].notna()
-        
-        # 添加调试信息
-        parent_count = parent_mask.sum()
-        print(f"需要尝试Parent SKU匹配的行数: {parent_count}")
-        
-        if parent_mask.any():
-            # 输出一些Parent SKU样本
-            parent_sample = campaign_df[parent_mask][PARENT_SKU_FIELD].head(5).tolist()
-            print(f"Parent SKU样本: {parent_sample}")
-            print(f"这些Parent SKU是否在价格字典中: {[sku in sku_price_dict for sku in parent_sample]}")
-            
-            # 创建一个字典记录哪些Parent SKU被成功匹配
-            parent_matched = {}
-            
-            # 对匹配到的Parent SKU设置价格
-            for idx in campaign_df[parent_mask].index:
-                parent_sku = str(campaign_df.at[idx, PARENT_SKU_FIELD]).strip()
-                # 排除nan和空字符串
-                if parent_sku.lower() == 'nan' or parent_sku == '':
-                    continue
-                    
-                if parent_sku in sku_price_dict:
-                    price_val = sku_price_dict[parent_sku]
-                    # 修改逻辑：区分有效工具价格和无效工具价格（零或空）
-                    if pd.notnull(price_val) and price_val > 0:
-                        campaign_df.at[idx, CAMPAIGN_PRICE_FIELD] = price_val
-                        campaign_df.at[idx, '价格来源'] = 'Parent工具价格'
-                        # 记录匹配成功
-                        if parent_sku not in parent_matched:
-                            parent_matched[parent_sku] = 1
-                        else:
-                            parent_matched[parent_sku] += 1
-                    elif pd.notnull(price_val) and price_val == 0:
-                        # Parent价格为零，也标记为无效工具价格
-                        campaign_df.at[idx, CAMPAIGN_PRICE_FIELD] = campaign_df.at[idx, CAMPAIGN_RECOMMEND_FIELD]
-                        campaign_df.at[idx, '价格来源'] = '无效Parent工具价格(零)'
-            
-            # 输出Parent SKU匹配统计
-            print(f"通过Parent SKU成功匹配的行数: {sum(parent_matched.values())}")
-            print(f"成功匹配的唯一Parent SKU数量: {len(parent_matched)}")
-            if len(parent_matched) > 0:
-                top_parents = sorted(parent_matched.items(), key=lambda x: x[1], reverse=True)[:5]
-                print(f"匹配次数最多的Parent SKU: {top_parents}")
-                
-                # 检查这些Parent SKU对应的价格
-                for parent, _ in top_parents:
-                    if parent in sku_price_dict:
-                        print(f"Parent SKU {parent} 对应价格: {sku_price_dict[parent]}")
-    
-    # 3. 最后，对未匹配到的行使用推荐价格
-    remaining_mask = (campaign_df['价格来源'] == '推荐价格')
-    campaign_df.loc[remaining_mask, CAMPAIGN_PRICE_FIELD] = campaign_df.loc[remaining_mask, CAMPAIGN_RECOMMEND_FIELD]
-    
-    # 保存是否有需要审查的价格数据
-    需要审查的价格条件 = (
-        (campaign_df['价格来源'] == '推荐价格') | 
-        (campaign_df['价格来源'] == '无效工具价格(零)') | 
-        (campaign_df['价格来源'] == '无效Parent工具价格(零)')
+    digests = st.session_state.setdefault('upload_digests', {})
+    key = (getattr(uploaded_file, 'file_id', uploaded_file.name), uploaded_file.size)
+    if key not in digests:
+        if len(digests) >= MAX_UPLOAD_DIGESTS:
+            digests.clear()
+        digests[key] = content_hash(uploaded_file.getvalue())
+    return digests[key]
+
+def load_sku_table(file_bytes, file_hash, header_row):
+    """
+    解析并清洗SKU表，结果按文件内容哈希放入进程级共享缓存
+    
+    参数:
+    file_bytes: 上传文件的二进制内容
+    file_hash: 文件内容哈希（见upload_digest）
+    header_row: 表头所在行（从1开始）
+    
+    返回:
+    清洗后的sku_df（只读，多会话共享，修改前需copy）
+    """
+    key = ("sku_df", file_hash, header_row)
+    return get_shared_cache().get_or_build(
+        key, lambda: load_or_convert(key, lambda: read_sku_table(file_bytes, header_row))
+    )
+
+def load_tool_price_table(file_bytes, file_hash, header_row):
+    """
+    解析并清洗工具价格表，结果按文件内容哈希放入进程级共享缓存
+    
+    参数:
+    file_bytes: 上传文件的二进制内容
+    file_hash: 文件内容哈希（见upload_digest）
+    header_row: 表头所在行（从1开始）
+    
+    返回:
+    清洗后的tool_price_df（只读，多会话共享，修改前需copy）
+    """
+    key = ("tool_price_df", file_hash, header_row)
+    return get_shared_cache().get_or_build(
+        key, lambda: load_or_convert(key, lambda: read_tool_price_table(file_bytes, header_row))
+    )
+
+def resolve_reference_duplicates(kind, file_hash, header_row, df, key_columns, value_columns, policy):
+    """
+    合并/建立价格字典前处理参考表中的重复键，结果放入共享缓存
+    
+    参数:
+    kind: 表类型标识（'sku'或'tool'）
+    file_hash, header_row: 用于生成缓存键
+    df: 已清洗的参考表
+    key_columns: 键列
+    value_columns: 需要比较是否一致的值列
+    policy: 重复键处理方式，见DUPLICATE_POLICIES
+    
+    返回:
+    (处理后的DataFrame, 重复键报告)
+    """
+    key = ("dedup", kind, file_hash, header_row, policy)
+    return get_shared_cache().get_or_build(
+        key, lambda: resolve_duplicate_keys(df[key_columns + value_columns], key_columns, value_columns, policy)
+    )
+
+def show_duplicate_report(table_name, key_label, report, policy):
+    """显示缺少键的行、重复键和值不一致的键，以及采用的处理方式"""
+    if report['missing_key_rows'] > 0:
+        st.info(f"{table_name}有{report['missing_key_rows']}行缺少{key_label}，无法匹配，已移除")
+    if report['duplicate_keys'] == 0:
+        return
+    message = (f"{table_name}发现{report['duplicate_keys']}个重复{key_label}（共{report['duplicate_rows']}行），"
+               f"按\"{DUPLICATE_POLICIES[policy]}\"处理后移除{report['dropped_rows']}行")
+    if report['conflict_keys'] > 0:
+        st.warning(message + f"；其中{report['conflict_keys']}个键的值不一致，请核对：")
+        with st.expander(f"{table_name}值不一致的重复键"):
+            st.dataframe(report['conflicts'].astype(str), use_container_width=True, hide_index=True)
+    else:
+        st.info(message + "（重复行的值一致）")
+
+def load_campaign_table(file_bytes, file_hash, skiprows):
+    """
+    解析活动价格提交表原始数据，按文件内容哈希和跳过行放入共享缓存
+    
+    参数:
+    file_bytes: 上传文件的二进制内容
+    file_hash: 文件内容哈希（见upload_digest）
+    skiprows: 需要跳过的备注行（pandas的skiprows，从0开始）
+    
+    返回:
+    原始raw_campaign_df（只读，修改前需copy）
+    """
+    key = ("campaign_df", file_hash, tuple(skiprows))
+    return get_shared_cache().get_or_build(
+        key, lambda: load_or_convert(key, lambda: pd.read_excel(io.BytesIO(file_bytes), header=0, skiprows=skiprows))
     )
+
+# === 表头嗅探：只读取前几行识别表头和备注行，布局确认后再完整解析 ===
+def load_head_rows(file_bytes, file_hash):
+    """读取文件前SNIFF_ROWS行，结果放入共享缓存，调整布局时不再重复读取"""
+    key = ("head_rows", file_hash)
+    return get_shared_cache().get_or_build(key, lambda: read_head_rows(file_bytes))
+
+def show_head_rows(head_df):
+    with st.expander(f"查看文件前{len(head_df)}行（行号从1开始）"):
+        preview = head_df.copy()
+        preview.index = range(1, len(preview) + 1)
+        st.dataframe(preview.astype(str), use_container_width=True)
+
+def settle_header_row(kind, label, file_bytes, file_hash, expected_fields, default_row):
+    """
+    嗅探表头行并让用户确认，识别到全部字段时自动确认
+    
+    参数:
+    kind: 表类型标识，用于session_state键和控件键
+    label: 表头行输入框的标签
+    file_bytes: 上传文件的二进制内容
+    file_hash: 文件内容哈希（见upload_digest）
+    expected_fields: 期望出现在表头中的字段名列表
+    default_row: 未识别到表头时的默认行号
+    
+    返回:
+    已确认的表头行号（从1开始），尚未确认时返回None
+    """
+    head_df = load_head_rows(file_bytes, file_hash)
+    sniffed = sniff_layout(head_df, expected_fields)
     
+    layout_key = f"{kind}_layout"
+    layout = st.session_state.get(layout_key)
+    if layout is None or layout['hash'] != file_hash:
+        layout = {
+            'hash': file_hash,
+            'header_row': sniffed['header_row'] or default_row,
+            'settled': sniffed['complete'],
+        }
+        st.session_state[layout_key] = layout
+    
+    if sniffed['complete']:
+        st.caption(f"已自动识别表头：第{sniffed['header_row']}行")
+    elif sniffed['header_row'] is not None:
+        st.warning(f"第{sniffed['header_row']}行仅匹配到字段: {', '.join(sniffed['matched'])}，请确认表头所在行")
+    else:
+        st.warning(f"前{len(head_df)}行中未找到字段 {', '.join(expected_fields)}，请手动选择表头所在行")
+    show_head_rows(head_df)
+    
+    # 使用表单，调整行号时不触发完整解析，点击确认后才解析
+    with st.form(f"{kind}_layout_form"):
+        header_row = st.number_input(label, min_value=1, max_value=SNIFF_ROWS,
+                                     value=layout['header_row'], key=f"{kind}_header_{file_hash[:8]}")
+        if st.form_submit_button("确认表头"):
+            layout['header_row'] = header_row
+            layout['settled'] = True
+    
+    return layout['header_row'] if layout['settled'] else None
+
+def settle_remark_rows(file_bytes, file_hash):
+    """
+    嗅探活动价格提交表的备注行范围并让用户确认
+    
+    返回:
+    (已确认的备注起始行, 结束行, 嗅探结果)，尚未确认时行号为None
+    """
+    head_df = load_head_rows(file_bytes, file_hash)
+    sniffed = sniff_layout(head_df, CAMPAIGN_HEADER_FIELDS, id_field=CAMPAIGN_PRODUCT_ID)
+    
+    layout = st.session_state.get('campaign_layout')
+    if layout is None or layout['hash'] != file_hash:
+        remark_rows = sniffed['remark_rows'] or (2, 3)
+        layout = {
+            'hash': file_hash,
+            'skip_start': max(remark_rows[0], 2),
+            'skip_end': max(remark_rows[1], 2),
+            'settled': sniffed['complete'] and sniffed['header_row'] == 1 and sniffed['remark_rows'] is not None,
+        }
+        st.session_state['campaign_layout'] = layout
+    
+    if sniffed['remark_rows'] is not None:
+        st.caption(f"已自动识别备注行：第{sniffed['remark_rows'][0]}-{sniffed['remark_rows'][1]}行")
+    else:
+        st.warning("未能自动识别备注行，请确认备注行范围")
+    show_head_rows(head_df)
+    
+    with st.form("campaign_layout_form"):
+        skip_col1, skip_col2 = st.columns(2)
+        with skip_col1:
+            skip_start = st.number_input("备注起始行号（从1开始）", min_value=2, max_value=SNIFF_ROWS,
+                                         value=layout['skip_start'], key=f"skip_start_{file_hash[:8]}")
+        with skip_col2:
+            skip_end = st.number_input("备注结束行号（从1开始）", min_value=2, max_value=SNIFF_ROWS,
+                                       value=layout['skip_end'], key=f"skip_end_{file_hash[:8]}")
+        if st.form_submit_button("确认备注行"):
+            if skip_end < skip_start:
+                st.error("备注结束行号不能小于起始行号")
+            else:
+                layout.update(skip_start=skip_start, skip_end=skip_end, settled=True)
+    
+    if not layout['settled']:
+        return None, None, sniffed
+    return layout['skip_start'], layout['skip_end'], sniffed
+
+# === 后台任务：匹配与导出在后台线程运行，页面保持可响应 ===
+def run_matching(report, campaign_df, sku_df, tool_price_df, sku_price_dict):
+    """
+    后台匹配任务：合并SKU信息并匹配工具价格
+    
+    参数:
+    report: 进度回调 report(阶段, 已处理行数, 总行数)
+    其余参数同get_tool_price_vectorized
+    
+    返回:
+    匹配后的campaign_df
+    """
+    report('合并SKU信息', 0, len(campaign_df))
+    merged_df = merge_sku_info(campaign_df, sku_df)
+    report('合并SKU信息', len(campaign_df), len(campaign_df))
+    result_df = get_tool_price_vectorized(merged_df, tool_price_df, sku_price_dict, progress=report)
+    # 价格列一次性转换为数值，之后全程保持数值类型
+    result_df.attrs['invalid_price_count'] = coerce_price_columns(
+        result_df, [CAMPAIGN_PRICE_FIELD, CAMPAIGN_RECOMMEND_FIELD]
+    )
+    return result_df
+
+def run_delta_matching(report, previous_df, old_dict, new_dict, tool_price_df):
+    """
+    后台增量匹配任务：工具价格表换了新版本时，只重新匹配SKU或Parent SKU价格有变化的行
+    
+    参数:
+    report: 进度回调 report(阶段, 已处理行数, 总行数)
+    previous_df: 上一版本的匹配结果（只读）
+    old_dict: 上一版本的工具价格字典
+    new_dict: 新版本的工具价格字典
+    tool_price_df: 新版本的工具价格表
+    
+    返回:
+    新的匹配结果，变更报告放在attrs['price_delta']中
+    """
+    result_df, delta_report = rematch_changed_skus(previous_df, old_dict, new_dict, tool_price_df, progress=report)
+    result_df.attrs['price_delta'] = delta_report
+    return result_df
+
+def only_tool_price_changed(previous_signature, signature):
+    """两次匹配的输入是否只有工具价格表（文件、表头行、重复键处理方式）不同，签名结构见match_signature"""
+    return (previous_signature[:3] == signature[:3] and previous_signature[6:] == signature[6:]
+            and previous_signature[3:6] != signature[3:6])
+
+def show_price_delta_report(delta_report):
+    """显示工具价格表更新后的变更报告"""
+    changed_skus = delta_report['changed_skus']
+    type_counts = changed_skus['变更类型'].value_counts().to_dict()
+    st.info(
+        f"工具价格表已更新：{len(changed_skus)}个sku编码有变化"
+        f"（新增{type_counts.get('新增', 0)}、删除{type_counts.get('删除', 0)}、价格变更{type_counts.get('价格变更', 0)}），"
+        f"重新匹配{delta_report['affected_rows']}行，其中{len(delta_report['changed_rows'])}行的活动价格或价格来源发生变化；"
+        f"其余行的匹配结果和人工确认/修改保持不变"
+    )
+    with st.expander("查看工具价格变更明细"):
+        st.dataframe(changed_skus.astype(str), use_container_width=True, hide_index=True)
+    with st.expander("查看活动价格变化的行"):
+        st.dataframe(delta_report['changed_rows'], use_container_width=True, hide_index=True)
+    if st.button("关闭变更报告"):
+        st.session_state['price_delta_report'] = None
+        rerun_script()
+
+def prepare_campaign_frame(raw_campaign_df, source_key):
+    """
+    清洗活动价格提交表用于匹配：去掉列名空格，统一ID字段类型并去除小数点（如.0）；
+    同一文件和跳过行复用上次结果，匹配任务轮询时的重新运行不再重复清洗
+    
+    参数:
+    raw_campaign_df: 原始活动价格提交表
+    source_key: 原始表的标识（文件哈希和跳过的行）
+    
+    返回:
+    清洗后的campaign_df（只读，修改前需copy）
+    """
+    cached = st.session_state.get('campaign_frame')
+    if cached is not None and cached['key'] == source_key:
+        return cached['df']
+    campaign_df = strip_columns(raw_campaign_df.copy())
+    # 保证用于合并的字段类型一致（SKU表和工具价格表已在加载时清洗）
+    for col in [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID]:
+        if col in campaign_df.columns:
+            campaign_df[col] = campaign_df[col].astype(str).str.strip()
+        campaign_df = clean_id_column(campaign_df, col)
+    st.session_state['campaign_frame'] = {'key': source_key, 'df': campaign_df}
     return campaign_df
 
+def build_export_frame(raw_campaign_df, campaign_df, key_columns, source_key):
+    """
+    生成导出数据：把审核后的价格和价格标记写入原始活动价格表；输入不变时复用上次结果，
+    页面因其它操作重新运行时不再重复合并
+    
+    参数:
+    raw_campaign_df: 原始活动价格提交表
+    campaign_df: 审核同步后的匹配结果
+    key_columns: 匹配两个表的键列
+    source_key: 原始表的标识（文件哈希和跳过的行）
+    
+    返回:
+    export_df（价格列已转换为整数，只读，修改前需copy）
+    """
+    used_columns = [col for col in key_columns + [CAMPAIGN_PRICE_FIELD, '价格来源', '已修改', '已人工确认']
+                    if col in campaign_df.columns]
+    cache_key = (source_key, tuple(key_columns), frame_fingerprint(campaign_df[used_columns]))
+    cached = st.session_state.get('export_frame')
+    if cached is not None and cached['key'] == cache_key:
+        return cached['df']
+    export_df = apply_campaign_price_to_export(raw_campaign_df.copy(), campaign_df, key_columns)
+    coerce_price_columns(export_df, [CAMPAIGN_PRICE_FIELD, CAMPAIGN_RECOMMEND_FIELD])
+    st.session_state['export_frame'] = {'key': cache_key, 'df': export_df}
+    return export_df
+
+def build_export_workbook(report, campaign_bytes, export_df, header_row, price_mark_col, skip_end):
+    """
+    后台导出任务：把价格和价格标记写回原始活动价格提交表
+    
+    参数:
+    report: 进度回调 report(阶段, 已处理行数, 总行数)
+    campaign_bytes: 原始活动价格提交表的二进制内容
+    export_df: 已设置价格和价格标记的导出DataFrame
+    header_row: 表头实际所在行号（从1开始）
+    price_mark_col: 价格标记写入的列号（从1开始）
+    skip_end: 备注结束行号
+    
+    返回:
+    生成的Excel文件二进制内容
+    """
+    report('读取模板', 0, 1)
+    import openpyxl
+    wb = openpyxl.load_workbook(BytesIO(campaign_bytes))
+    ws = wb.active
+    report('读取模板', 1, 1)
+
+    # 读取表头行（openpyxl行号从1开始）
+    col_names = [str(cell.value).strip() if cell.value is not None else "" for cell in ws[header_row]]
+
+    if CAMPAIGN_PRICE_FIELD not in col_names:
+        raise ValueError(f"列名 '{CAMPAIGN_PRICE_FIELD}' 不在表头中，请检查表头行或列名是否正确！")
+
+    price_col_idx = col_names.index(CAMPAIGN_PRICE_FIELD) + 1
+    # 用用户选择的列号插入"价格标记"表头
+    ws.cell(row=header_row, column=price_mark_col, value="价格标记")
+
+    # 修复: 正确计算数据写入的起始行
+    # 1. 如果备注行在表头之前，数据起始行 = 表头行 + 1
+    # 2. 如果备注行在表头之后，数据起始行 = 表头行 + 1 + (备注结束行 - 表头行)
+    data_start_row = header_row + 1
+    if skip_end > header_row:
+        data_start_row += (skip_end - header_row)
+    
+    # 写入数据（按正确的行号计算），价格写入数值，千分位由Excel数字格式显示
+    total_rows = len(export_df)
+    for i, (idx, row) in enumerate(export_df.iterrows()):
+        if i % PROGRESS_EVERY_ROWS == 0:
+            report('写入价格', i, total_rows)
+        excel_row = data_start_row + idx
+        if CAMPAIGN_PRICE_FIELD in row and '价格标记' in row:
+            price = row[CAMPAIGN_PRICE_FIELD]
+            price_cell = ws.cell(row=excel_row, column=price_col_idx, value=None if pd.isna(price) else price)
+            price_cell.number_format = PRICE_NUMBER_FORMAT
+            ws.cell(row=excel_row, column=price_mark_col, value=row['价格标记'])
+    report('写入价格', total_rows, total_rows)
+
+    # 保存到内存
+    report('保存文件', 0, 1)
+    with BytesIO() as output:
+        wb.save(output)
+        report('保存文件', 1, 1)
+        return output.getvalue()
+
+def submit_stage_job(stage_key, label, signature, fn, *args):
+    """
+    提交后台任务，并在session_state中记录任务ID；同一阶段的旧任务会被取消
+    
+    参数:
+    stage_key: session_state中保存任务信息的键
+    label: 任务名称
+    signature: 输入数据签名，用于判断是否需要重新计算
+    fn: 任务函数，签名为 fn(report, *args)
+    """
+    manager = get_job_manager()
+    previous = st.session_state.get(stage_key)
+    if previous is not None:
+        manager.cancel(previous['job_id'])
+        manager.discard(previous['job_id'])
+    # 性能分析时同步执行，保证耗时计入本次运行
+    job = manager.submit(label, fn, *args, inline=profiler is not None)
+    st.session_state[stage_key] = {'signature': signature, 'job_id': job.id, 'label': label}
+    return job
+
+def poll_stage_job(stage_key):
+    """
+    查询后台任务状态；运行中时显示各阶段进度和取消按钮
+    
+    返回:
+    (状态, 结果)，状态为None/'running'/'done'/'failed'/'cancelled'
+    """
+    state = st.session_state.get(stage_key)
+    if state is None:
+        return None, None
+    if 'result' in state:
+        return 'done', state['result']
+    
+    manager = get_job_manager()
+    job = manager.get(state['job_id'])
+    if job is None:
+        # 任务已被清理（如服务重启），需要重新提交
+        del st.session_state[stage_key]
+        return None, None
+    
+    if job.status == 'running':
+        progress, current_stage = job.progress_snapshot()
+        done, total = progress.get(current_stage, (0, 0))
+        fraction = done / total if total else 0.0
+        st.progress(min(fraction, 1.0), text=f"{state['label']}进行中：{current_stage or '准备中'}")
+        st.caption(" | ".join(f"{stage}: {d:,}/{t:,} 行" for stage, (d, t) in progress.items()))
+        if job.cancel_requested:
+            st.info("正在取消...")
+        elif st.button(f"取消{state['label']}", key=f"cancel_{stage_key}"):
+            job.cancel()
+            st.info("正在取消...")
+        return 'running', None
+    
+    if job.status == 'done':
+        state['result'] = job.result
+        manager.discard(job.id)
+        return 'done', job.result
+    if job.status == 'failed':
+        st.error(f"{state['label']}出错: {job.error}")
+    else:
+        st.warning(f"{state['label']}已取消")
+    return job.status, None
+
+def stage_job_running(stage_key):
+    """该阶段的后台任务是否仍在运行"""
+    state = st.session_state.get(stage_key)
+    if state is None or 'result' in state:
+        return False
+    job = get_job_manager().get(state['job_id'])
+    return job is not None and not job.finished
+
+def session_has_running_jobs():
+    """当前会话是否有正在运行的后台任务"""
+    return any(stage_job_running(stage_key) for stage_key in ['match_job', 'export_job'])
+
+def get_query_param(name):
+    # 兼容旧版本Streamlit（st.query_params在1.30之后提供）
+    if hasattr(st, "query_params"):
+        return st.query_params.get(name)
+    values = st.experimental_get_query_params().get(name)
+    return values[0] if values else None
+
+def clear_query_param(name):
+    if hasattr(st, "query_params"):
+        if name in st.query_params:
+            del st.query_params[name]
+    else:
+        params = st.experimental_get_query_params()
+        params.pop(name, None)
+        st.experimental_set_query_params(**params)
+
+def set_query_param(name, value):
+    if hasattr(st, "query_params"):
+        st.query_params[name] = value
+    else:
+        params = st.experimental_get_query_params()
+        params[name] = value
+        st.experimental_set_query_params(**params)
+
+def get_session_snapshot():
+    """当前会话的快照写入器，按运行ID增量保存（见session_snapshot.py）"""
+    snapshot = st.session_state.get('session_snapshot')
+    if snapshot is None or snapshot.run_id != st.session_state['run_id']:
+        snapshot = SessionSnapshot(st.session_state['run_id'])
+        st.session_state['session_snapshot'] = snapshot
+    return snapshot
+
+def show_profile_result(result):
+    """显示性能分析结果：关键阶段耗时、热点函数表和.prof下载"""
+    st.markdown("---")
+    st.subheader("性能分析结果")
+    st.caption(f"采集时间 {result['captured_at']}，本次运行耗时 {result['wall_time']:.2f} 秒"
+               + ("（已重新执行匹配）" if result.get('recomputed') else ""))
+    if result.get('all_threads'):
+        st.caption("当前Python版本的cProfile会记录进程内所有线程：采集期间其它会话的操作和后台任务也计入下表，"
+                   "如需准确结果请在没有其他人使用时采集")
+    
+    stages = stage_summary(result['functions'], PROFILE_STAGES)
+    if not stages.empty:
+        st.markdown("**关键阶段耗时**")
+        st.dataframe(stages, use_container_width=True, hide_index=True)
+    
+    hot_col1, hot_col2 = st.columns(2)
+    with hot_col1:
+        sort_by = st.selectbox("排序依据", ["累计耗时(秒)", "自身耗时(秒)", "调用次数"], key="profile_sort_by")
+    with hot_col2:
+        top_n = st.number_input("显示前N个函数", min_value=5, max_value=500, value=30, step=5, key="profile_top_n")
+    st.dataframe(top_hotspots(result['functions'], top_n, sort_by), use_container_width=True, hide_index=True)
+    
+    dl_col, clear_col = st.columns(2)
+    with dl_col:
+        st.download_button(
+            label="下载性能分析文件（.prof，可用snakeviz/pstats打开）",
+            data=result['prof_bytes'],
+            file_name=f"rerun_profile_{result['captured_at'].replace(' ', '_').replace(':', '')}.prof",
+            mime="application/octet-stream"
+        )
+    with clear_col:
+        if st.button("清除分析结果"):
+            del st.session_state['profile_result']
+            rerun_script()
+
+def rerun_script():
+    # 兼容旧版本Streamlit（st.rerun在1.27之后提供）
+    rerun = getattr(st, "rerun", None) or st.experimental_rerun
+    rerun()
+
 st.set_page_config(page_title="SKU活动价自动匹配与审核工具_v1.0（测试版/开发中）", layout="wide")
 
-st.title("SKU活动价自动匹配与审核工具_v1.2（测试版/开发中）")
-st.markdown("""
+# === 性能分析：按需采集一次完整运行（URL加 ?profile=1 或在侧边栏启用） ===
+st.sidebar.markdown("### 性能分析")
+profile_this_run = st.session_state.pop('profile_next_run', False) or get_query_param("profile") == "1"
+profile_recompute = st.sidebar.checkbox("分析时重新执行匹配", value=True, key="profile_recompute",
+                                        help="不复用已缓存的匹配结果，使匹配耗时计入分析")
+if st.sidebar.button("分析下一次运行"):
+    st.session_state['profile_next_run'] = True
+    st.sidebar.info("已就绪：下一次操作（上传、修改、导出等）将被完整分析")
+
+profiler = None
+if profile_this_run:
+    clear_query_param("profile")
+    profiler, profile_started_at = start_capture()
+    if profiler is None:
+        st.sidebar.warning("其他会话正在进行性能分析，请稍后再试")
+
+# 采集期间提前结束的运行（rerun_script、Streamlit中断重跑、未捕获的异常）也要停止采集，
+# 否则本会话之后的运行都会变慢，Python 3.12起其它会话也无法再开始采集
+try:
+    st.title("SKU活动价自动匹配与审核工具_v1.2（测试版/开发中）")
+    st.markdown("""
 #### 操作指引：
 1. 上传SKU表、工具价格表、活动价格提交表（支持Excel/CSV）。
 2. 工具自动匹配并填写活动价格，优先用工具价格表，匹配不到用Parent SKU，再匹配不到用推荐价格。
@@ -258,287 +637,422 @@ st.markdown("""
 > 当前为测试版，功能持续开发中，结果仅供参考。
 """)
 
-# 在程序开始处初始化关键变量，避免NameError
-campaign_df = None
-raw_campaign_df = None
-export_df = None
-editable_df = None
-campaign_file = None
-skip_start = 2
-skip_end = 3
-
-# 上传SKU表和工具价格表后，均支持选择表头行
-sku_df = None
-tool_price_df = None
-sku_header_row = 3
-tool_header_row = 2
-
-col1, col2, col3 = st.columns(3)
-with col1:
-    sku_file = st.file_uploader("上传SKU表", type=["xlsx", "xls", "csv"], key="sku")
-    if sku_file is not None:
-        sku_header_row = st.number_input("SKU表表头所在行", min_value=1, max_value=5, value=3, key="sku_header")
-        # 先读取为BytesIO，兼容openpyxl
-        file_bytes = io.BytesIO(sku_file.read())
-        sku_df = strip_columns(pd.read_excel(file_bytes, header=sku_header_row-1))
-
-with col2:
-    tool_price_file = st.file_uploader("上传工具价格表", type=["xlsx", "xls", "csv"], key="tool")
-    if tool_price_file is not None:
-        tool_header_row = st.number_input("工具价格表表头所在行", min_value=1, max_value=5, value=2, key="tool_header")
-        tool_price_df = strip_columns(pd.read_excel(tool_price_file, header=tool_header_row-1))
-
-with col3:
-    campaign_file = st.file_uploader("上传活动价格提交表", type=["xlsx", "xls", "csv"], key="campaign")
-    if campaign_file is not None:
-        skip_col1, skip_col2 = st.columns(2)
-        with skip_col1:
-            skip_start = st.number_input("备注起始行号（从1开始）", min_value=2, max_value=10, value=2, key="skip_start")
-        with skip_col2:
-            skip_end = st.number_input("备注结束行号（从1开始）", min_value=skip_start, max_value=20, value=3, key="skip_end")
-        # 计算需要跳过的行（pandas的skiprows是从0开始的索引）
-        skiprows = list(range(skip_start-1, skip_end))
-        raw_campaign_df = pd.read_excel(campaign_file, header=0, skiprows=skiprows)  # 原始表格
-        campaign_df = strip_columns(raw_campaign_df.copy())  # 用于后续处理
-        
-        # 调试信息：输出campaign_df的列名
-        st.write("### Campaign表列名检查")
-        st.write(f"原始列名: {list(campaign_df.columns)}")
-        # 检查是否包含必要的列
-        required_cols = [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, CAMPAIGN_RECOMMEND_FIELD, CAMPAIGN_PRICE_FIELD]
-        missing_cols = [col for col in required_cols if col not in campaign_df.columns]
-        if missing_cols:
-            st.error(f"Campaign表缺少必要列: {', '.join(missing_cols)}")
-            st.write("可能的列名映射问题，请检查字段名配置或调整表头")
-
-# 保证用于合并的字段类型一致，并清洗SKU相关字段
-for col in [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID]:
-    if campaign_df is not None and col in campaign_df.columns:
-        campaign_df[col] = campaign_df[col].astype(str).str.strip()
-    if sku_df is not None and col in sku_df.columns:
-        sku_df[col] = sku_df[col].astype(str).str.strip()
-
-# 清洗SKU字段，确保内容一致
-if sku_df is not None and SKU_FIELD in sku_df.columns:
-    sku_df[SKU_FIELD] = sku_df[SKU_FIELD].astype(str).str.strip()
-if sku_df is not None and PARENT_SKU_FIELD in sku_df.columns:
-    sku_df[PARENT_SKU_FIELD] = sku_df[PARENT_SKU_FIELD].astype(str).str.strip()
-if tool_price_df is not None and TOOL_SKU_FIELD in tool_price_df.columns:
-    tool_price_df[TOOL_SKU_FIELD] = tool_price_df[TOOL_SKU_FIELD].astype(str).str.strip()
-
-# 新增：ID字段清洗函数，去除小数点（如.0），保证编号匹配
-# SKU表
-if sku_df is not None:
-    for col in [SKU_FIELD, PARENT_SKU_FIELD, CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID]:
-        sku_df = clean_id_column(sku_df, col)
-# 工具价格表
-if tool_price_df is not None:
-    tool_price_df = clean_id_column(tool_price_df, TOOL_SKU_FIELD)
-# 活动价格表
-if campaign_df is not None:
-    for col in [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID]:
-        campaign_df = clean_id_column(campaign_df, col)
+    # 在程序开始处初始化关键变量，避免NameError
+    campaign_df = None
+    raw_campaign_df = None
+    export_df = None
+    editable_df = None
+    campaign_file = None
+    campaign_bytes = None
+    campaign_hash = None
+    campaign_sniffed = None
+    match_pending = False
+    skip_start = 2
+    skip_end = 3
 
-st.markdown("---")#分隔符
+    # 上传控件的值在本次运行开始时已写入session_state
+    files_uploaded = any(st.session_state.get(key) is not None for key in ("sku", "tool", "campaign"))
 
-st.subheader('价格确认与导出')
+    # === 会话快照：按运行ID保存匹配结果、人工确认/修改和导出设置，刷新页面或服务重启后可恢复 ===
+    if 'run_id' not in st.session_state:
+        # 新会话：URL中带有运行ID且该运行有快照时直接恢复，不重新解析和匹配
+        requested_run_id = get_query_param("run")
+        if requested_run_id and not files_uploaded:
+            restore_started_at = time.perf_counter()
+            restored = load_snapshot(requested_run_id)
+            if restored is not None:
+                restored['restore_seconds'] = time.perf_counter() - restore_started_at
+                st.session_state['restored_run'] = restored
+                st.session_state['review_decisions'] = restored['decisions']
+        if 'restored_run' in st.session_state:
+            st.session_state['run_id'] = requested_run_id
+        else:
+            st.session_state['run_id'] = uuid.uuid4().hex[:12]
+        set_query_param("run", st.session_state['run_id'])
 
-st.markdown('**价格浮动范围设置**（推荐价格的±百分比，默认50%，可自定义）')
-price_range_percent = st.number_input('允许价格浮动范围（%）', min_value=0, max_value=100, value=50, step=1)
+    restored_run = st.session_state.get('restored_run')
+    if restored_run is not None and files_uploaded:
+        # 上传了新文件，退出恢复模式，按正常流程处理
+        del st.session_state['restored_run']
+        restored_run = None
+    restored_settings = restored_run['settings'] if restored_run is not None else {}
 
-if sku_df is not None and tool_price_df is not None and campaign_df is not None:
-    # 数据验证 - 检查必要字段
-    sku_required = [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, SKU_FIELD, PARENT_SKU_FIELD]
-    tool_required = [TOOL_SKU_FIELD, TOOL_PRICE_FIELD]
-    campaign_required = [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, CAMPAIGN_RECOMMEND_FIELD]
-    
-    # 验证各表必要字段
-    is_valid_sku, sku_error = validate_required_columns(sku_df, sku_required, "SKU表")
-    is_valid_tool, tool_error = validate_required_columns(tool_price_df, tool_required, "工具价格表")
-    is_valid_campaign, campaign_error = validate_required_columns(campaign_df, campaign_required, "活动价格提交表")
-    
-    if not (is_valid_sku and is_valid_tool and is_valid_campaign):
-        missing_fields = []
-        if not is_valid_sku: missing_fields.append(sku_error)
-        if not is_valid_tool: missing_fields.append(tool_error)
-        if not is_valid_campaign: missing_fields.append(campaign_error)
-        st.error("数据验证失败：\n" + "\n".join(missing_fields))
-    else:
-        # 合并SKU信息到活动价格表
-        sku_id_columns = [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID]
-        sku_merge_columns = [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, SKU_FIELD, PARENT_SKU_FIELD]
-        campaign_df = campaign_df.merge(sku_df[sku_merge_columns], on=sku_id_columns, how="left")
-        
-        # 使用向量化方法进行价格匹配
-        campaign_df = get_tool_price_vectorized(campaign_df, tool_price_df)
-    
-    campaign_df['需用户确认'] = campaign_df['价格来源'] == '推荐价格'
-    # 调试信息：输出价格来源统计 
-    st.write("### 调试信息")
-    st.write("价格来源统计:", campaign_df['价格来源'].value_counts().to_dict())
-    st.success("自动匹配完成，橙色高亮行为需人工确认/修改：")
+    st.sidebar.markdown("### 会话快照")
+    st.sidebar.caption(f"运行ID：{st.session_state['run_id']}。匹配结果和人工确认/修改会自动保存，"
+                       f"刷新页面或服务重启后用同一地址打开即可恢复")
 
-    # 可编辑表格过滤：显示推荐价格、无效工具价格、匹配失败的行
-    campaign_df['初始推荐价格'] = campaign_df[CAMPAIGN_RECOMMEND_FIELD]
-        
-    # 保存是否有需要审查的价格数据
-    需要审查的价格条件 = (
-        (campaign_df['价格来源'] == '推荐价格') | 
-        (campaign_df['价格来源'] == '无效工具价格(零)') | 
-        (campaign_df['价格来源'] == '无效Parent工具价格(零)')
-    )
-    has_prices_to_review = 需要审查的价格条件.any()
-        
-    # 调试信息：输出审查条件统计
-    st.write(f"需要审查的价格数量: {需要审查的价格条件.sum()}")
-        
-    # 筛选条件：包含所有非有效工具价格的数据
-    需确认条件 = 需要审查的价格条件  # 推荐价格或无效工具价格
-    价格缺失条件 = (campaign_df[CAMPAIGN_PRICE_FIELD].isnull() | (campaign_df[CAMPAIGN_PRICE_FIELD] == ""))
-    st.write(f"价格缺失数量: {价格缺失条件.sum()}")
-        
-    编辑表筛选条件 = 需确认条件 | 价格缺失条件
-    st.write(f"编辑表筛选条件匹配数量: {编辑表筛选条件.sum()}")
-        
-    editable_df = campaign_df[编辑表筛选条件].copy()
-    st.write(f"可编辑表格行数: {len(editable_df)}")
-        
-    # 确保editable_df不为空才执行填充操作
-    if not editable_df.empty:
-        # 自动填入推荐价格（缺失时）
-        价格缺失掩码 = editable_df[CAMPAIGN_PRICE_FIELD].isnull() | (editable_df[CAMPAIGN_PRICE_FIELD] == "")
-        if 价格缺失掩码.any():
-            editable_df.loc[价格缺失掩码, CAMPAIGN_PRICE_FIELD] = editable_df.loc[价格缺失掩码, CAMPAIGN_RECOMMEND_FIELD].values
-
-    # 新增：标记修改列，仅做视觉标记
-    editable_df['标记修改'] = False
-
-    # 列顺序（去掉"标记修改"和"需用户确认"）
-    显示列优先顺序 = [
-        CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, '价格来源', CAMPAIGN_RECOMMEND_FIELD,
-        CAMPAIGN_PRICE_FIELD, '已修改'
-    ]
-    editable_cols_order = [col for col in 显示列优先顺序 if col in editable_df.columns] + \
-                          [col for col in editable_df.columns if col not in 显示列优先顺序 and col not in ['标记修改', '需用户确认']]
-
-    st.markdown("#### 活动价格审核表（可编辑，仅显示推荐价格/匹配失败）")
-        
-    # 初始化price_input变量，避免在editable_df为空时未定义
-    price_input = pd.DataFrame()
-        
-    # 修改判断逻辑：只有在完全没有需要审查的价格数据时才显示提示信息
-    if not has_prices_to_review and 价格缺失条件.sum() == 0:
-        st.info("没有需要人工确认或修改的价格，所有价格已自动匹配完成！")
-    else:
-        # 添加已人工确认列
-        editable_df['已人工确认'] = False
-        editable_cols_order = [col for col in 显示列优先顺序 if col in editable_df.columns] + \
-                             [col for col in editable_df.columns if col not in 显示列优先顺序 and col not in ['标记修改', '需用户确认']]
+    # 有文件上传（或恢复快照）后才显示数据处理相关的选项
+    data_uploaded = files_uploaded or restored_run is not None
+
+    # 上传SKU表和工具价格表后，均支持选择表头行
+    sku_df = None
+    tool_price_df = None
+    sku_price_dict = None
+    sku_header_row = 3
+    tool_header_row = 2
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        sku_file = st.file_uploader("上传SKU表", type=["xlsx", "xls", "csv"], key="sku")
+        if sku_file is not None:
+            sku_hash = upload_digest(sku_file)
+            sku_header_row = settle_header_row("sku", "SKU表表头所在行", sku_file.getvalue(), sku_hash, SKU_HEADER_FIELDS, 3)
+            if sku_header_row is not None:
+                sku_df = load_sku_table(sku_file.getvalue(), sku_hash, sku_header_row)
+
+    with col2:
+        tool_price_file = st.file_uploader("上传工具价格表", type=["xlsx", "xls", "csv"], key="tool")
+        if tool_price_file is not None:
+            tool_hash = upload_digest(tool_price_file)
+            tool_header_row = settle_header_row("tool", "工具价格表表头所在行", tool_price_file.getvalue(), tool_hash,
+                                                TOOL_HEADER_FIELDS, 2)
+            if tool_header_row is not None:
+                tool_price_df = load_tool_price_table(tool_price_file.getvalue(), tool_hash, tool_header_row)
+
+    with col3:
+        campaign_file = st.file_uploader("上传活动价格提交表", type=["xlsx", "xls", "csv"], key="campaign")
+        if campaign_file is not None:
+            campaign_hash = upload_digest(campaign_file)
+            skip_start, skip_end, campaign_sniffed = settle_remark_rows(campaign_file.getvalue(), campaign_hash)
+        if campaign_file is not None and skip_start is not None:
+            campaign_bytes = campaign_file.getvalue()
+            # 计算需要跳过的行（pandas的skiprows是从0开始的索引）
+            skiprows = list(range(skip_start-1, skip_end))
+            raw_campaign_df = load_campaign_table(campaign_bytes, campaign_hash, skiprows)  # 原始表格
+            # 用于后续处理（已清洗，只读）
+            campaign_df = prepare_campaign_frame(raw_campaign_df, (campaign_hash, skip_start, skip_end))
+            
+            # 调试信息：输出campaign_df的列名（匹配任务轮询期间不重复输出）
+            if not stage_job_running('match_job'):
+                st.write("### Campaign表列名检查")
+                st.write(f"原始列名: {list(campaign_df.columns)}")
+            # 检查是否包含必要的列
+            required_cols = [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, CAMPAIGN_RECOMMEND_FIELD, CAMPAIGN_PRICE_FIELD]
+            missing_cols = [col for col in required_cols if col not in campaign_df.columns]
+            if missing_cols:
+                st.error(f"Campaign表缺少必要列: {', '.join(missing_cols)}")
+                st.write("可能的列名映射问题，请检查字段名配置或调整表头")
+
+    st.markdown("---")#分隔符
+
+    st.subheader('价格确认与导出')
+
+    st.markdown('**价格浮动范围设置**（推荐价格的±百分比，默认50%，可自定义）')
+    price_range_percent = st.number_input('允许价格浮动范围（%）', min_value=0, max_value=100,
+                                          value=restored_settings.get('price_range_percent', 50), step=1)
+
+    # 未上传文件时不显示重复键选项；工具价格表默认保留末条，与原先dict(zip(...))的结果一致
+    sku_dup_policy = st.session_state.get("sku_dup_policy", "first")
+    tool_dup_policy = st.session_state.get("tool_dup_policy", "last")
+    if data_uploaded:
+        st.markdown('**重复键处理方式**（合并SKU信息和建立工具价格字典之前处理）')
+        dup_col1, dup_col2 = st.columns(2)
+        with dup_col1:
+            sku_dup_policy = st.selectbox(
+                "SKU表重复Product ID/Variation ID", options=list(DUPLICATE_POLICIES),
+                format_func=DUPLICATE_POLICIES.get, index=0, key="sku_dup_policy"
+            )
+        with dup_col2:
+            tool_dup_policy = st.selectbox(
+                "工具价格表重复sku编码", options=list(DUPLICATE_POLICIES),
+                format_func=DUPLICATE_POLICIES.get, index=1, key="tool_dup_policy"
+            )
+
+    if sku_df is not None and tool_price_df is not None and campaign_df is not None:
+        # 数据验证 - 检查必要字段
+        sku_required = [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, SKU_FIELD, PARENT_SKU_FIELD]
+        tool_required = [TOOL_SKU_FIELD, TOOL_PRICE_FIELD]
+        campaign_required = [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, CAMPAIGN_RECOMMEND_FIELD]
         
-        # 确保'已人工确认'列在显示列中
-        if '已人工确认' not in editable_cols_order and '已人工确认' in editable_df.columns:
-            editable_cols_order.append('已人工确认')
+        # 验证各表必要字段
+        is_valid_sku, sku_error = validate_required_columns(sku_df, sku_required, "SKU表")
+        is_valid_tool, tool_error = validate_required_columns(tool_price_df, tool_required, "工具价格表")
+        is_valid_campaign, campaign_error = validate_required_columns(campaign_df, campaign_required, "活动价格提交表")
         
-        # 如果editable_df为空（虽然有推荐价格来源但可能被过滤掉），添加提示
-        if editable_df.empty:
-            st.warning("筛选后没有数据显示，请检查筛选条件")
+        if not (is_valid_sku and is_valid_tool and is_valid_campaign):
+            missing_fields = []
+            if not is_valid_sku: missing_fields.append(sku_error)
+            if not is_valid_tool: missing_fields.append(tool_error)
+            if not is_valid_campaign: missing_fields.append(campaign_error)
+            st.error("数据验证失败：\n" + "\n".join(missing_fields))
         else:
-            price_input = st.data_editor(
-                editable_df[editable_cols_order],
-                use_container_width=True,
-                num_rows="dynamic",
-                disabled=[col for col in editable_df.columns if col != CAMPAIGN_PRICE_FIELD and col != '已人工确认'],
-                hide_index=True,
-                key="editable_confirm"
+            # 先处理重复键，避免合并时行数膨胀、价格字典随意取值
+            sku_df, sku_dup_report = resolve_reference_duplicates(
+                'sku', sku_hash, sku_header_row, sku_df,
+                [CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID], [SKU_FIELD, PARENT_SKU_FIELD], sku_dup_policy
+            )
+            tool_price_df, tool_dup_report = resolve_reference_duplicates(
+                'tool', tool_hash, tool_header_row, tool_price_df,
+                [TOOL_SKU_FIELD], [TOOL_PRICE_FIELD], tool_dup_policy
+            )
+            show_duplicate_report("SKU表", "Product ID/Variation ID", sku_dup_report, sku_dup_policy)
+            show_duplicate_report("工具价格表", "sku编码", tool_dup_report, tool_dup_policy)
+            sku_price_dict = get_shared_cache().get_or_build(
+                ("sku_price_dict", tool_hash, tool_header_row, tool_dup_policy),
+                lambda: build_sku_price_dict(tool_price_df)
             )
             
-            # 检查price_input是否为空
-            st.write(f"数据编辑器返回的price_input行数: {len(price_input)}")
+            # 合并SKU信息并匹配价格，在后台任务中运行；输入不变时直接复用上次结果
+            # 签名结构：SKU表(0-2)、工具价格表(3-5)、活动价格提交表(6-8)
+            match_signature = (
+                sku_hash, sku_header_row, sku_dup_policy,
+                tool_hash, tool_header_row, tool_dup_policy,
+                campaign_hash, skip_start, skip_end
+            )
+            match_state = st.session_state.get('match_job')
+            force_rematch = profiler is not None and profile_recompute
+            if match_state is None or match_state['signature'] != match_signature or force_rematch:
+                if (not force_rematch and match_state is not None and 'result' in match_state
+                        and match_state.get('sku_price_dict') is not None
+                        and only_tool_price_changed(match_state['signature'], match_signature)):
+                    # 工具价格表换了新版本：只重新匹配受影响的行，其余行保留匹配结果和人工决定
+                    st.session_state['review_decisions'] = st.session_state.get('review_snapshot')
+                    submit_stage_job('match_job', '工具价格增量更新', match_signature, run_delta_matching,
+                                     match_state['result'], match_state['sku_price_dict'], sku_price_dict, tool_price_df)
+                else:
+                    if match_state is None or match_state['signature'] != match_signature:
+                        # 输入变了才丢弃人工决定；同一输入强制重新匹配（性能分析）时保留
+                        st.session_state['review_decisions'] = None
+                        st.session_state['price_delta_report'] = None
+                    elif force_rematch:
+                        st.session_state['review_decisions'] = st.session_state.get('review_snapshot')
+                    submit_stage_job('match_job', '价格匹配', match_signature, run_matching,
+                                     campaign_df, sku_df, tool_price_df, sku_price_dict)
+                # 保存本次使用的价格字典，供下一版本工具价格表做增量比较
+                st.session_state['match_job']['sku_price_dict'] = sku_price_dict
+            match_status, match_result = poll_stage_job('match_job')
+            if match_status == 'done':
+                delta_report = match_result.attrs.pop('price_delta', None)
+                if delta_report is not None:
+                    # 重新匹配的行需要按新价格重新审核，丢弃这些行的人工决定；审核表按新数据重建
+                    st.session_state['price_delta_report'] = delta_report
+                    st.session_state['review_decisions'] = drop_affected_decisions(
+                        st.session_state.get('review_decisions'), delta_report['affected_keys']
+                    )
+                    st.session_state['review_generation'] = st.session_state.get('review_generation', 0) + 1
+                # 后续步骤会原地修改campaign_df，保留缓存结果不变
+                campaign_df = match_result.copy()
+                # 保存到会话快照（内容不变时不重复写入）
+                snapshot = get_session_snapshot()
+                snapshot.save_campaign_file(campaign_bytes, campaign_hash)
+                snapshot.save_campaign_frame(repr((campaign_hash, skip_start, skip_end)), raw_campaign_df)
+                snapshot.save_matched(repr(match_signature), match_result)
+            else:
+                match_pending = True
+                if match_status in ('failed', 'cancelled') and st.button("重新开始匹配"):
+                    submit_stage_job('match_job', '价格匹配', match_signature, run_matching,
+                                     campaign_df, sku_df, tool_price_df, sku_price_dict)
+                    st.session_state['match_job']['sku_price_dict'] = sku_price_dict
+                    rerun_script()
+                campaign_df = None
 
-    # 检查价格是否被修改
-    def check_modified(row):
-        try:
-            # 确保'初始推荐价格'列存在
-            if '初始推荐价格' not in row:
-                return False
-            return float(row[CAMPAIGN_PRICE_FIELD]) != float(row['初始推荐价格'])
-        except (ValueError, TypeError, KeyError):
-            # 明确异常类型，避免掩盖其他异常
+    if restored_run is not None:
+        # 恢复模式：直接使用快照中的匹配结果和活动价格提交表，不重新解析和匹配
+        skip_start = restored_settings.get('skip_start', skip_start)
+        skip_end = restored_settings.get('skip_end', skip_end)
+        campaign_bytes = restored_run['campaign_bytes']
+        campaign_hash = restored_run['campaign_hash']
+        if restored_run['campaign_frame_key'] == repr((campaign_hash, skip_start, skip_end)):
+            raw_campaign_df = restored_run['campaign_frame']
+        else:
+            # 快照中没有对应的解析结果（旧版本保存的快照），重新解析原文件
+            raw_campaign_df = load_campaign_table(campaign_bytes, campaign_hash, list(range(skip_start-1, skip_end)))
+        campaign_df = restored_run['matched'].copy()
+        st.success(f"已从会话快照恢复（保存于{restored_run['saved_at']}，载入耗时{restored_run['restore_seconds']:.2f}秒），"
+                   f"匹配结果和人工确认/修改已载入；如需处理新文件请直接上传")
+
+    # 生成Excel期间页面定时刷新以更新进度：跳过审核表、预览表和导出数据的计算，生成完成后恢复显示
+    export_running = stage_job_running('export_job')
+    if export_running and campaign_df is not None:
+        # 审核表本次不显示，其编辑状态会被清除；恢复显示时用已保存的人工决定重建
+        st.session_state['review_decisions'] = st.session_state.get('review_snapshot')
+        st.info("正在生成Excel，审核表和预览表将在生成完成后恢复显示")
+
+    if campaign_df is not None and '价格来源' in campaign_df.columns and not export_running:
+        if campaign_df.attrs.get('invalid_price_count'):
+            st.warning(f"价格字段包含{campaign_df.attrs['invalid_price_count']}个无法转换为数字的值，已按缺失处理，请检查数据")
+        campaign_df['需用户确认'] = campaign_df['价格来源'] == '推荐价格'
+        # 调试信息：输出价格来源统计 
+        st.write("### 调试信息")
+        st.write("价格来源统计:", campaign_df['价格来源'].value_counts().to_dict())
+        st.success("自动匹配完成，橙色高亮行为需人工确认/修改：")
+        if st.session_state.get('price_delta_report') is not None:
+            show_price_delta_report(st.session_state['price_delta_report'])
+
+        # 可编辑表格过滤：显示推荐价格、无效工具价格、匹配失败的行
+        campaign_df['初始推荐价格'] = campaign_df[CAMPAIGN_RECOMMEND_FIELD]
+            
+        # 保存是否有需要审查的价格数据
+        需要审查的价格条件 = (
+            (campaign_df['价格来源'] == '推荐价格') | 
+            (campaign_df['价格来源'] == '无效工具价格(零)') | 
+            (campaign_df['价格来源'] == '无效Parent工具价格(零)')
+        )
+        has_prices_to_review = 需要审查的价格条件.any()
+            
+        # 调试信息：输出审查条件统计
+        st.write(f"需要审查的价格数量: {需要审查的价格条件.sum()}")
+            
+        # 筛选条件：包含所有非有效工具价格的数据
+        需确认条件 = 需要审查的价格条件  # 推荐价格或无效工具价格
+        价格缺失条件 = (campaign_df[CAMPAIGN_PRICE_FIELD].isnull() | (campaign_df[CAMPAIGN_PRICE_FIELD] == ""))
+        st.write(f"价格缺失数量: {价格缺失条件.sum()}")
+            
+        编辑表筛选条件 = 需确认条件 | 价格缺失条件
+        st.write(f"编辑表筛选条件匹配数量: {编辑表筛选条件.sum()}")
+            
+        editable_df = campaign_df[编辑表筛选条件].copy()
+        st.write(f"可编辑表格行数: {len(editable_df)}")
+            
+        # 确保editable_df不为空才执行填充操作
+        if not editable_df.empty:
+            # 自动填入推荐价格（缺失时）
+            价格缺失掩码 = editable_df[CAMPAIGN_PRICE_FIELD].isnull() | (editable_df[CAMPAIGN_PRICE_FIELD] == "")
+            if 价格缺失掩码.any():
+                editable_df.loc[价格缺失掩码, CAMPAIGN_PRICE_FIELD] = editable_df.loc[价格缺失掩码, CAMPAIGN_RECOMMEND_FIELD].values
+
+        # 新增：标记修改列，仅做视觉标记
+        editable_df['标记修改'] = False
+
+        # 列顺序（去掉"标记修改"和"需用户确认"）
+        显示列优先顺序 = [
+            CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID, '价格来源', CAMPAIGN_RECOMMEND_FIELD,
+            CAMPAIGN_PRICE_FIELD, '已修改'
+        ]
+        editable_cols_order = [col for col in 显示列优先顺序 if col in editable_df.columns] + \
+                              [col for col in editable_df.columns if col not in 显示列优先顺序 and col not in ['标记修改', '需用户确认']]
+
+        st.markdown("#### 活动价格审核表（可编辑，仅显示推荐价格/匹配失败）")
+            
+        # 初始化price_input变量，避免在editable_df为空时未定义
+        price_input = pd.DataFrame()
+            
+        # 修改判断逻辑：只有在完全没有需要审查的价格数据时才显示提示信息
+        if not has_prices_to_review and 价格缺失条件.sum() == 0:
+            st.info("没有需要人工确认或修改的价格，所有价格已自动匹配完成！")
+        else:
+            # 添加已人工确认列
+            editable_df['已人工确认'] = False
+            # 把保留的人工确认/修改填回审核表（工具价格增量更新、恢复快照、生成Excel后重建审核表时）；
+            # 只有本次会话确实做过增量更新时才提示保留的行数
+            restored_count = apply_review_decisions(editable_df, st.session_state.get('review_decisions'))
+            if restored_count and st.session_state.get('price_delta_report') is not None:
+                st.caption(f"已保留{restored_count}行在工具价格更新前的人工确认/修改")
+            editable_cols_order = [col for col in 显示列优先顺序 if col in editable_df.columns] + \
+                                 [col for col in editable_df.columns if col not in 显示列优先顺序 and col not in ['标记修改', '需用户确认']]
+            
+            # 确保'已人工确认'列在显示列中
+            if '已人工确认' not in editable_cols_order and '已人工确认' in editable_df.columns:
+                editable_cols_order.append('已人工确认')
+            
+            # 如果editable_df为空（虽然有推荐价格来源但可能被过滤掉），添加提示
+            if editable_df.empty:
+                st.warning("筛选后没有数据显示，请检查筛选条件")
+            else:
+                price_input = st.data_editor(
+                    editable_df[editable_cols_order],
+                    use_container_width=True,
+                    num_rows="dynamic",
+                    disabled=[col for col in editable_df.columns if col != CAMPAIGN_PRICE_FIELD and col != '已人工确认'],
+                    hide_index=True,
+                    column_config={
+                        CAMPAIGN_RECOMMEND_FIELD: st.column_config.NumberColumn(format="%d"),
+                        CAMPAIGN_PRICE_FIELD: st.column_config.NumberColumn(format="%d"),
+                    },
+                    key=f"editable_confirm_{st.session_state.get('review_generation', 0)}"
+                )
+                
+                # 检查price_input是否为空
+                st.write(f"数据编辑器返回的price_input行数: {len(price_input)}")
+
+        # 检查价格是否被修改
+        def check_modified(row):
             try:
+                # 确保'初始推荐价格'列存在
                 if '初始推荐价格' not in row:
                     return False
-                return str(row[CAMPAIGN_PRICE_FIELD]) != str(row['初始推荐价格'])
-            except KeyError:
-                # 如果发生KeyError，可能是'初始推荐价格'或CAMPAIGN_PRICE_FIELD不存在
-                st.error(f"检查修改时发生键错误，行内容: {row}")
-                return False
-    
-    try:
-        price_input['已修改'] = price_input.apply(lambda row: check_modified(row), axis=1)
+                return float(row[CAMPAIGN_PRICE_FIELD]) != float(row['初始推荐价格'])
+            except (ValueError, TypeError, KeyError):
+                # 明确异常类型，避免掩盖其他异常
+                try:
+                    if '初始推荐价格' not in row:
+                        return False
+                    return str(row[CAMPAIGN_PRICE_FIELD]) != str(row['初始推荐价格'])
+                except KeyError:
+                    # 如果发生KeyError，可能是'初始推荐价格'或CAMPAIGN_PRICE_FIELD不存在
+                    st.error(f"检查修改时发生键错误，行内容: {row}")
+                    return False
         
-        # 确保'已人工确认'列存在于同步数据中
-        if '已人工确认' not in price_input.columns:
-            price_input['已人工确认'] = False
-    except Exception as e:
-        st.error(f"处理price_input时出错: {str(e)}")
-        # 输出price_input的列信息
-        st.write(f"price_input列: {list(price_input.columns)}")
-
-    # 价格有效性校验
-    def is_price_valid(row, percent):
         try:
-            rec = float(row[CAMPAIGN_RECOMMEND_FIELD])
-            price = float(row[CAMPAIGN_PRICE_FIELD])
-            min_p = rec * (1 - percent/100)
-            max_p = rec * (1 + percent/100)
-            return min_p <= price <= max_p
-        except (ValueError, TypeError, ZeroDivisionError):
-            return False
-
-    # 只有在price_input非空时才执行价格验证
-    if not price_input.empty and CAMPAIGN_PRICE_FIELD in price_input.columns:
-        price_input['价格有效'] = price_input.apply(lambda row: is_price_valid(row, price_range_percent), axis=1)
-        # 使用新增的同步函数替代重复代码
-        campaign_df = sync_price_data(
-            campaign_df, 
-            price_input, 
-            key_columns=[CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID],
-            value_columns=[CAMPAIGN_PRICE_FIELD, '已修改', '价格有效', '已人工确认'],
-            update_price_source=True
-        )
+            price_input['已修改'] = price_input.apply(lambda row: check_modified(row), axis=1)
+            
+            # 确保'已人工确认'列存在于同步数据中
+            if '已人工确认' not in price_input.columns:
+                price_input['已人工确认'] = False
+        except Exception as e:
+            st.error(f"处理price_input时出错: {str(e)}")
+            # 输出price_input的列信息
+            st.write(f"price_input列: {list(price_input.columns)}")
+
+        # 价格有效性校验
+        def is_price_valid(row, percent):
+            try:
+                rec = float(row[CAMPAIGN_RECOMMEND_FIELD])
+                price = float(row[CAMPAIGN_PRICE_FIELD])
+                min_p = rec * (1 - percent/100)
+                max_p = rec * (1 + percent/100)
+                return min_p <= price <= max_p
+            except (ValueError, TypeError, ZeroDivisionError):
+                return False
+
+        # 只有在price_input非空时才执行价格验证
+        if not price_input.empty and CAMPAIGN_PRICE_FIELD in price_input.columns:
+            price_input['价格有效'] = price_input.apply(lambda row: is_price_valid(row, price_range_percent), axis=1)
+            # 记录当前的人工决定（按Product ID/Variation ID），工具价格表更新时用于保留
+            st.session_state['review_snapshot'] = extract_review_decisions(price_input)
+            get_session_snapshot().save_decisions(st.session_state['review_snapshot'])
+            # 使用新增的同步函数替代重复代码
+            campaign_df = sync_price_data(
+                campaign_df, 
+                price_input, 
+                key_columns=[CAMPAIGN_PRODUCT_ID, CAMPAIGN_VARIATION_ID],
+                value_columns=[CAMPAIGN_PRICE_FIELD, '已修改', '价格有效', '已人工确认'],
+                update_price_source=True
+            )
+            # 人工修改的价格可能带小数，同样取整
+            coerce_price_columns(campaign_df, [CAMPAIGN_PRICE_FIELD])
+            
+            # 红色警告提示
+            invalid_rows = price_input[~price_input['价格有效']] if '价格有效' in price_input.columns else pd.DataFrame()
+            if not invalid_rows.empty:
+                st.error(f"有{len(invalid_rows)}行价格超出允许浮动范围，请注意核查！")
+        else:
+            st.session_state['review_snapshot'] = None
+            get_session_snapshot().save_decisions(None)
+            if '价格有效' not in campaign_df.columns:
+                campaign_df['价格有效'] = True
+
+    # ----------- 只读高亮表应显示所有匹配结果 -----------
+    # 确保campaign_df不为None再操作
+    if campaign_df is not None and not export_running:
+        show_cols = [col for col in campaign_df.columns if col not in ['需用户确认', '初始推荐价格', '已人工确认']]
         
-        # 红色警告提示
-        invalid_rows = price_input[~price_input['价格有效']] if '价格有效' in price_input.columns else pd.DataFrame()
-        if not invalid_rows.empty:
-            st.error(f"有{len(invalid_rows)}行价格超出允许浮动范围，请注意核查！")
-    else:
-        if '价格有效' not in campaign_df.columns:
-            campaign_df['价格有效'] = True
-
-# ----------- 只读高亮表应显示所有匹配结果 -----------
-# 确保campaign_df不为None再操作
-if campaign_df is not None:
-    show_cols = [col for col in campaign_df.columns if col not in ['需用户确认', '初始推荐价格', '已人工确认']]
-    
-    # 确保数据处理中'已人工确认'列存在，虽然不显示
-    if '已人工确认' not in campaign_df.columns:
-        campaign_df['已人工确认'] = False
-    
-    # === 千分位格式化显示 Campaign Price 字段 ===
-    show_df = campaign_df[show_cols].copy()
-    if CAMPAIGN_PRICE_FIELD in show_df.columns:
-        show_df[CAMPAIGN_PRICE_FIELD] = show_df[CAMPAIGN_PRICE_FIELD].apply(
-            lambda x: '{:,}'.format(int(x)) if pd.notnull(x) and str(x).strip() != "" else x
-        )
-    
-    # 新增：填充空值，防止AgGrid渲染异常
-    show_df = show_df.fillna("")
-    
-    # 将表格标题从"活动价格审核表（只读高亮，无复选框）"改为"活动价预览表"
-    st.markdown("#### 活动价预览表（按价格来源高亮显示）")
-    
-    # 添加简短说明，帮助用户理解不同颜色的含义
-    color_info = """
+        # 确保数据处理中'已人工确认'列存在，虽然不显示
+        if '已人工确认' not in campaign_df.columns:
+            campaign_df['已人工确认'] = False
+        
+        # 价格列保持数值类型，千分位由表格的valueFormatter显示，排序和筛选按数值进行
+        show_df = campaign_df[show_cols].copy()
+        
+        # 新增：填充空值，防止AgGrid渲染异常（数值列保留缺失值，序列化为null）
+        text_cols = show_df.select_dtypes(exclude='number').columns
+        show_df[text_cols] = show_df[text_cols].fillna("")
+        
+        # 将表格标题从"活动价格审核表（只读高亮，无复选框）"改为"活动价预览表"
+        st.markdown("#### 活动价预览表（按价格来源高亮显示）")
+        
+        # 添加简短说明，帮助用户理解不同颜色的含义
+        color_info = """
     <small>
     <span style="color:#1E90FF">■</span> 工具价格 | 
     <span style="color:#20B2AA">■</span> Parent工具价格 | 
@@ -547,392 +1061,163 @@ if campaign_df is not None:
     <span style="color:#FF0000">■</span> 价格缺失(含其他严重错误)
     </small>
     """
-    st.markdown(color_info, unsafe_allow_html=True)
-        
-    # ========== st-aggrid 只读预览表 ==========
-    gb = GridOptionsBuilder.from_dataframe(show_df)
-    gb.configure_default_column(filter=True, sortable=True)
-    gb.configure_grid_options(domLayout='normal')
-    # 多色高亮和价格缺失高亮
-    cellstyle_jscode = JsCode("""
-    function(params) {
-        // 价格来源多色高亮
-        if (params.colDef.field === '价格来源') {
-            if (params.value === '工具价格') {
-                return { 'color': 'white', 'backgroundColor': '#1E90FF' }
-            }
-            if (params.value === 'Parent工具价格') {
-                return { 'color': 'white', 'backgroundColor': '#20B2AA' }
-            }
-            if (params.value === '推荐价格') {
-                return { 'color': 'black', 'backgroundColor': '#FFD700' }
-            }
-            if (params.value === '无效工具价格(零)' || params.value === '无效Parent工具价格(零)') {
-                return { 'color': 'white', 'backgroundColor': '#FF8C00' }
-            }
-        }
-        // 活动价格缺失/错误高亮
-        if (params.colDef.field === '活动价格' || params.colDef.field === 'Campaign Price') {
-            if (params.value === '' || params.value === null || params.value === 0 || params.value === '0' || params.value === 'None') {
-                return { 'color': 'white', 'backgroundColor': '#FF0000' }
-            }
-        }
-        return {};
-    }
-    """)
-    if '价格来源' in show_df.columns:
-        gb.configure_column('价格来源', cellStyle=cellstyle_jscode)
-    if '活动价格' in show_df.columns:
-        gb.configure_column('活动价格', cellStyle=cellstyle_jscode)
-    elif 'Campaign Price' in show_df.columns:
-        gb.configure_column('Campaign Price', cellStyle=cellstyle_jscode)
-    gridOptions = gb.build()
-    # 汉化菜单
-    locale_cn = {
-        "page": "页",
-        "more": "更多",
-        "to": "到",
-        "of": "共",
-        "next": "下一页",
-        "last": "最后一页",
-        "first": "第一页",
-        "previous": "上一页",
-        "loadingOoo": "加载中...",
-        "selectAll": "全选",
-        "searchOoo": "搜索...",
-        "blank": "空",
-        "filterOoo": "自定义筛选...",
-        "applyFilter": "应用",
-        "equals": "等于",
-        "notEqual": "不等于",
-        "lessThan": "小于",
-        "greaterThan": "大于",
-        "lessThanOrEqual": "小于等于",
-        "greaterThanOrEqual": "大于等于",
-        "inRange": "区间",
-        "contains": "包含",
-        "notContains": "不包含",
-        "startsWith": "开头是",
-        "endsWith": "结尾是",
-        "andCondition": "并且",
-        "orCondition": "或者",
-        "noRowsToShow": "无数据显示",
-        "copy": "复制",
-        "copyWithHeaders": "带表头复制",
-        "paste": "粘贴",
-        "export": "导出",
-        "exportToCsv": "导出为CSV",
-        "exportToExcel": "导出为Excel",
-        "pinColumn": "固定列",
-        "valueAggregation": "聚合",
-        "autosizeThiscolumn": "自动调整本列宽度",
-        "autosizeAllColumns": "自动调整所有列宽度",
-        "resetColumns": "重置列",
-        "groupBy": "按此列分组",
-        "ungroupBy": "取消分组",
-        "resetGroup": "重置分组",
-        "rowGroupColumnsEmptyMessage": "拖动列到此处进行分组",
-        "valueColumnsEmptyMessage": "拖动列到此处进行聚合",
-        "pivotMode": "透视模式",
-        "groups": "分组",
-        "values": "值",
-        "pivots": "透视",
-        "group": "分组",
-        "columnsPanel": "列面板",
-        "filters": "筛选",
-        "rowGroup": "行分组",
-        "rowGroupPanel": "行分组面板",
-        "pivot": "透视",
-        "pivotPanel": "透视面板",
-        "notBlank": "非空",
-        "resetFilter": "重置",
-        "clearFilter": "清除",
-        "cancelFilter": "取消",
-        "apply": "应用",
-        "cancel": "取消",
-        "clear": "清除",
-        "textFilter": "文本筛选",
-        "numberFilter": "数字筛选",
-        "dateFilter": "日期筛选",
-        "setFilter": "集合筛选",
-        "columns": "列",
-        "menu": "菜单",
-        "filter": "筛选",
-        "deleteCondition": "删除条件",
-        "addCondition": "添加条件",
-        "filterConditions": "筛选条件",
-        "filterValue": "筛选值",
-        "filterField": "筛选字段",
-        "selectAllSearchResults": "全选搜索结果",
-        "search": "搜索",
-        "noMatches": "无匹配项",
-        "toolPanelColumns": "列",
-        "toolPanelFilters": "筛选",
-    }
-    AgGrid(
-        show_df,
-        gridOptions=gridOptions,
-        enable_enterprise_modules=False,
-        fit_columns_on_grid_load=True,
-        allow_unsafe_jscode=True,
-        theme='streamlit',
-        update_mode='NO_UPDATE',
-        localeText=locale_cn
-    )
+        st.markdown(color_info, unsafe_allow_html=True)
+            
+        # ========== st-aggrid 只读预览表 ==========
+        # 预览依赖和表格配置在首次显示预览时才加载，配置按列结构缓存复用
+        from st_aggrid import AgGrid
+        from grid_config import LOCALE_CN, build_preview_grid_options
+        AgGrid(
+            show_df,
+            gridOptions=build_preview_grid_options(show_df),
+            enable_enterprise_modules=False,
+            fit_columns_on_grid_load=True,
+            allow_unsafe_jscode=True,
+            theme='streamlit',
+            update_mode='NO_UPDATE',
+            localeText=LOCALE_CN
+        )
 
-# === 更高效的价格设置方法 ===
-def apply_campaign_price_to_export(export_df, campaign_df, key_columns):
-    """
-    更高效地将活动价格应用到导出DataFrame
-    
-    参数:
-    export_df: 导出用的DataFrame
-    campaign_df: 包含价格和来源信息的DataFrame
-    key_columns: 用于匹配两个DataFrame的键列
-    
-    返回:
-    更新后的export_df
-    """
-    # 准备需要的字段
-    if len(key_columns) == 0:
-        st.warning("没有找到合适的键列进行数据匹配")
-        return export_df
-    
-    # 确保campaign_df中包含必要的列
-    required_columns = [CAMPAIGN_PRICE_FIELD, '价格来源']
-    for col in required_columns:
-        if col not in campaign_df.columns:
-            st.error(f"数据处理错误: campaign_df中缺少必要列 '{col}'")
-            return export_df
-    
-    # 确保必要的列存在，如不存在则创建
-    if '已修改' not in campaign_df.columns:
-        campaign_df['已修改'] = False
-    
-    if '已人工确认' not in campaign_df.columns:
-        campaign_df['已人工确认'] = False
-    
-    # 创建匹配用的键
-    campaign_df['匹配键'] = campaign_df[key_columns].astype(str).apply(
-        lambda x: '-'.join([str(i).strip().replace('.0', '') for i in x]), axis=1
-    )
-    export_df['匹配键'] = export_df[key_columns].astype(str).apply(
-        lambda x: '-'.join([str(i).strip().replace('.0', '') for i in x]), axis=1
-    )
-    
-    # 提取要复制的字段，增加已人工确认列
-    campaign_slim = campaign_df[['匹配键', CAMPAIGN_PRICE_FIELD, '价格来源', '已修改', '已人工确认']].copy()
-    
-    # 使用merge代替循环 - 更高效
-    result_df = export_df.merge(campaign_slim, on='匹配键', how='left', suffixes=('', '_new'))
-    
-    # 更新价格
-    if CAMPAIGN_PRICE_FIELD + '_new' in result_df.columns:
-        result_df[CAMPAIGN_PRICE_FIELD] = result_df[CAMPAIGN_PRICE_FIELD + '_new'].fillna(result_df[CAMPAIGN_PRICE_FIELD])
-    
-    # 设置价格标记
-    # 先检查合并后的列是否存在
-    if '价格来源' not in result_df.columns:
-        result_df['价格标记'] = ''
-        st.warning("价格来源信息缺失，无法设置详细价格标记")
-    else:
-        # 定义条件，使用.fillna确保没有NaN值
-        条件_工具价格 = (result_df['价格来源'] == '工具价格').fillna(False)
-        条件_Parent价格 = (result_df['价格来源'] == 'Parent工具价格').fillna(False) 
-        条件_推荐价格 = (result_df['价格来源'] == '推荐价格').fillna(False)
-        条件_无效工具价格 = (result_df['价格来源'] == '无效工具价格(零)').fillna(False)
-        条件_无效Parent工具价格 = (result_df['价格来源'] == '无效Parent工具价格(零)').fillna(False)
-        
-        # 检查'已修改'和'已人工确认'列是否存在
-        条件_已修改 = result_df['已修改'].fillna(False) if '已修改' in result_df.columns else pd.Series(False, index=result_df.index)
-        条件_已人工确认 = result_df['已人工确认'].fillna(False) if '已人工确认' in result_df.columns else pd.Series(False, index=result_df.index)
+    # 新增：导出时只写价格，并在末尾添加标记信息
+    if match_pending or export_running:
+        # 匹配尚未完成，不允许导出未匹配的数据；正在生成Excel时不重复计算
+        export_df = None
+    elif raw_campaign_df is not None:
+        export_df = raw_campaign_df
         
-        # 创建标记列，增加人工确认信息
-        result_df['价格标记'] = ''
-        result_df.loc[条件_工具价格, '价格标记'] = '工具价格'
-        result_df.loc[条件_Parent价格, '价格标记'] = 'Parent工具价格'
-        result_df.loc[条件_推荐价格 & ~条件_已修改 & ~条件_已人工确认, '价格标记'] = '推荐价格'
-        result_df.loc[条件_推荐价格 & 条件_已修改, '价格标记'] = '推荐价格（已手动更改）'
-        result_df.loc[条件_推荐价格 & ~条件_已修改 & 条件_已人工确认, '价格标记'] = '推荐价格（已人工确认）'
-        result_df.loc[条件_推荐价格 & 条件_已修改 & 条件_已人工确认, '价格标记'] = '推荐价格（已手动更改并确认）'
-        # 无效工具价格的标记
-        result_df.loc[条件_无效工具价格 & ~条件_已修改 & ~条件_已人工确认, '价格标记'] = '无效工具价格(零)'
-        result_df.loc[条件_无效工具价格 & 条件_已修改, '价格标记'] = '无效工具价格(零)（已手动更改）'
-        result_df.loc[条件_无效工具价格 & ~条件_已修改 & 条件_已人工确认, '价格标记'] = '无效工具价格(零)（已人工确认）'
-        result_df.loc[条件_无效工具价格 & 条件_已修改 & 条件_已人工确认, '价格标记'] = '无效工具价格(零)（已手动更改并确认）'
-        # 无效Parent工具价格的标记
-        result_df.loc[条件_无效Parent工具价格 & ~条件_已修改 & ~条件_已人工确认, '价格标记'] = '无效Parent工具价格(零)'
-        result_df.loc[条件_无效Parent工具价格 & 条件_已修改, '价格标记'] = '无效Parent工具价格(零)（已手动更改）'
-        result_df.loc[条件_无效Parent工具价格 & ~条件_已修改 & 条件_已人工确认, '价格标记'] = '无效Parent工具价格(零)（已人工确认）'
-        result_df.loc[条件_无效Parent工具价格 & 条件_已修改 & 条件_已人工确认, '价格标记'] = '无效Parent工具价格(零)（已手动更改并确认）'
+        # 唯一键
+        sku_id_列 = []
+        if CAMPAIGN_PRODUCT_ID in export_df.columns:
+            sku_id_列.append(CAMPAIGN_PRODUCT_ID)
+        if CAMPAIGN_VARIATION_ID in export_df.columns:
+            sku_id_列.append(CAMPAIGN_VARIATION_ID)
         
-        # 价格缺失或严重错误情况
-        价格缺失条件 = (result_df[CAMPAIGN_PRICE_FIELD].isnull() | 
-                    (result_df[CAMPAIGN_PRICE_FIELD] == "") | 
-                    (result_df[CAMPAIGN_PRICE_FIELD] == 0))
-        if 价格缺失条件.any():
-            result_df.loc[价格缺失条件, '价格标记'] = '价格缺失(含其他严重错误)'
-    
-    # 删除临时列和不需要的merge结果列
-    drop_cols = ['匹配键']
-    for col in [CAMPAIGN_PRICE_FIELD + '_new', '价格来源', '已修改', '已人工确认']:
-        if col in result_df.columns:
-            drop_cols.append(col)
-    
-    result_df = result_df.drop(columns=drop_cols)
-    
-    return result_df
+        # 检查导出数据的有效性
+        if not sku_id_列:
+            st.error(f"导出表缺少必要的ID列 {CAMPAIGN_PRODUCT_ID} 或 {CAMPAIGN_VARIATION_ID}")
+            export_df = None
+        elif campaign_df is not None:
+            # 使用更高效的方法更新价格和标记，输入不变时复用上次结果
+            export_df = build_export_frame(raw_campaign_df, campaign_df, sku_id_列, (campaign_hash, skip_start, skip_end))
+        else:
+            export_df = raw_campaign_df.copy()
+            coerce_price_columns(export_df, [CAMPAIGN_PRICE_FIELD, CAMPAIGN_RECOMMEND_FIELD])
+    else:
+        export_df = None
+        st.warning("未加载活动价格提交表，无法导出数据")
 
-# 新增：导出时只写价格，并在末尾添加标记信息
-if raw_campaign_df is not None:
-    export_df = raw_campaign_df.copy()
-    
-    # 唯一键
-    sku_id_列 = []
-    if CAMPAIGN_PRODUCT_ID in export_df.columns:
-        sku_id_列.append(CAMPAIGN_PRODUCT_ID)
-    if CAMPAIGN_VARIATION_ID in export_df.columns:
-        sku_id_列.append(CAMPAIGN_VARIATION_ID)
-    
-    # 检查导出数据的有效性
-    if not sku_id_列:
-        st.error(f"导出表缺少必要的ID列 {CAMPAIGN_PRODUCT_ID} 或 {CAMPAIGN_VARIATION_ID}")
-    elif campaign_df is not None:
-        # 使用更高效的方法更新价格和标记
-        export_df = apply_campaign_price_to_export(export_df, campaign_df, sku_id_列)
-else:
-    export_df = None
-    st.warning("未加载活动价格提交表，无法导出数据")
+    # 确保editable_df已定义，避免NameError
+    if 'editable_df' not in locals():
+        editable_df = None
 
-# 确保editable_df已定义，避免NameError
-if 'editable_df' not in locals():
-    editable_df = None
+    # 拼接remark行
+    if 'skip_end' not in locals() or skip_end is None:
+        skip_end = 0
+        
+    remark_rows = skip_end
+    try:
+        if campaign_bytes is not None and export_df is not None:
+            # 备注行在表头嗅探时已读取，直接复用，不再重新解析文件
+            remark_df = load_head_rows(campaign_bytes, campaign_hash).iloc[:remark_rows].copy()
+            # remark_df只赋值它实际有的列名
+            remark_col_num = remark_df.shape[1]
+            remark_df.columns = list(export_df.columns)[:remark_col_num]
+            # 补齐缺失的列
+            for col in export_df.columns[remark_col_num:]:
+                remark_df[col] = ""
+            # 对齐顺序
+            remark_df = remark_df[export_df.columns]
+            
+            final_df = pd.concat([remark_df, export_df], ignore_index=True)
+        else:
+            final_df = export_df
+    except Exception as e:
+        st.warning(f"处理备注行时出错: {str(e)}，已忽略备注行")
+        final_df = export_df.copy() if export_df is not None else None
 
-# === 在此处格式化价格字段为整数 ===
-for df in [campaign_df, editable_df, export_df]:
-    if df is not None and CAMPAIGN_PRICE_FIELD in df.columns:
-        try:
-            df[CAMPAIGN_PRICE_FIELD] = df[CAMPAIGN_PRICE_FIELD].apply(
-                lambda x: int(float(x)) if pd.notnull(x) and str(x).strip() != "" else x
-            )
-        except (ValueError, TypeError):
-            # 捕获可能出现的类型转换错误
-            st.warning(f"价格字段包含无法转换为整数的值，请检查数据")
-    if df is not None and CAMPAIGN_RECOMMEND_FIELD in df.columns:
-        try:
-            df[CAMPAIGN_RECOMMEND_FIELD] = df[CAMPAIGN_RECOMMEND_FIELD].apply(
-                lambda x: int(float(x)) if pd.notnull(x) and str(x).strip() != "" else x
-            )
-        except (ValueError, TypeError):
-            st.warning(f"推荐价格字段包含无法转换为整数的值，请检查数据")
+    # === 只保留一处导出按钮和逻辑 ===
+    col_head, col_mark = st.columns(2)
+    with col_head:
+        header_row_input = st.number_input(
+            "活动价格提交表表头实际所在行号（从1开始）",
+            min_value=1,
+            max_value=50,
+            value=restored_settings.get(
+                'header_row', campaign_sniffed['header_row'] if campaign_sniffed and campaign_sniffed['header_row'] else 1
+            ),
+            key="campaign_header_row"
+        )
+    with col_mark:
+        price_mark_col = st.number_input(
+            "价格标记插入列号（默认16，强制写入该列，原有内容会被覆盖）",
+            min_value=1,
+            max_value=50,
+            value=restored_settings.get('price_mark_col', 16),
+            key="price_mark_col"
+        )
+    header_row = header_row_input  # 用户视角，直接用输入值，不做-1
 
-# 拼接remark行
-if 'skip_end' not in locals() or skip_end is None:
-    skip_end = 0
-    
-remark_rows = skip_end
-try:
-    if campaign_file is not None and export_df is not None:
-        remark_df = pd.read_excel(campaign_file, header=None, nrows=remark_rows)
-        # remark_df只赋值它实际有的列名
-        remark_col_num = remark_df.shape[1]
-        remark_df.columns = list(export_df.columns)[:remark_col_num]
-        # 补齐缺失的列
-        for col in export_df.columns[remark_col_num:]:
-            remark_df[col] = ""
-        # 对齐顺序
-        remark_df = remark_df[export_df.columns]
-        
-        final_df = pd.concat([remark_df, export_df], ignore_index=True)
-    else:
-        final_df = export_df if export_df is not None else pd.DataFrame()
-except Exception as e:
-    st.warning(f"处理备注行时出错: {str(e)}，已忽略备注行")
-    final_df = export_df.copy() if export_df is not None else pd.DataFrame()
-
-# === 只保留一处导出按钮和逻辑 ===
-col_head, col_mark = st.columns(2)
-with col_head:
-    header_row_input = st.number_input(
-        "活动价格提交表表头实际所在行号（从1开始）",
-        min_value=1,
-        max_value=50,
-        value=1,
-        key="campaign_header_row"
-    )
-with col_mark:
-    price_mark_col = st.number_input(
-        "价格标记插入列号（默认16，强制写入该列，原有内容会被覆盖）",
-        min_value=1,
-        max_value=50,
-        value=16,
-        key="price_mark_col"
-    )
-header_row = header_row_input  # 用户视角，直接用输入值，不做-1
+    # 导出设置随匹配结果一起保存到会话快照
+    if campaign_df is not None:
+        get_session_snapshot().save_settings({
+            'price_range_percent': int(price_range_percent),
+            'skip_start': int(skip_start),
+            'skip_end': int(skip_end),
+            'header_row': int(header_row),
+            'price_mark_col': int(price_mark_col),
+        })
 
-# 用 session_state 缓存导出内容
-if 'export_output' not in st.session_state:
-    st.session_state['export_output'] = None
+    # 用 session_state 缓存导出内容
+    if 'export_output' not in st.session_state:
+        st.session_state['export_output'] = None
 
-# 确保campaign_file已定义
-if 'campaign_file' not in locals() or campaign_file is None:
-    campaign_file = None
+    if st.button("生成最终活动价格表（Excel）", disabled=export_running):
+        if campaign_bytes is None:
+            st.error("请先上传活动价格提交表")
+        elif export_df is None:
+            st.error("没有可导出的数据")
+        else:
+            # 在后台任务中生成Excel，页面保持可响应
+            st.session_state['export_output'] = None
+            submit_stage_job('export_job', '生成Excel', None, build_export_workbook,
+                             campaign_bytes, export_df.copy(), header_row, price_mark_col, skip_end)
+
+    export_status, export_result = poll_stage_job('export_job')
+    if export_status == 'done':
+        # 结果已取走，清除任务记录，避免重复提示
+        st.session_state['export_output'] = export_result
+        del st.session_state['export_job']
+        st.success("已成功生成Excel文件，请点击下方按钮下载")
+    elif export_status in ('failed', 'cancelled'):
+        del st.session_state['export_job']
 
-if st.button("生成最终活动价格表（Excel）"):
-    if campaign_file is None:
-        st.error("请先上传活动价格提交表")
-    elif export_df is None:
-        st.error("没有可导出的数据")
+    # 只显示一个下载按钮
+    if st.session_state.get('export_output'):
+        st.download_button(
+            label="下载最终活动价格表（Excel）",
+            data=st.session_state['export_output'],
+            file_name="最终活动价格表.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
     else:
-        try:
-            wb = openpyxl.load_workbook(campaign_file)
-            ws = wb.active
+        st.warning("请上传SKU表、工具价格表和活动价格提交表，三表齐全后自动处理！")
 
-            # 读取表头行（openpyxl行号从1开始）
-            col_names = [str(cell.value).strip() if cell.value is not None else "" for cell in ws[header_row]]
+    st.markdown("---")
+finally:
+    if profiler is not None:
+        profiler.disable()
 
-            if CAMPAIGN_PRICE_FIELD not in col_names:
-                st.error(f"列名 '{CAMPAIGN_PRICE_FIELD}' 不在表头中，请检查表头行或列名是否正确！")
-            else:
-                price_col_idx = col_names.index(CAMPAIGN_PRICE_FIELD) + 1
-                # 用用户选择的列号插入"价格标记"表头
-                ws.cell(row=header_row, column=price_mark_col, value="价格标记")
-
-                # 修复: 正确计算数据写入的起始行
-                # 1. 如果备注行在表头之前，数据起始行 = 表头行 + 1
-                # 2. 如果备注行在表头之后，数据起始行 = 表头行 + 1 + (备注结束行 - 表头行)
-                data_start_row = header_row + 1
-                if skip_end > header_row:
-                    data_start_row += (skip_end - header_row)
-                
-                # 写入数据（按正确的行号计算）
-                for idx, row in export_df.iterrows():
-                    excel_row = data_start_row + idx
-                    if CAMPAIGN_PRICE_FIELD in row and '价格标记' in row:
-                        ws.cell(row=excel_row, column=price_col_idx, value=row[CAMPAIGN_PRICE_FIELD])
-                        ws.cell(row=excel_row, column=price_mark_col, value=row['价格标记'])
-
-                # 保存到内存并缓存
-                with BytesIO() as output:
-                    wb.save(output)
-                    st.session_state['export_output'] = output.getvalue()
-                    
-                st.success("已成功生成Excel文件，请点击下方按钮下载")
-        except Exception as e:
-            st.error(f"生成Excel文件时出错: {str(e)}")
-
-# 只显示一个下载按钮
-if st.session_state.get('export_output'):
-    st.download_button(
-        label="下载最终活动价格表（Excel）",
-        data=st.session_state['export_output'],
-        file_name="最终活动价格表.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-else:
-    st.warning("请上传SKU表、工具价格表和活动价格提交表，三表齐全后自动处理！")
+# 性能分析：结束采集并显示结果（结果保存在session中，下载等操作后仍可查看）
+if profiler is not None:
+    st.session_state['profile_result'] = finish_capture(profiler, profile_started_at)
+    st.session_state['profile_result']['recomputed'] = profile_recompute
+if 'profile_result' in st.session_state:
+    show_profile_result(st.session_state['profile_result'])
 
-st.markdown("---")
+# 有后台任务运行时定时刷新页面以更新进度
+if session_has_running_jobs():
+    time.sleep(JOB_POLL_INTERVAL)
+    rerun_script()
 
 # 添加 main 函数，作为程序入口点
 def main():
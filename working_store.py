@@ -0,0 +1,206 @@
+import os
+import re
+import shutil
+import threading
+
+import numpy as np
+
+# pyarrow为可选依赖：未安装时不写工作文件，直接使用解析结果；首次读写工作文件时才导入
+pa = None
+pa_ipc = None
+_pyarrow_checked = False
+
+# 工作目录：上传表格首次解析后以Arrow IPC格式保存在这里
+WORK_DIR = os.environ.get(
+    "SKU_TOOL_WORK_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sku_price_work")
+)
+# 工作目录占用上限（MB，含会话快照），超过后按最近使用时间删除最旧的工作文件或快照
+MAX_WORK_DIR_MB = int(os.environ.get("SKU_TOOL_WORK_DIR_MAX_MB", "2048"))
+
+_write_lock = threading.Lock()
+
+
+def arrow_available():
+    global pa, pa_ipc, _pyarrow_checked
+    if not _pyarrow_checked:
+        try:
+            import pyarrow
+            import pyarrow.ipc
+            pa, pa_ipc = pyarrow, pyarrow.ipc
+        except ImportError:
+            pass
+        _pyarrow_checked = True
+    return pa is not None
+
+
+def work_file_path(key_parts, suffix=".arrow"):
+    """
+    由缓存键生成工作文件路径
+
+    参数:
+    key_parts: 组成键的各部分，如 ("sku_df", 文件哈希, 表头行)
+    """
+    name = "-".join(re.sub(r"[^0-9A-Za-z_.]+", "_", str(part)) for part in key_parts)
+    return os.path.join(WORK_DIR, name + suffix)
+
+
+def read_arrow_frame(path, memory_map=True):
+    """
+    打开Arrow文件（默认以内存映射方式）并转换为DataFrame
+
+    按列分块转换（split_blocks），不把同类型的列合并成一个二维数组，没有缺失值的数值列可零拷贝转换，
+    得到的列是只读的，修改前需copy；字符串列的缺失值还原为NaN，与read_excel的结果一致
+
+    参数:
+    path: Arrow文件路径
+    memory_map: 为False时把文件内容读入内存后立即关闭文件，不保留映射；
+                之后还会被覆盖的文件（如会话快照）需要这样读取，Windows上不能替换仍被映射的文件
+    """
+    if memory_map:
+        # 不主动关闭映射：零拷贝转换得到的列仍引用映射的内存，随DataFrame释放
+        table = pa_ipc.open_file(pa.memory_map(path, "r")).read_all()
+    else:
+        with pa.OSFile(path, "rb") as source:
+            table = pa_ipc.open_file(source).read_all()
+    df = table.to_pandas(split_blocks=True)
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].where(df[col].notna(), np.nan)
+    # 记录使用时间，供清理时判断
+    os.utime(path)
+    return df
+
+
+def stringify_mixed_columns(df):
+    """
+    把Arrow无法直接转换的类型混杂列（如同一列中既有数字又有文本）转换为文本，缺失值保持不变
+
+    返回:
+    (转换后的DataFrame, 被转换的列名列表)；没有需要转换的列时返回原DataFrame
+    """
+    mixed = []
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            mixed.append(col)
+    if not mixed:
+        return df, mixed
+    df = df.copy()
+    for col in mixed:
+        df[col] = df[col].astype(str).where(df[col].notna(), np.nan)
+    return df, mixed
+
+
+def write_arrow_frame(path, df):
+    """
+    把DataFrame写为Arrow IPC文件；先写临时文件再替换，避免并发会话读到半个文件
+
+    类型混杂的列先转换为文本再写入，调用方应改用返回的DataFrame，保证与之后从文件读取的结果一致
+
+    返回:
+    实际写入的DataFrame；列名不是字符串或仍无法转换时返回None
+    """
+    if not all(isinstance(col, str) for col in df.columns):
+        return None
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        df, mixed = stringify_mixed_columns(df)
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            print(f"无法转换为Arrow格式，跳过工作文件: {e}")
+            return None
+        print(f"以下列的类型混杂，已转换为文本后写入工作文件: {', '.join(mixed)}")
+
+    os.makedirs(WORK_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa_ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    prune_work_dir(keep=os.path.dirname(path))
+    return df
+
+
+def load_or_convert(key_parts, builder):
+    """
+    读取表格的工作文件，不存在时调用builder解析并转换保存
+
+    参数:
+    key_parts: 组成键的各部分，应包含文件内容哈希和解析参数
+    builder: 无参函数，返回解析后的DataFrame
+
+    返回:
+    DataFrame
+    """
+    if not arrow_available():
+        return builder()
+
+    path = work_file_path(key_parts)
+    if os.path.exists(path):
+        try:
+            return read_arrow_frame(path)
+        except (OSError, pa.ArrowInvalid) as e:
+            print(f"工作文件损坏，重新解析: {path} ({e})")
+
+    df = builder()
+    with _write_lock:
+        written = write_arrow_frame(path, df)
+    return written if written is not None else df
+
+
+def directory_usage(path):
+    """目录中所有文件的(最近修改时间, 总大小)"""
+    latest, total = 0.0, 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            latest = max(latest, stat.st_mtime)
+            total += stat.st_size
+    return latest, total
+
+
+def prune_work_dir(keep=None):
+    """
+    工作目录超过上限时，按最近使用时间删除最旧的工作文件或会话快照
+
+    工作目录下的.arrow文件逐个计算；子目录（如sessions）中的每个目录是一个会话快照，按整个目录计算和删除。
+
+    参数:
+    keep: 不删除的目录（正在写入的会话快照）
+    """
+    entries = []
+    try:
+        for entry in os.scandir(WORK_DIR):
+            if entry.is_file() and entry.name.endswith(".arrow"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path, False))
+            elif entry.is_dir():
+                for child in os.scandir(entry.path):
+                    if child.is_dir():
+                        updated_at, size = directory_usage(child.path)
+                        entries.append((updated_at, size, child.path, True))
+    except FileNotFoundError:
+        return
+    total = sum(size for _, size, _, _ in entries)
+    max_bytes = MAX_WORK_DIR_MB * 1024 * 1024
+    for _, size, path, is_dir in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            if is_dir:
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            total -= size
+        except OSError:
+            pass